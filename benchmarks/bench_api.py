@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Load test of the DRS API, measuring throughput and p50/p95/p99 latency
+of each endpoint for catalogs of different sizes.
+
+The WSGI app of ``get_app`` is called in-process, without a server:
+- the catalog is kept in a temporary SQLite database, or in the
+  (disposable) database given by ``--db-url``, e.g. an embedded Postgres
+- download requests are published to a stub topic that only counts them
+- presigning doesn't contact S3, the endpoint and credentials are fake
+
+The metadata, render, and URL caches are cleared for each catalog size,
+set e.g. ``SANDBOX_STORAGE_METADATA_CACHE_ENABLED=false`` to disable them.
+
+Run with: ``python -m benchmarks.bench_api --output results.json``
+Options: ``--sizes``, ``--requests``, ``--threads``, ``--bulk-size``,
+``--db-url``, ``--output``, ``--compare`` (a previous output to compare to)
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess  # nosec
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# (method, path, body) of a request:
+Call = Tuple[str, str, Optional[bytes]]
+
+ENDPOINTS = ["objects_id", "objects_id_access_id", "objects", "objects_access"]
+WARMUP_REQUESTS = 100
+
+
+class StubTopic:
+    """Counts the messages instead of publishing them to RabbitMQ."""
+
+    def __init__(self):
+        self.messages = 0
+
+    def publish(self, message: dict):  # pylint: disable=unused-argument
+        """Count the message."""
+        self.messages += 1
+
+    def close(self) -> None:
+        """Nothing to close."""
+
+
+def setup_environment(db_url: str) -> None:
+    """
+    Configure the app through the environment, before it is imported.
+
+    Args:
+        db_url: the database holding the catalog
+    """
+    os.environ["SANDBOX_STORAGE_DB_URL"] = db_url
+    os.environ["SANDBOX_STORAGE_S3_URL"] = "http://s3-localstack:4566"
+    os.environ.setdefault("SANDBOX_STORAGE_PUBLISH_MODE", "sync")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "test")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "test")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-1")
+
+
+def fill_catalog(engine: Any, start: int, stop: int) -> None:
+    """Register the DRS objects ``Test<start>`` to ``Test<stop - 1>``."""
+    # pylint: disable=import-outside-toplevel
+    from sandbox_storage.dao.db_models import DrsObject
+
+    table = DrsObject.__table__
+    with engine.begin() as connection:
+        for batch_start in range(start, stop, 10000):
+            connection.execute(
+                table.insert(),
+                [
+                    {
+                        "drs_id": f"Test{index}",
+                        "path": f"http://s3-localstack:4566/test/Test{index}",
+                        "size": index,
+                        "created_time": datetime(2021, 8, 30),
+                        "checksum_md5": "3e48b55a59a8d521c3a261c6a41ef27e",
+                    }
+                    for index in range(batch_start, min(batch_start + 10000, stop))
+                ],
+            )
+
+
+def clear_caches() -> None:
+    """Start cold, as a new worker would."""
+    # pylint: disable=import-outside-toplevel
+    from sandbox_storage.dao.lookup import invalidate_drs_object
+    from sandbox_storage.render import get_render_cache
+    from sandbox_storage.s3 import get_s3_client_factory
+
+    invalidate_drs_object()
+    render_cache = get_render_cache()
+    if render_cache is not None:
+        render_cache.clear()
+    get_s3_client_factory().get_url_cache().clear()
+
+
+def call_app(app: Callable, call: Call) -> str:
+    """
+    Call the WSGI app, read the whole response, and get its status.
+
+    Args:
+        app: the WSGI app
+        call: the method, path, and body of the request
+
+    Returns:
+        The status line
+    """
+    method, path, body = call
+    environ = {
+        "REQUEST_METHOD": method,
+        "SCRIPT_NAME": "",
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "8080",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "localhost:8080",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": BytesIO(body or b""),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if body is not None:
+        environ["CONTENT_TYPE"] = "application/json"
+        environ["CONTENT_LENGTH"] = str(len(body))
+
+    status = []
+
+    def start_response(status_line, headers, exc_info=None):
+        # pylint: disable=unused-argument
+        status.append(status_line)
+
+    response = app(environ, start_response)
+    try:
+        for _ in response:
+            pass
+    finally:
+        if hasattr(response, "close"):
+            response.close()
+    return status[0]
+
+
+def make_calls(  # pylint: disable=too-many-arguments
+    endpoint: str,
+    api_route: str,
+    catalog_size: int,
+    number: int,
+    bulk_size: int,
+    rng: random.Random,
+) -> List[Call]:
+    """Get requests to an endpoint for randomly chosen DRS objects."""
+
+    def random_id():
+        return f"Test{rng.randrange(catalog_size)}"
+
+    def bulk_body(**fields):
+        object_ids = [random_id() for _ in range(bulk_size)]
+        return json.dumps({"bulk_object_ids": object_ids, **fields}).encode()
+
+    if endpoint == "objects_id":
+        return [
+            ("GET", f"{api_route}/objects/{random_id()}", None) for _ in range(number)
+        ]
+    if endpoint == "objects_id_access_id":
+        return [
+            ("GET", f"{api_route}/objects/{random_id()}/access/s3", None)
+            for _ in range(number)
+        ]
+    if endpoint == "objects":
+        return [("POST", f"{api_route}/objects", bulk_body()) for _ in range(number)]
+    return [
+        ("POST", f"{api_route}/objects/access", bulk_body(access_id="s3"))
+        for _ in range(number)
+    ]
+
+
+def run_calls(app: Callable, calls: List[Call], threads: int) -> Dict[str, Any]:
+    """
+    Send the requests, ``threads`` at a time, and measure them.
+
+    Returns:
+        The number of requests and errors, the throughput (per second),
+        and the latency percentiles (in ms)
+    """
+
+    def timed_call(call: Call) -> Tuple[float, bool]:
+        start = time.perf_counter()
+        status = call_app(app, call)
+        return time.perf_counter() - start, status.startswith("200")
+
+    start = time.perf_counter()
+    if threads == 1:
+        results = [timed_call(call) for call in calls]
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(timed_call, calls))
+    elapsed = time.perf_counter() - start
+
+    latencies = [seconds * 1000 for seconds, _ in results]
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(results),
+        "errors": sum(not ok for _, ok in results),
+        "throughput": len(results) / elapsed,
+        "latency_ms": {
+            "mean": statistics.fmean(latencies),
+            "p50": percentiles[49],
+            "p95": percentiles[94],
+            "p99": percentiles[98],
+        },
+    }
+
+
+def get_commit() -> Optional[str]:
+    """Get the checked out commit, if known."""
+    try:
+        return subprocess.run(  # nosec
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: Dict[str, Any], baseline_path: Path) -> None:
+    """Print the changes relative to a previous run."""
+    baseline_report = json.loads(baseline_path.read_text())
+    baseline = {
+        (result["endpoint"], result["catalog_size"]): result
+        for result in baseline_report["results"]
+    }
+    print(f"\nChanges relative to {baseline_path}:")
+    if baseline_report["settings"] != report["settings"]:
+        print(f"(with other settings: {baseline_report['settings']})")
+    results = report["results"]
+    for result in results:
+        before = baseline.get((result["endpoint"], result["catalog_size"]))
+        if before is None:
+            continue
+        changes = [
+            f"throughput {result['throughput'] / before['throughput'] - 1:+.1%}"
+        ] + [
+            f"{name} {result['latency_ms'][name] / before['latency_ms'][name] - 1:+.1%}"
+            for name in ("p50", "p95", "p99")
+        ]
+        print(
+            f"{result['endpoint']:<22} {result['catalog_size']:>9}  "
+            + ", ".join(changes)
+        )
+
+
+def main():  # pylint: disable=too-many-locals
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--bulk-size", type=int, default=100)
+    parser.add_argument("--db-url")
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        setup_environment(args.db_url or f"sqlite:///{tmp_dir}/catalog.db")
+        # pylint: disable=import-outside-toplevel
+        from sandbox_storage import pubsub
+        from sandbox_storage.api import get_app
+        from sandbox_storage.config import get_config
+        from sandbox_storage.dao.db import Base, DBSession, engine
+
+        topic = StubTopic()
+        pubsub.get_download_requested_topic = lambda: topic
+        pubsub.get_download_requested_publisher.cache_clear()
+
+        config = get_config()
+        app = get_app(config)
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+
+        rng = random.Random(42)  # nosec
+        results = []
+        catalog_size = 0
+        print(
+            f"{'endpoint':<22} {'catalog':>9} {'req/s':>9} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+        )
+        for size in sorted(args.sizes):
+            fill_catalog(engine, catalog_size, size)
+            catalog_size = size
+            clear_caches()
+            for endpoint in ENDPOINTS:
+                warmup = make_calls(
+                    endpoint, config.api_route, size, WARMUP_REQUESTS, 1, rng
+                )
+                run_calls(app, warmup, threads=1)
+                calls = make_calls(
+                    endpoint, config.api_route, size, args.requests, args.bulk_size, rng
+                )
+                result = {
+                    "endpoint": endpoint,
+                    "catalog_size": size,
+                    **run_calls(app, calls, args.threads),
+                }
+                results.append(result)
+                latency = result["latency_ms"]
+                print(
+                    f"{endpoint:<22} {size:>9} {result['throughput']:>9.0f} "
+                    f"{latency['p50']:>8.2f} {latency['p95']:>8.2f} "
+                    f"{latency['p99']:>8.2f} {result['errors']:>7}"
+                )
+
+        Base.metadata.drop_all(engine)
+        DBSession.remove()
+        engine.dispose()
+
+    report = {
+        "commit": get_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "database": engine.dialect.name,
+        "settings": {
+            "requests": args.requests,
+            "threads": args.threads,
+            "bulk_size": args.bulk_size,
+            "metadata_cache_enabled": config.metadata_cache_enabled,
+            "publish_mode": config.publish_mode,
+        },
+        "messages_published": topic.messages,
+        "results": results,
+    }
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nResults written to {args.output}")
+    if args.compare is not None:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares the latency of looking up ``DrsObject`` by ``drs_id`` on a
+synthetic multi-million-row PostgreSQL table:
+- using the unique index on ``drs_id`` (index scan + heap fetch)
+- using the covering index added by migration ``b441a1bc1b2a``
+  (index-only scan)
+
+The table ``drs_objects_bench`` is created in the database given by the
+``DB_URL`` environment variable and dropped afterwards. Filling it with
+the default of 5 million rows takes a few minutes and about 2 GB of disk.
+
+Run with: ``DB_URL=postgresql://... python -m benchmarks.bench_covering_index``
+Options: ``--rows``, ``--lookups``
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+
+from sqlalchemy import create_engine, text
+
+TABLE = "drs_objects_bench"
+INDEX = "ix_drs_objects_bench_drs_id_covering"
+
+LOOKUP = text(
+    f"SELECT path, size, created_time, checksum_md5 FROM {TABLE} "  # nosec
+    "WHERE drs_id = :drs_id"
+)
+
+
+def create_table(connection, rows: int) -> None:
+    """Create and fill the synthetic table like ``drs_objects``."""
+    connection.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    connection.execute(
+        text(
+            f"CREATE TABLE {TABLE} ("
+            "id SERIAL PRIMARY KEY, drs_id VARCHAR NOT NULL UNIQUE, "
+            "path VARCHAR NOT NULL, size INTEGER NOT NULL, "
+            "created_time TIMESTAMP NOT NULL, checksum_md5 VARCHAR NOT NULL)"
+        )
+    )
+    connection.execute(
+        text(
+            f"INSERT INTO {TABLE} (drs_id, path, size, created_time, checksum_md5) "
+            "SELECT 'object' || n, 'http://s3-localstack:4566/test/object' || n, "
+            "n % 1000000, now() - n * interval '1 second', md5(n::text) "
+            "FROM generate_series(1, :rows) AS n"
+        ),
+        {"rows": rows},
+    )
+    connection.execute(text(f"VACUUM ANALYZE {TABLE}"))
+
+
+def explain(connection, drs_id: str) -> str:
+    """Get the plan and buffer usage of a lookup."""
+    plan = connection.execute(
+        text(f"EXPLAIN (ANALYZE, BUFFERS, COSTS OFF) {LOOKUP.text}"),
+        {"drs_id": drs_id},
+    )
+    return "\n".join(f"    {line}" for (line,) in plan)
+
+
+def measure(connection, rows: int, lookups: int) -> None:
+    """Look up random objects and print the latency percentiles."""
+    drs_ids = [f"object{random.randint(1, rows)}" for _ in range(lookups)]  # nosec
+    for drs_id in drs_ids[:100]:  # warm up
+        connection.execute(LOOKUP, {"drs_id": drs_id}).one()
+
+    latencies = []
+    for drs_id in drs_ids:
+        start = time.perf_counter()
+        connection.execute(LOOKUP, {"drs_id": drs_id}).one()
+        latencies.append((time.perf_counter() - start) * 1e6)
+
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"  p50 {percentiles[49]:.0f} µs, p95 {percentiles[94]:.0f} µs, "
+        f"p99 {percentiles[98]:.0f} µs, mean {statistics.mean(latencies):.0f} µs"
+    )
+    print(explain(connection, drs_ids[0]))
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    args = parser.parse_args()
+
+    engine = create_engine(os.environ["DB_URL"], isolation_level="AUTOCOMMIT")
+    with engine.connect() as connection:
+        print(f"Creating {args.rows} rows in {TABLE} ...")
+        create_table(connection, args.rows)
+        try:
+            print("Unique index on drs_id:")
+            measure(connection, args.rows, args.lookups)
+
+            connection.execute(
+                text(
+                    f"CREATE INDEX CONCURRENTLY {INDEX} ON {TABLE} (drs_id) "
+                    "INCLUDE (path, size, created_time, checksum_md5)"
+                )
+            )
+            connection.execute(text(f"VACUUM ANALYZE {TABLE}"))
+            print("Covering index:")
+            measure(connection, args.rows, args.lookups)
+        finally:
+            connection.execute(text(f"DROP TABLE {TABLE}"))
+
+
+if __name__ == "__main__":
+    main()
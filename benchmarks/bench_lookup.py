@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares the Python overhead of looking up a ``DrsObject``:
+- as previously done (an ORM ``Query`` loading a ``DrsObject`` instance
+  that is copied into a ``DrsObjectRecord``)
+- with the column-only Core statements of ``sandbox_storage.dao.lookup``
+
+for a single object and for a bulk lookup of 100 objects. An in-memory
+SQLite database is used to keep the database's share of the time small.
+
+Run with: ``python -m benchmarks.bench_lookup``
+"""
+
+import timeit
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from sandbox_storage.dao import lookup
+from sandbox_storage.dao.db import Base
+from sandbox_storage.dao.db_models import DrsObject
+
+CATALOG_SIZE = 10000
+BULK_SIZE = 100
+
+
+def orm_query(session: Session, object_id: str) -> lookup.DrsObjectRecord:
+    """The previous single lookup."""
+    target_object = (
+        session.query(DrsObject).filter(DrsObject.drs_id == object_id).one_or_none()
+    )
+    return lookup.DrsObjectRecord(
+        drs_id=target_object.drs_id,
+        path=target_object.path,
+        size=target_object.size,
+        created_time=target_object.created_time,
+        checksum_md5=target_object.checksum_md5,
+    )
+
+
+def orm_bulk_query(session: Session, object_ids: list) -> dict:
+    """The previous bulk lookup."""
+    return {
+        target_object.drs_id: lookup.DrsObjectRecord(
+            drs_id=target_object.drs_id,
+            path=target_object.path,
+            size=target_object.size,
+            created_time=target_object.created_time,
+            checksum_md5=target_object.checksum_md5,
+        )
+        for target_object in session.query(DrsObject).filter(
+            DrsObject.drs_id.in_(object_ids)
+        )
+    }
+
+
+def main(number: int = 5000):
+    """Run the benchmark and print the time per lookup."""
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    with Session(bind=engine) as session:
+        session.add_all(
+            DrsObject(
+                drs_id=f"Test{index}",
+                path=f"http://s3-localstack:4566/test/Test{index}",
+                size=index,
+                created_time=datetime(2021, 8, 30),
+                checksum_md5="3e48b55a59a8d521c3a261c6a41ef27e",
+            )
+            for index in range(CATALOG_SIZE)
+        )
+        session.commit()
+
+    # like a request, each lookup gets a fresh session:
+    def run(query):
+        def lookup_in_session():
+            with Session(bind=engine) as session:
+                query(session)
+
+        return lookup_in_session
+
+    session = None
+    lookup.get_session = lambda: session
+    object_ids = [f"Test{index}" for index in range(0, CATALOG_SIZE, 100)][:BULK_SIZE]
+
+    def core_query(db):
+        nonlocal session
+        session = db
+        lookup.query_drs_object("Test42")
+
+    def core_bulk_query(db):
+        nonlocal session
+        session = db
+        lookup.query_drs_objects(object_ids)
+
+    candidates = [
+        ("ORM query", run(lambda db: orm_query(db, "Test42")), number),
+        ("Core select", run(core_query), number),
+        (
+            f"bulk {BULK_SIZE}: ORM query",
+            run(lambda db: orm_bulk_query(db, object_ids)),
+            number // 10,
+        ),
+        (f"bulk {BULK_SIZE}: Core select", run(core_bulk_query), number // 10),
+    ]
+    for name, func, n_calls in candidates:
+        func()  # warm up
+        seconds = min(timeit.repeat(func, number=n_calls, repeat=3)) / n_calls
+        print(f"{name:<30} {seconds * 1e6:>10.1f} µs per lookup")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares the cost of creating a presigned download URL:
+- as previously done by ``get_objects_id_access_id``
+  (a new boto3 client per request)
+- with a reused botocore client
+- with the ``SigV4Presigner``
+
+Run with: ``python -m benchmarks.bench_presign``
+No S3 endpoint is needed, presigning works offline.
+"""
+
+import os
+import timeit
+
+import boto3
+from botocore.config import Config as BotoConfig
+
+from sandbox_storage.presign import SigV4Presigner
+
+ENDPOINT_URL = "http://s3-localstack:4566"
+REGION_NAME = "eu-west-1"
+
+
+def main(number: int = 2000):
+    """Run the benchmark and print the time per URL."""
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "test")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "test")
+    os.environ.setdefault("AWS_DEFAULT_REGION", REGION_NAME)
+
+    def client_per_call():
+        client = boto3.client(service_name="s3", endpoint_url=ENDPOINT_URL)
+        client.generate_presigned_url(
+            "get_object", Params={"Bucket": "test", "Key": "Test1"}, ExpiresIn=86400
+        )
+
+    session = boto3.session.Session()
+    client = session.client(
+        service_name="s3",
+        endpoint_url=ENDPOINT_URL,
+        config=BotoConfig(signature_version="s3v4"),
+    )
+
+    def reused_client():
+        client.generate_presigned_url(
+            "get_object", Params={"Bucket": "test", "Key": "Test1"}, ExpiresIn=86400
+        )
+
+    credentials = session.get_credentials()
+    presigner = SigV4Presigner(
+        endpoint_url=ENDPOINT_URL,
+        region_name=REGION_NAME,
+        get_credentials=credentials.get_frozen_credentials,
+    )
+
+    def sigv4_presigner():
+        presigner.presign_get_object("test", "Test1", expires_in=86400)
+
+    candidates = [
+        ("boto3.client per call", client_per_call, max(number // 20, 1)),
+        ("reused botocore client", reused_client, number),
+        ("SigV4Presigner", sigv4_presigner, number),
+    ]
+    for name, func, n_calls in candidates:
+        func()  # warm up
+        seconds = min(timeit.repeat(func, number=n_calls, repeat=3)) / n_calls
+        print(f"{name:<25} {seconds * 1e6:>10.1f} µs per URL")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares the cost of rendering ``DrsObject`` responses:
+- as previously done (``DrsReturnObject`` dataclasses and
+  Pyramid's stdlib JSON renderer)
+- with ``render_drs_object``, without and with its per-object cache
+
+for a single object and for a bulk response of 1000 objects.
+
+Run with: ``python -m benchmarks.bench_render``
+"""
+
+import timeit
+from datetime import datetime
+from unittest.mock import patch
+
+from pyramid.renderers import JSON
+
+from sandbox_storage import render
+from sandbox_storage.models import DrsReturnObject
+from sandbox_storage.cache import TTLCache
+from sandbox_storage.dao.lookup import DrsObjectRecord
+
+DRS_SELF_URL = "drs://localhost:8080/"
+BULK_SIZE = 1000
+
+
+def make_record(index: int) -> DrsObjectRecord:
+    """Create the metadata of a test object."""
+    return DrsObjectRecord(
+        drs_id=f"Test{index}",
+        path=f"http://s3-localstack:4566/test/Test{index}",
+        size=1024 * index,
+        created_time=datetime(2021, 8, 30),
+        checksum_md5="3e48b55a59a8d521c3a261c6a41ef27e",
+    )
+
+
+def main(number: int = 20000):
+    """Run the benchmark and print the time per response."""
+    records = [make_record(index) for index in range(BULK_SIZE)]
+    stdlib_renderer = JSON()(None)
+    system = {"request": None}
+    cache = TTLCache(max_size=2 * BULK_SIZE, ttl=3600)
+
+    def dataclasses_single():
+        stdlib_renderer(DrsReturnObject.from_record(records[0], DRS_SELF_URL), system)
+
+    def render_single_uncached():
+        cache.clear()
+        render.render_drs_object(records[0], DRS_SELF_URL)
+
+    def render_single_cached():
+        render.render_drs_object(records[0], DRS_SELF_URL)
+
+    def dataclasses_bulk():
+        stdlib_renderer(
+            {
+                "resolved_drs_object": [
+                    DrsReturnObject.from_record(record, DRS_SELF_URL)
+                    for record in records
+                ]
+            },
+            system,
+        )
+
+    def render_bulk_cached():
+        render.render_object(
+            {
+                "resolved_drs_object": render.render_array(
+                    render.render_drs_object(record, DRS_SELF_URL) for record in records
+                )
+            }
+        )
+
+    candidates = [
+        ("dataclasses + json", dataclasses_single, number),
+        ("render, uncached", render_single_uncached, number),
+        ("render, cached", render_single_cached, number),
+        (f"bulk {BULK_SIZE}: dataclasses + json", dataclasses_bulk, number // 1000),
+        (f"bulk {BULK_SIZE}: render, cached", render_bulk_cached, number // 1000),
+    ]
+    # use a cache of known size, whatever the config says:
+    with patch.object(render, "get_render_cache", lambda: cache):
+        for name, func, n_calls in candidates:
+            func()  # warm up
+            seconds = min(timeit.repeat(func, number=n_calls, repeat=3)) / n_calls
+            print(f"{name:<35} {seconds * 1e6:>10.1f} µs per response")
+
+
+if __name__ == "__main__":
+    main()
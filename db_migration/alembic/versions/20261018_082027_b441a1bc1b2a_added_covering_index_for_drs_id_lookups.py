@@ -0,0 +1,52 @@
+"""Added covering index for drs_id lookups
+
+Revision ID: b441a1bc1b2a
+Revises: 44afb4c8003e
+Create Date: 2026-10-18 08:20:27.513042
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b441a1bc1b2a"
+down_revision = "44afb4c8003e"
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = "ix_drs_objects_drs_id_covering"
+INCLUDED_COLUMNS = ["path", "size", "created_time", "checksum_md5"]
+
+
+def upgrade():
+    # Lookups by drs_id select only these columns, so with them included in
+    # the index they are answered by index-only scans (for pages that VACUUM
+    # marked all-visible) instead of fetching every row from the heap.
+    # The unique constraint on drs_id stays in place to enforce uniqueness.
+    # The index is built concurrently so that the table stays writable,
+    # which can't be done within a transaction:
+    with op.get_context().autocommit_block():
+        # a concurrent build that failed leaves an invalid index behind:
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}")
+        # op.create_index of alembic 1.6 builds the index on a table with
+        # only the indexed columns, so it can't resolve the included ones:
+        table = sa.Table(
+            "drs_objects",
+            sa.MetaData(),
+            *(sa.Column(name) for name in ["drs_id"] + INCLUDED_COLUMNS),
+        )
+        index = sa.Index(
+            INDEX_NAME,
+            table.c.drs_id,
+            postgresql_include=INCLUDED_COLUMNS,
+            postgresql_concurrently=True,
+        )
+        op.execute(sa.schema.CreateIndex(index))
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            INDEX_NAME, table_name="drs_objects", postgresql_concurrently=True
+        )
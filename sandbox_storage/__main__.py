@@ -8,16 +8,49 @@ Entrypoint for the package.
 from wsgiref.simple_server import make_server
 from .config import get_config
 from .api import get_app
+from .server import run_gunicorn
 
-app = get_app()
 config = get_config()
 
 
+def run_async() -> None:
+    """
+    Starts the asyncio backend server
+    """
+    # pylint: disable=import-outside-toplevel
+    import uvicorn
+
+    from .async_api import get_async_app
+
+    if config.server == "gunicorn":
+        run_gunicorn(
+            lambda: get_async_app(config),
+            config,
+            worker_class="uvicorn.workers.UvicornWorker",
+        )
+        return
+
+    uvicorn.run(
+        get_async_app(config),
+        host=config.host,
+        port=config.port,
+        log_level=config.log_level,
+    )
+
+
 def run() -> None:
     """
     Starts backend server
     """
-    server = make_server(config.host, config.port, app)
+    if config.async_mode:
+        run_async()
+        return
+
+    if config.server == "gunicorn":
+        run_gunicorn(lambda: get_app(config), config)
+        return
+
+    server = make_server(config.host, config.port, get_app(config))
     server.serve_forever()
 
 
@@ -17,91 +17,50 @@
 Provides the API endpoints for storage.
 """
 
-from dataclasses import dataclass
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, List, Union
 
 from pyramid.events import NewRequest
+from pyramid_openapi3.exceptions import RequestValidationError
 from pyramid.view import view_config
 from pyramid.config import Configurator
 from pyramid.request import Request
-from pyramid.httpexceptions import HTTPBadRequest, HTTPNotFound
-
-import boto3
+from pyramid.httpexceptions import (
+    HTTPBadRequest,
+    HTTPNotFound,
+    HTTPNotModified,
+    HTTPRequestEntityTooLarge,
+)
 
+from .cache_control import cache_control_response_callback_factory, limit_max_age
+from .conditional import get_validator_headers, is_not_modified
 from .cors import cors_header_response_callback_factory
 from .config import get_config
-from .dao.db import get_session
-from .dao.db_models import DrsObject
-from .pubsub import send_message
+from .dao.lookup import get_drs_object, get_drs_objects
+from .metrics import (
+    AMQP_PUBLISH_DURATION,
+    DB_LOOKUP_DURATION,
+    S3_PRESIGN_DURATION,
+    get_metrics_view,
+)
+from .models import AccessURL
+from .presign import get_url_expiry
+from .pubsub import send_message, send_messages
+from .render import (
+    RawJSON,
+    json_renderer_factory,
+    render_array,
+    render_drs_object,
+    render_object,
+)
+from .s3 import presign_get_object
 from .custom_openapi3.custom_explorer_view import add_custom_explorer_view
 
 CONFIG_SETTINGS = get_config()
 S3_URL = CONFIG_SETTINGS.s3_url
 
 
-@dataclass
-class AccessURL:
-    """Describes the URL for accessing the
-    actual bytes of the object."""
-
-    url: str
-
-    def __json__(self, _: Optional[Request] = None) -> Dict[str, str]:
-        """JSON-renderer for this object."""
-        return {"url": self.url}
-
-
-@dataclass
-class AccessMethod:
-    """An AccessURL"""
-
-    type: str = "s3"  # currently only s3 is supported
-    # At least one of the two has to be provided:
-    access_url: Optional[AccessURL] = None
-    access_id: Optional[str] = None
-
-    def __json__(self, _: Optional[Request] = None) -> Dict[str, Any]:
-        """JSON-renderer for this object."""
-        return_dict: Dict[str, Any] = {"type": self.type}
-        if self.access_url:
-            return_dict["access_url"] = self.access_url.__json__()
-        if self.access_id:
-            return_dict["access_id"] = self.access_id
-
-        return return_dict
-
-
-@dataclass
-class DrsReturnObject:
-    """A DrsObject"""
-
-    id: str
-    self_uri: str
-    size: int
-    created_time: str
-    checksums: list
-    access_methods: Optional[List[AccessMethod]] = None
-
-    def __json__(self, _: Optional[Request] = None) -> Dict[str, Any]:
-        """JSON-renderer for this object."""
-
-        return_dict = {
-            "id": self.id,
-            "self_uri": self.self_uri,
-            "size": self.size,
-            "created_time": self.created_time,
-            "checksums": self.checksums,
-        }
-
-        if self.access_methods:
-            return_dict["access_methods"] = [
-                access_method.__json__() for access_method in self.access_methods
-            ]
-
-        return return_dict
-
-
 def get_app(config_settings=CONFIG_SETTINGS) -> Any:
     """
     Builds the Pyramid app
@@ -123,9 +82,18 @@ def get_app(config_settings=CONFIG_SETTINGS) -> Any:
         pyramid_config.add_subscriber(
             cors_header_response_callback_factory(config_settings), NewRequest
         )
+        if config_settings.cache_control_enabled:
+            pyramid_config.add_subscriber(
+                cache_control_response_callback_factory(config_settings), NewRequest
+            )
+        pyramid_config.add_renderer("json", json_renderer_factory)
+        pyramid_config.add_tween("sandbox_storage.tweens.db_session_tween_factory")
+        if config_settings.metrics_enabled:
+            pyramid_config.add_tween("sandbox_storage.tweens.metrics_tween_factory")
         pyramid_config.include("pyramid_openapi3")
+        # a str, pyramid_openapi3 passes it to warnings.warn_explicit:
         pyramid_config.pyramid_openapi3_spec(
-            openapi_spec_path, route=str(api_route / "openapi.yaml")
+            str(openapi_spec_path), route=str(api_route / "openapi.yaml")
         )
         pyramid_config.pyramid_custom_openapi3_add_explorer(
             route=str(api_route), custom_spec_url=config_settings.custom_spec_url
@@ -133,7 +101,19 @@ def get_app(config_settings=CONFIG_SETTINGS) -> Any:
 
         pyramid_config.add_route("hello", "/")
         pyramid_config.add_route("health", "/health")
-
+        if config_settings.metrics_enabled:
+            pyramid_config.add_route("metrics", "/metrics")
+            pyramid_config.add_view(
+                get_metrics_view, route_name="metrics", request_method="GET"
+            )
+
+        pyramid_config.add_route("objects", str(api_route / "objects"))
+        # must come before "objects_id", which would match it as well:
+        pyramid_config.add_route(
+            "objects_access",
+            str(api_route / "objects" / "access"),
+            request_method="POST",
+        )
         pyramid_config.add_route(
             "objects_id", str(api_route / "objects" / "{object_id}")
         )
@@ -156,52 +136,136 @@ def index(_, __):
 @view_config(
     route_name="objects_id", renderer="json", openapi=True, request_method="GET"
 )
-def get_objects_id(request: Request) -> DrsReturnObject:
+def get_objects_id(request: Request) -> Union[RawJSON, HTTPNotModified]:
     """
     Get info about a ``DrsObject``.
+    Supports conditional requests using ``If-None-Match``
+    and ``If-Modified-Since``.
 
     Args:
         request: An instance of ``pyramid.request.Request``
 
     Returns:
-        An instance of ``DrsReturnObject``
+        The rendered ``DrsReturnObject`` or an instance of ``HTTPNotModified``
 
     """
 
     object_id = request.matchdict["object_id"]
 
-    db = get_session()
-    target_object = (
-        db.query(DrsObject).filter(DrsObject.drs_id == object_id).one_or_none()
-    )
+    with DB_LOOKUP_DURATION.time():
+        target_object = get_drs_object(object_id)
 
     if target_object is not None:
 
-        access_url = AccessURL(url=target_object.path)
-        access_method = AccessMethod(access_url=access_url)
-        drs_object = DrsReturnObject(
-            id=target_object.drs_id,
-            self_uri=CONFIG_SETTINGS.drs_self_url + target_object.drs_id,
-            size=target_object.size,
-            created_time=target_object.created_time.isoformat() + "Z",
-            checksums=[
-                {
-                    "checksum": target_object.checksum_md5,
-                    "type": "md5",
-                }
-            ],
-            access_methods=[access_method],
-        )
+        validator_headers = get_validator_headers(target_object)
+        if is_not_modified(
+            target_object,
+            request.headers.get("If-None-Match"),
+            request.headers.get("If-Modified-Since"),
+        ):
+            # the client still has the object, this is no download request:
+            return HTTPNotModified(headers=validator_headers)
 
-        send_message(object_id, "s3", "user_id")
+        with AMQP_PUBLISH_DURATION.time():
+            send_message(object_id, "s3", "user_id")
 
-        return drs_object
+        request.response.headers.update(validator_headers)
+        return render_drs_object(target_object, CONFIG_SETTINGS.drs_self_url)
 
     raise HTTPNotFound(
         json={"msg": "The requested 'DrsObject' wasn't found", "status_code": 404}
     )
 
 
+def get_s3_access_url(object_id: str) -> str:
+    """
+    Get a presigned URL for downloading an object via the "s3" access method.
+
+    Args:
+        object_id: the DRS ID of the object
+
+    Returns:
+        The URL
+
+    """
+    with S3_PRESIGN_DURATION.time():
+        response = presign_get_object(
+            "test", object_id, expires_in=CONFIG_SETTINGS.presign_expires_in
+        )
+
+    # change path to localhost
+    return "http://localhost:4566" + response.removeprefix(CONFIG_SETTINGS.s3_url)
+
+
+def get_bulk_object_ids(request: Request) -> List[str]:
+    """
+    Get the object IDs of a bulk request without duplicates.
+
+    Args:
+        request: An instance of ``pyramid.request.Request``
+
+    Returns:
+        The unique object IDs in the order of the request
+
+    """
+    object_ids = list(dict.fromkeys(request.json_body["bulk_object_ids"]))
+
+    if len(object_ids) > CONFIG_SETTINGS.bulk_max_object_ids:
+        raise HTTPRequestEntityTooLarge(
+            json={
+                "msg": "Too many object IDs, at most "
+                f"{CONFIG_SETTINGS.bulk_max_object_ids} are allowed",
+                "status_code": 413,
+            }
+        )
+    return object_ids
+
+
+@view_config(route_name="objects", renderer="json", openapi=True, request_method="POST")
+def post_objects(request: Request) -> RawJSON:
+    """
+    Get info about multiple ``DrsObject`` using a single database query.
+
+    Args:
+        request: An instance of ``pyramid.request.Request``
+
+    Returns:
+        The rendered summary, resolved ``DrsReturnObject``,
+        and IDs of the objects that were not found
+
+    """
+
+    object_ids = get_bulk_object_ids(request)
+    with DB_LOOKUP_DURATION.time():
+        target_objects = get_drs_objects(object_ids)
+    resolved = [object_id for object_id in object_ids if object_id in target_objects]
+    unresolved = [
+        object_id for object_id in object_ids if object_id not in target_objects
+    ]
+
+    with AMQP_PUBLISH_DURATION.time():
+        send_messages(resolved, "s3", "user_id")
+
+    return render_object(
+        {
+            "summary": {
+                "requested": len(object_ids),
+                "resolved": len(resolved),
+                "unresolved": len(unresolved),
+            },
+            "resolved_drs_object": render_array(
+                render_drs_object(
+                    target_objects[object_id], CONFIG_SETTINGS.drs_self_url
+                )
+                for object_id in resolved
+            ),
+            "unresolved_drs_objects": (
+                [{"error_code": 404, "object_ids": unresolved}] if unresolved else []
+            ),
+        }
+    )
+
+
 @view_config(
     route_name="objects_id_access_id",
     renderer="json",
@@ -223,10 +287,8 @@ def get_objects_id_access_id(request: Request) -> AccessURL:
     object_id = request.matchdict["object_id"]
     access_id = request.matchdict["access_id"]
 
-    db = get_session()
-    target_object = (
-        db.query(DrsObject).filter(DrsObject.drs_id == object_id).one_or_none()
-    )
+    with DB_LOOKUP_DURATION.time():
+        target_object = get_drs_object(object_id)
 
     if target_object is None:
         raise HTTPBadRequest(
@@ -234,28 +296,109 @@ def get_objects_id_access_id(request: Request) -> AccessURL:
         )
 
     if access_id == "s3":
-        send_message(object_id, access_id, "user_id")
+        with AMQP_PUBLISH_DURATION.time():
+            send_message(object_id, access_id, "user_id")
+
+        url = get_s3_access_url(object_id)
+        expires_at = get_url_expiry(url)
+        if expires_at is not None:
+            limit_max_age(
+                request, (expires_at - datetime.now(timezone.utc)).total_seconds()
+            )
+
+        return AccessURL(url=url)
+
+    raise HTTPBadRequest(
+        json={"msg": "The requested access method does not exist", "status_code": 400}
+    )
+
+
+@view_config(
+    route_name="objects_access",
+    renderer="json",
+    openapi=True,
+    request_method="POST",
+)
+def post_objects_access(request: Request) -> Dict[str, Any]:
+    """
+    Get URLs for fetching the bytes of multiple ``DrsObject``
+    using a single database query.
+
+    Args:
+        request: An instance of ``pyramid.request.Request``
+
+    Returns:
+        A dictionary with a summary, the access URLs of the resolved objects,
+        and the IDs of the objects that were not found
+
+    """
 
-        # Connect to s3
-        s3_client = boto3.client(
-            service_name="s3",
-            endpoint_url=S3_URL,
+    object_ids = get_bulk_object_ids(request)
+    access_id = request.json_body["access_id"]
+
+    if access_id != "s3":
+        raise HTTPBadRequest(
+            json={
+                "msg": "The requested access method does not exist",
+                "status_code": 400,
+            }
         )
 
-        # Get presigned URL
-        response = s3_client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": "test", "Key": object_id},
-            ExpiresIn=86400,
+    with DB_LOOKUP_DURATION.time():
+        target_objects = get_drs_objects(object_ids)
+    resolved = [
+        {
+            "drs_object_id": object_id,
+            "drs_access_id": access_id,
+            "url": get_s3_access_url(object_id),
+        }
+        for object_id in object_ids
+        if object_id in target_objects
+    ]
+    unresolved = [
+        object_id for object_id in object_ids if object_id not in target_objects
+    ]
+
+    with AMQP_PUBLISH_DURATION.time():
+        send_messages(
+            (access_url["drs_object_id"] for access_url in resolved),
+            access_id,
+            "user_id",
         )
 
-        # change path to localhost
-        path = "http://localhost:4566" + response.removeprefix(CONFIG_SETTINGS.s3_url)
+    return {
+        "summary": {
+            "requested": len(object_ids),
+            "resolved": len(resolved),
+            "unresolved": len(unresolved),
+        },
+        "resolved_drs_object_access_urls": resolved,
+        "unresolved_drs_objects": (
+            [{"error_code": 404, "object_ids": unresolved}] if unresolved else []
+        ),
+    }
+
+
+@view_config(context=RequestValidationError, renderer="json")
+def request_validation_error(
+    context: RequestValidationError, request: Request
+) -> HTTPBadRequest:
+    """
+    Answer requests that don't match the OpenAPI spec with the documented
+    ``Error`` body, instead of the list of errors of pyramid_openapi3.
 
-        return AccessURL(url=path)
+    Args:
+        context: the validation error
+        request: An instance of ``pyramid.request.Request``
 
-    raise HTTPBadRequest(
-        json={"msg": "The requested access method does not exist", "status_code": 400}
+    Returns:
+        An instance of ``HTTPBadRequest``
+
+    """
+    extract_errors = request.registry.settings["pyramid_openapi3_extract_errors"]
+    messages = [error["message"] for error in extract_errors(request, context.errors)]
+    return HTTPBadRequest(
+        json={"msg": "Invalid request: " + "; ".join(messages), "status_code": 400}
     )
 
 
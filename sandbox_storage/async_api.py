@@ -0,0 +1,214 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Provides the API endpoints for storage using asyncio.
+
+Serves the same routes and responses as the Pyramid app in ``api.py``
+(except for the bulk endpoints and the API explorer), but the database
+lookups and the publishing of download requests don't block the worker.
+"""
+
+from pathlib import Path
+from typing import Any
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, Response
+from starlette.routing import Route
+
+from .api import CONFIG_SETTINGS, get_s3_access_url
+from .async_pubsub import AsyncPublisher
+from .conditional import get_validator_headers, is_not_modified
+from .config import Config
+from .cors import get_cors_headers
+from .dao.async_db import get_async_engine
+from .dao.lookup import get_drs_object_async
+from .models import AccessURL
+from .render import dumps, render_drs_object
+from .s3 import get_s3_client_factory
+
+
+def error_response(msg: str, status_code: int) -> JSONResponse:
+    """Create an error response with the same body as the Pyramid app."""
+    return JSONResponse({"msg": msg, "status_code": status_code}, status_code)
+
+
+async def index(_: Request) -> JSONResponse:
+    """
+    Index Enpoint, returns 'Hello World'
+    """
+    return JSONResponse({"content": "Hello World!"})
+
+
+async def get_health(_: Request) -> JSONResponse:
+    """
+    Check for the health of the service.
+    """
+    return JSONResponse({"status": "OK"})
+
+
+def json_response(body: bytes) -> Response:
+    """Create a response for an already rendered JSON body."""
+    return Response(body, media_type="application/json")
+
+
+async def get_objects_id(request: Request) -> Response:
+    """
+    Get info about a ``DrsObject``.
+
+    Args:
+        request: An instance of ``starlette.requests.Request``
+
+    Returns:
+        The ``DrsReturnObject`` as JSON response
+
+    """
+
+    object_id = request.path_params["object_id"]
+
+    target_object = await get_drs_object_async(object_id)
+
+    if target_object is None:
+        return error_response("The requested 'DrsObject' wasn't found", 404)
+
+    validator_headers = get_validator_headers(target_object)
+    if is_not_modified(
+        target_object,
+        request.headers.get("If-None-Match"),
+        request.headers.get("If-Modified-Since"),
+    ):
+        # the client still has the object, this is no download request:
+        return Response(status_code=304, headers=validator_headers)
+
+    await request.app.state.publisher.send_message(object_id, "s3", "user_id")
+
+    response = json_response(
+        render_drs_object(target_object, CONFIG_SETTINGS.drs_self_url).body
+    )
+    response.headers.update(validator_headers)
+    return response
+
+
+async def get_objects_id_access_id(request: Request) -> Response:
+    """
+    Get a URL for fetching bytes.
+
+    Args:
+        request: An instance of ``starlette.requests.Request``
+
+    Returns:
+        The ``AccessURL`` as JSON response
+
+    """
+
+    object_id = request.path_params["object_id"]
+    access_id = request.path_params["access_id"]
+
+    target_object = await get_drs_object_async(object_id)
+
+    if target_object is None:
+        return error_response("The requested 'DrsObject' wasn't found", 400)
+
+    if access_id != "s3":
+        return error_response("The requested access method does not exist", 400)
+
+    await request.app.state.publisher.send_message(object_id, access_id, "user_id")
+
+    if CONFIG_SETTINGS.s3_fast_presign:
+        # signing locally is pure computation, once the presigner was
+        # created at startup:
+        url = get_s3_access_url(object_id)
+    else:
+        # botocore may look up credentials, keep the event loop free:
+        url = await run_in_threadpool(get_s3_access_url, object_id)
+
+    return json_response(dumps(AccessURL(url=url)))
+
+
+class CORSHeaderMiddleware(BaseHTTPMiddleware):
+    """
+    Adds the configured CORS headers to every response,
+    like ``cors_header_response_callback_factory`` does for Pyramid.
+    """
+
+    def __init__(self, app: Any, config: Config):
+        super().__init__(app)
+        self.headers = get_cors_headers(config)
+
+    async def dispatch(self, request, call_next):
+        """Add the headers to the response."""
+        response = await call_next(request)
+        response.headers.update(self.headers)
+        return response
+
+
+def get_async_app(config_settings: Config = CONFIG_SETTINGS) -> Starlette:
+    """
+    Builds the asyncio app
+
+    Args:
+        config_settings: Settings for the application
+
+    Returns:
+        An instance of a Starlette ASGI app
+
+    """
+    api_route = Path(config_settings.api_route)
+    openapi_spec_path = Path(__file__).parent / "openapi.yaml"
+
+    async def get_openapi_spec(_: Request) -> FileResponse:
+        """Serve the OpenAPI spec that both apps implement."""
+        return FileResponse(openapi_spec_path, media_type="text/yaml")
+
+    publisher = AsyncPublisher(config_settings)
+
+    async def startup() -> None:
+        """Create the S3 client and presigner before serving requests."""
+        if config_settings.s3_fast_presign:
+            # this resolves the credentials, which might block:
+            await run_in_threadpool(get_s3_client_factory().get_presigner)
+
+    async def shutdown() -> None:
+        """Flush pending messages and close all connections."""
+        await publisher.close()
+        if get_async_engine.cache_info().currsize:
+            await get_async_engine().dispose()
+
+    app = Starlette(
+        routes=[
+            Route("/", index, methods=["GET"]),
+            Route("/health", get_health, methods=["GET"]),
+            Route(str(api_route / "openapi.yaml"), get_openapi_spec, methods=["GET"]),
+            Route(
+                str(api_route / "objects" / "{object_id}"),
+                get_objects_id,
+                methods=["GET"],
+            ),
+            Route(
+                str(api_route / "objects" / "{object_id}" / "access" / "{access_id}"),
+                get_objects_id_access_id,
+                methods=["GET"],
+            ),
+        ],
+        middleware=[Middleware(CORSHeaderMiddleware, config=config_settings)],
+        on_startup=[startup],
+        on_shutdown=[shutdown],
+    )
+    app.state.publisher = publisher
+    return app
@@ -0,0 +1,293 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Publishing to Async Messaging Topics using asyncio
+"""
+
+import asyncio
+import json
+import logging
+from typing import Dict, Optional, Tuple
+
+import aio_pika
+
+from .config import Config
+from .pubsub import make_batch_message
+
+
+class AsyncAmqpTopic:
+    """
+    Publishes messages to a topic exchange just like
+    ``ghga_service_chassis_lib.pubsub.AmqpTopic``, but without blocking the
+    event loop. The (robust, i.e. self-reconnecting) connection is opened on
+    the first publish and kept open.
+
+    Args:
+        host: the RabbitMQ host
+        port: the RabbitMQ port
+        topic_name: the name of the topic, also used as exchange name
+            and routing key
+    """
+
+    def __init__(self, host: str, port: int, topic_name: str):
+        self.host = host
+        self.port = port
+        self.topic_name = topic_name
+        # created within the event loop that uses it:
+        self._lock: Optional[asyncio.Lock] = None
+        self._connection: Optional[aio_pika.RobustConnection] = None
+        self._exchange: Optional[aio_pika.Exchange] = None
+
+    async def _get_exchange(self) -> aio_pika.Exchange:
+        """Connect and declare the exchange if not done yet."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._exchange is None:
+                self._connection = await aio_pika.connect_robust(
+                    host=self.host, port=self.port
+                )
+                channel = await self._connection.channel()
+                self._exchange = await channel.declare_exchange(
+                    self.topic_name, aio_pika.ExchangeType.TOPIC
+                )
+            return self._exchange
+
+    async def publish(self, message: dict) -> None:
+        """Publish a message to the topic
+
+        Args:
+            message (dict):
+                The message payload to be send via the topic.
+        """
+        exchange = await self._get_exchange()
+        await exchange.publish(
+            aio_pika.Message(
+                body=json.dumps(message).encode("utf-8"),
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            ),
+            routing_key=self.topic_name,
+        )
+
+    async def close(self) -> None:
+        """Close the connection (if any)."""
+        if self._connection is not None:
+            await self._connection.close()
+        self._connection = None
+        self._exchange = None
+
+
+class AsyncPublisher:  # pylint: disable=too-many-instance-attributes
+    """
+    Publishes download requests from the event loop, following the
+    ``publish_*`` settings like the publishers of the Pyramid app do.
+
+    In "sync" mode, the request waits for the broker. Otherwise, messages
+    are put on a queue holding up to ``publish_queue_size`` of them, which
+    is drained by a task, and ``publish_overflow_policy`` decides what
+    happens when it is full (see ``pubsub.BackgroundPublisher``). In "batch"
+    mode, the task publishes up to ``publish_batch_size`` events at a time
+    as one message, as ``pubsub.BatchingPublisher`` does.
+
+    Args:
+        config: The config for the application
+    """
+
+    _STOP = object()
+
+    def __init__(self, config: Config):
+        self.topic = AsyncAmqpTopic(
+            host=config.rabbitmq_host,
+            port=config.rabbitmq_port,
+            topic_name=config.topic_name_download_requested,
+        )
+        self.mode = config.publish_mode
+        self.queue_size = config.publish_queue_size
+        self.overflow_policy = config.publish_overflow_policy
+        self.block_timeout = config.publish_block_timeout
+        self.batch_size = config.publish_batch_size
+        self.interval = config.publish_batch_interval_ms / 1000
+        self.shutdown_timeout = config.publish_shutdown_timeout
+
+        self.dropped = 0
+
+        # created lazily within the event loop that uses them:
+        self._lazy_queue: Optional[asyncio.Queue] = None
+        self._lazy_batch_full: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def _publish_logged(self, message: dict) -> None:
+        """Publish a message and log failures instead of raising them."""
+        try:
+            await self.topic.publish(message)
+        except Exception:  # pylint: disable=broad-except
+            logging.exception("Failed to publish message in the background.")
+
+    @property
+    def _queue(self) -> asyncio.Queue:
+        """The queue of messages waiting to be published."""
+        if self._lazy_queue is None:
+            self._lazy_queue = asyncio.Queue(maxsize=self.queue_size)
+        return self._lazy_queue
+
+    @property
+    def _batch_full(self) -> asyncio.Event:
+        """Set once enough events are queued to publish a batch."""
+        if self._lazy_batch_full is None:
+            self._lazy_batch_full = asyncio.Event()
+        return self._lazy_batch_full
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        """Start the task draining the queue if it is not running."""
+        if self._worker is None or self._worker.done():
+            run = self._run_batches if self.mode == "batch" else self._run
+            self._worker = asyncio.ensure_future(run(self._queue))
+        return self._queue
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        """Publish the queued messages until the stop marker is received."""
+        while True:
+            message = await queue.get()
+            try:
+                if message is self._STOP:
+                    return
+                await self._publish_logged(message)
+            finally:
+                queue.task_done()
+
+    async def _run_batches(self, queue: asyncio.Queue) -> None:
+        """
+        Publish the queued events in batches until the stop marker is
+        received. A batch is published once ``batch_size`` events were
+        queued or ``interval`` seconds after its first event arrived.
+        """
+        while True:
+            messages = [await queue.get()]
+            if messages[0] is not self._STOP and queue.qsize() + 1 < self.batch_size:
+                self._batch_full.clear()
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+            while (
+                len(messages) < self.batch_size
+                and messages[-1] is not self._STOP
+                and not queue.empty()
+            ):
+                messages.append(queue.get_nowait())
+
+            stopping = messages[-1] is self._STOP
+            events = messages[:-1] if stopping else messages
+            counts: Dict[Tuple[str, str, str], int] = {}
+            for event in events:
+                key = (event["drs_id"], event["access_id"], event["user_id"])
+                counts[key] = counts.get(key, 0) + 1
+            if counts:
+                await self._publish_logged(
+                    make_batch_message(
+                        [
+                            {
+                                "drs_id": drs_id,
+                                "access_id": access_id,
+                                "user_id": user_id,
+                                "count": count,
+                            }
+                            for (drs_id, access_id, user_id), count in counts.items()
+                        ]
+                    )
+                )
+            for _ in messages:
+                queue.task_done()
+            if stopping:
+                return
+
+    async def _enqueue(self, queue: asyncio.Queue, message: dict) -> bool:
+        """Put a message on the queue following the overflow policy.
+        Returns whether the message was queued."""
+        if self.overflow_policy == "block":
+            try:
+                await asyncio.wait_for(queue.put(message), self.block_timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+        while True:
+            try:
+                queue.put_nowait(message)
+                return True
+            except asyncio.QueueFull:
+                if self.overflow_policy == "drop_new":
+                    return False
+            try:
+                queue.get_nowait()
+                queue.task_done()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+
+    async def publish(self, message: dict) -> None:
+        """Publish a message, either right away or in the background.
+
+        Args:
+            message (dict):
+                The message payload to be send via the topic.
+        """
+        if self.mode == "sync":
+            await self.topic.publish(message)
+            return
+
+        queue = self._ensure_worker()
+        if not await self._enqueue(queue, message):
+            self.dropped += 1
+            logging.warning("Publishing queue is full, dropped a message.")
+        elif queue.qsize() + 1 >= self.batch_size:
+            self._batch_full.set()
+
+    async def send_message(self, drs_id: str, access_id: str, user_id: str) -> None:
+        """
+        Send a message when download request arrives
+
+        Args:
+            drs_id: the DRS ID for the file object
+            access_id: the access ID for the file object
+            user_id: the user ID
+
+        """
+        await self.publish(
+            {"drs_id": drs_id, "access_id": access_id, "user_id": user_id}
+        )
+
+    async def close(self) -> None:
+        """
+        Publish the queued messages (waiting at most ``shutdown_timeout``
+        seconds), then close the connection.
+        """
+        worker = self._worker
+        if worker is not None and not worker.done():
+            try:
+                # don't apply the overflow policy to the stop marker:
+                await asyncio.wait_for(
+                    self._queue.put(self._STOP), self.shutdown_timeout
+                )
+                self._batch_full.set()
+                await asyncio.wait_for(worker, self.shutdown_timeout)
+            except asyncio.TimeoutError:
+                logging.warning(
+                    "Dropped %s messages that weren't published before shutdown.",
+                    self._queue.qsize(),
+                )
+                worker.cancel()
+        await self.topic.close()
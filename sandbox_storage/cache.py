@@ -0,0 +1,135 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+In-process caching
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    A thread-safe, size-bounded cache whose entries expire after a
+    time-to-live. When full, the least recently used entry is evicted.
+
+    Hits, misses, evictions (due to the size limit), and expirations are
+    counted.
+
+    Args:
+        max_size: the maximum number of entries
+        ttl: the default time-to-live of an entry in seconds
+        clock: returns the current time in seconds, only used for testing
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (expiry time, value):
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Look up an entry.
+
+        Args:
+            key: the key of the entry
+
+        Returns:
+            The cached value or ``None`` if there is no entry
+            or it has expired
+
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Add or replace an entry.
+
+        Args:
+            key: the key of the entry
+            value: the value to cache
+            ttl: the time-to-live in seconds, overrides the default
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Remove an entry if it exists.
+
+        Args:
+            key: the key of the entry
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the cache statistics.
+
+        Returns:
+            A dictionary with the current size and the number of hits,
+            misses, evictions, and expirations
+
+        """
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
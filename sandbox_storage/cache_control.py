@@ -0,0 +1,158 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Make the caching of responses by clients and proxies configurable
+"""
+
+from typing import Callable, Dict, NamedTuple, Optional, Type
+
+from pyramid.events import NewRequest
+from pyramid.request import Request
+from pyramid.response import Response
+
+from .config import Config
+
+
+class CachePolicy(NamedTuple):
+    """
+    How responses of a route may be cached. If ``max_age`` is set, it is
+    appended to ``cache_control`` (bounded by ``limit_max_age``).
+    """
+
+    cache_control: str
+    max_age: Optional[int] = None
+    vary: Optional[str] = None
+
+
+NO_STORE = CachePolicy(cache_control="no-store")
+
+
+def get_cache_policies(config: Type[Config]) -> Dict[str, CachePolicy]:
+    """
+    Get the cache policies of the routes.
+
+    Args:
+        config: The config for the application
+
+    Returns:
+        A dictionary mapping route names to policies
+
+    """
+    return {
+        # the metadata of an object only changes if it is replaced (by
+        # ``ingest --replace`` or ``sync``), clients and proxies may serve
+        # the old metadata for up to max_age seconds after that:
+        "objects_id": CachePolicy(
+            cache_control="public",
+            max_age=config.cache_control_metadata_max_age,
+            vary="Accept-Encoding",
+        ),
+        # URLs must not be used after their signature expires:
+        "objects_id_access_id": CachePolicy(
+            cache_control="private",
+            max_age=config.cache_control_access_url_max_age,
+            vary="Authorization",
+        ),
+        "objects": NO_STORE,
+        "objects_access": NO_STORE,
+        # the index, and the state of the service at the time of the request:
+        "hello": NO_STORE,
+        "health": NO_STORE,
+        "metrics": NO_STORE,
+    }
+
+
+def limit_max_age(request: Request, max_age: float) -> None:
+    """
+    Make sure the response to a request is not cached for longer than
+    the given number of seconds, e.g. because its content expires.
+
+    Args:
+        request: An instance of ``pyramid.request.Request``
+        max_age: the maximum number of seconds
+    """
+    request.max_age_limit = min(max_age, getattr(request, "max_age_limit", max_age))
+
+
+def get_cache_headers(
+    policy: CachePolicy, max_age_limit: Optional[float] = None
+) -> Dict[str, str]:
+    """
+    Get the caching headers for a response.
+
+    Args:
+        policy: the cache policy of the route
+        max_age_limit: the maximum number of seconds set by ``limit_max_age``
+
+    Returns:
+        A dictionary of headers
+
+    """
+    cache_control = policy.cache_control
+    if policy.max_age is not None:
+        max_age = policy.max_age
+        if max_age_limit is not None:
+            max_age = max(min(max_age, int(max_age_limit)), 0)
+        cache_control += f", max-age={max_age}"
+
+    headers = {"Cache-Control": cache_control}
+    if policy.vary is not None:
+        headers["Vary"] = policy.vary
+    return headers
+
+
+def cache_control_response_callback_factory(config: Type[Config]) -> Callable:
+    """
+    A factory for creating callbacks that set the ``Cache-Control`` and
+    ``Vary`` headers per route as configured by a ``Config`` object.
+    Error responses are never stored.
+
+    Args:
+        config: The config for the application
+
+    Returns:
+        A callable object
+
+    """
+
+    policies = get_cache_policies(config)
+
+    def cache_control_response_callback(event: NewRequest):
+        """
+        Cache control callback that can be added to a pyramid config by:
+        ``config.add_subscriber(<this_function>, NewRequest)``
+        """
+
+        def cache_headers(request: Request, response: Response):
+            """
+            Modifies Responses.
+            """
+
+            if response.status_code >= 400:
+                policy: Optional[CachePolicy] = NO_STORE
+            elif request.matched_route is None:
+                policy = None
+            else:
+                policy = policies.get(request.matched_route.name)
+
+            if policy is not None:
+                response.headers.update(
+                    get_cache_headers(policy, getattr(request, "max_age_limit", None))
+                )
+
+        event.request.add_response_callback(cache_headers)
+
+    return cache_control_response_callback
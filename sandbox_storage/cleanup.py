@@ -0,0 +1,172 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Removes DRS objects from the catalog with set-based deletes
+"""
+
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from sqlalchemy import and_, delete, func, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.elements import ClauseElement
+
+from .dao.db_models import DrsObject
+
+DRS_OBJECTS = DrsObject.__table__
+
+
+@dataclass
+class CleanupStats:
+    """Progress of a cleanup."""
+
+    rows_deleted: int = 0
+    chunks: int = 0
+    truncated: bool = False
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the start."""
+        return time.monotonic() - self.started
+
+    def summary(self) -> str:
+        """Describe the progress and throughput in one line."""
+        elapsed = max(self.elapsed, 1e-9)
+        how = "at once" if self.truncated else f"in {self.chunks} chunks"
+        return (
+            f"{self.rows_deleted} DRS objects deleted {how} "
+            f"in {self.elapsed:.1f} s: {self.rows_deleted / elapsed:.0f} rows/s"
+        )
+
+
+def get_filters(
+    drs_id_prefix: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+) -> List[ClauseElement]:
+    """
+    Build the conditions selecting the DRS objects to delete.
+
+    Args:
+        drs_id_prefix: only objects whose DRS ID starts with this
+        created_after: only objects created at or after this time
+        created_before: only objects created before this time
+
+    Returns:
+        The conditions, empty if all objects are selected
+
+    """
+    filters: List[ClauseElement] = []
+    if drs_id_prefix:
+        filters.append(DRS_OBJECTS.c.drs_id.startswith(drs_id_prefix, autoescape=True))
+    if created_after is not None:
+        filters.append(DRS_OBJECTS.c.created_time >= created_after)
+    if created_before is not None:
+        filters.append(DRS_OBJECTS.c.created_time < created_before)
+    return filters
+
+
+def truncate_drs_objects(engine: Engine) -> int:
+    """
+    Delete all DRS objects at once. Postgres truncates the table, which
+    doesn't scan it, other databases delete all rows in one statement.
+
+    Args:
+        engine: the engine connecting to the database
+
+    Returns:
+        The number of deleted rows
+
+    """
+    with engine.begin() as connection:
+        count = connection.execute(
+            select(func.count()).select_from(DRS_OBJECTS)
+        ).scalar_one()
+        if engine.dialect.name == "postgresql":
+            connection.execute(text(f"TRUNCATE TABLE {DRS_OBJECTS.name}"))
+        else:
+            connection.execute(delete(DRS_OBJECTS))
+    return count
+
+
+def delete_drs_objects(  # pylint: disable=too-many-arguments
+    engine: Engine,
+    drs_id_prefix: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    chunk_size: int = 10000,
+    on_progress: Optional[Callable[[CleanupStats], None]] = None,
+) -> CleanupStats:
+    """
+    Delete the DRS objects matching the filters, or all of them if no filter
+    is given. Matching objects are deleted in ranges of primary keys holding
+    up to ``chunk_size`` of them, each range in its own transaction, so that
+    locks are short and an interrupted cleanup keeps the chunks deleted so
+    far. The filters are evaluated by the database.
+
+    Args:
+        engine: the engine connecting to the database
+        drs_id_prefix: only objects whose DRS ID starts with this
+        created_after: only objects created at or after this time
+        created_before: only objects created before this time
+        chunk_size: the maximal number of objects deleted per transaction
+        on_progress: called with the stats after each chunk
+
+    Returns:
+        The final stats
+
+    """
+    stats = CleanupStats()
+    filters = get_filters(drs_id_prefix, created_after, created_before)
+
+    if not filters:
+        stats.rows_deleted = truncate_drs_objects(engine)
+        stats.truncated = True
+    else:
+        last_id = None
+        while True:
+            conditions = list(filters)
+            if last_id is not None:
+                conditions.append(DRS_OBJECTS.c.id > last_id)
+            # the largest key of the next chunk of matching objects:
+            chunk = (
+                select(DRS_OBJECTS.c.id)
+                .where(and_(*conditions))
+                .order_by(DRS_OBJECTS.c.id)
+                .limit(chunk_size)
+                .subquery()
+            )
+            with engine.begin() as connection:
+                upper_id = connection.execute(select(func.max(chunk.c.id))).scalar_one()
+                if upper_id is None:
+                    break
+                result = connection.execute(
+                    delete(DRS_OBJECTS).where(
+                        and_(*conditions, DRS_OBJECTS.c.id <= upper_id)
+                    )
+                )
+            stats.rows_deleted += result.rowcount
+            stats.chunks += 1
+            last_id = upper_id
+            if on_progress is not None:
+                on_progress(stats)
+
+    if on_progress is not None:
+        on_progress(stats)
+    return stats
@@ -0,0 +1,232 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Command line tools for managing the stored data
+"""
+
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Union
+
+import typer
+
+from .cleanup import CleanupStats, delete_drs_objects
+from .config import Config, get_config
+from .ingest import IngestionStats, ingest_directory, sync_directory
+from .reconcile import ReconciliationStats, reconcile as reconcile_bucket
+
+app = typer.Typer()
+
+
+@app.callback()
+def main():
+    """
+    Manage the data of the storage service.
+    """
+
+
+class ProgressPrinter:
+    """Prints the progress at most every ``interval`` seconds."""
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self._last_printed = 0.0
+
+    def __call__(
+        self, stats: Union[IngestionStats, CleanupStats, ReconciliationStats]
+    ) -> None:
+        now = time.monotonic()
+        if now - self._last_printed >= self.interval:
+            self._last_printed = now
+            typer.echo(stats.summary(), err=True)
+
+
+def get_ingest_config(
+    workers: Optional[int],
+    chunk_size: Optional[int],
+    concurrency: Optional[int],
+    batch_size: Optional[int],
+) -> Config:
+    """Get the config, with the ingestion settings given as options."""
+    overrides = {
+        "ingest_workers": workers,
+        "ingest_multipart_chunksize": chunk_size,
+        "ingest_multipart_concurrency": concurrency,
+        "ingest_batch_size": batch_size,
+    }
+    return get_config().copy(
+        update={key: value for key, value in overrides.items() if value is not None}
+    )
+
+
+@app.command()
+def ingest(  # pylint: disable=too-many-arguments
+    directory: Path = typer.Argument(
+        ..., exists=True, file_okay=False, help="The directory to ingest."
+    ),
+    bucket: str = typer.Option("test", help="The S3 bucket to upload to."),
+    recursive: bool = typer.Option(
+        False,
+        help="Include subdirectories (their DRS IDs contain '/' and can't be "
+        "fetched by ID through the API).",
+    ),
+    workers: int = typer.Option(None, help="Files uploaded in parallel."),
+    chunk_size: int = typer.Option(None, help="Part size of multipart uploads."),
+    concurrency: int = typer.Option(None, help="Parts of a file uploaded at once."),
+    batch_size: int = typer.Option(None, help="Files registered per transaction."),
+    replace: bool = typer.Option(
+        False, help="Upload and update files that are already registered."
+    ),
+):
+    """
+    Upload all files of a directory (and optionally its subdirectories) to
+    S3 and register them as DRS objects, using their relative paths as DRS IDs.
+    Files that are already registered are skipped, unless replaced.
+    Options that are not given are taken from the config.
+    """
+    # pylint: disable=import-outside-toplevel
+    from .dao.db import engine
+
+    stats = ingest_directory(
+        directory,
+        engine,
+        get_ingest_config(workers, chunk_size, concurrency, batch_size),
+        bucket=bucket,
+        recursive=recursive,
+        on_progress=ProgressPrinter(),
+        replace=replace,
+    )
+    typer.echo(stats.summary())
+    if stats.files_failed:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def sync(  # pylint: disable=too-many-arguments
+    directory: Path = typer.Argument(
+        ..., exists=True, file_okay=False, help="The directory to sync."
+    ),
+    manifest: Path = typer.Option(
+        ..., dir_okay=False, help="The manifest of previous syncs (SQLite)."
+    ),
+    bucket: str = typer.Option("test", help="The S3 bucket to upload to."),
+    recursive: bool = typer.Option(
+        False,
+        help="Include subdirectories (their DRS IDs contain '/' and can't be "
+        "fetched by ID through the API).",
+    ),
+    workers: int = typer.Option(None, help="Files uploaded in parallel."),
+    chunk_size: int = typer.Option(None, help="Part size of multipart uploads."),
+    concurrency: int = typer.Option(None, help="Parts of a file uploaded at once."),
+    batch_size: int = typer.Option(None, help="Files registered per transaction."),
+):
+    """
+    Like ingest, but only upload and register files that are new or changed
+    since the last sync with the same manifest. Changed files replace the
+    registered DRS objects. An interrupted sync can simply be run again.
+    """
+    # pylint: disable=import-outside-toplevel
+    from .dao.db import engine
+
+    stats = sync_directory(
+        directory,
+        engine,
+        get_ingest_config(workers, chunk_size, concurrency, batch_size),
+        manifest,
+        bucket=bucket,
+        recursive=recursive,
+        on_progress=ProgressPrinter(),
+    )
+    typer.echo(stats.summary())
+    if stats.files_failed:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def cleanup(  # pylint: disable=too-many-arguments
+    prefix: str = typer.Option(None, help="Only DRS IDs starting with this."),
+    created_after: datetime = typer.Option(
+        None, help="Only objects created at or after this time."
+    ),
+    created_before: datetime = typer.Option(
+        None, help="Only objects created before this time."
+    ),
+    chunk_size: int = typer.Option(None, help="Objects deleted per transaction."),
+    yes: bool = typer.Option(False, "--yes", "-y", help="Don't ask to confirm."),
+):
+    """
+    Delete DRS objects from the database (the S3 objects are kept).
+    Without filters, the whole catalog is wiped at once, otherwise the
+    matching objects are deleted in chunks.
+    """
+    # pylint: disable=import-outside-toplevel
+    from .dao.db import engine
+
+    filtered = prefix or created_after is not None or created_before is not None
+    if not yes:
+        what = "the matching DRS objects" if filtered else "ALL DRS objects"
+        typer.confirm(f"Delete {what}?", abort=True)
+
+    stats = delete_drs_objects(
+        engine,
+        drs_id_prefix=prefix,
+        created_after=created_after,
+        created_before=created_before,
+        chunk_size=chunk_size or get_config().cleanup_chunk_size,
+        on_progress=ProgressPrinter(),
+    )
+    typer.echo(stats.summary())
+
+
+@app.command()
+def reconcile(
+    bucket: str = typer.Option("test", help="The S3 bucket to compare to."),
+    prefix: str = typer.Option("", help="Only keys starting with this."),
+    batch_size: int = typer.Option(None, help="Rows fetched at a time."),
+):
+    """
+    Compare the DRS objects to the objects of a bucket and print the
+    discrepancies as tab-separated lines: kind (missing, orphan, or
+    size_mismatch), key, size in the database, and size in S3.
+    Exits with code 1 if any were found.
+    """
+    # pylint: disable=import-outside-toplevel
+    from .dao.db import engine
+    from .s3 import get_s3_client
+
+    stats = ReconciliationStats()
+    discrepancies = reconcile_bucket(
+        engine,
+        get_s3_client(),
+        bucket,
+        prefix=prefix,
+        batch_size=batch_size or get_config().reconcile_batch_size,
+        on_progress=ProgressPrinter(),
+        stats=stats,
+    )
+    for discrepancy in discrepancies:
+        typer.echo(
+            "\t".join("" if value is None else str(value) for value in discrepancy)
+        )
+    typer.echo(stats.summary(), err=True)
+    if stats.discrepancies:
+        raise typer.Exit(code=1)
+
+
+def run() -> None:
+    """Run the command line tools."""
+    app()
@@ -0,0 +1,127 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Conditional requests for object metadata, which never changes
+after an object was registered
+"""
+
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from .dao.lookup import DrsObjectRecord
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def get_etag(record: DrsObjectRecord) -> str:
+    """
+    Get the strong ETag of a ``DrsObject``, derived from its checksum and
+    creation time (in microseconds since the epoch).
+
+    Args:
+        record: the metadata of the object
+
+    Returns:
+        The quoted ETag
+
+    """
+    created_us = (record.created_time - EPOCH) // timedelta(microseconds=1)
+    return f'"{record.checksum_md5}-{created_us:x}"'
+
+
+def get_last_modified(record: DrsObjectRecord) -> str:
+    """
+    Get the Last-Modified date of a ``DrsObject``,
+    i.e. its creation time (in UTC).
+
+    Args:
+        record: the metadata of the object
+
+    Returns:
+        The HTTP date
+
+    """
+    return format_datetime(
+        record.created_time.replace(microsecond=0, tzinfo=timezone.utc), usegmt=True
+    )
+
+
+def get_validator_headers(record: DrsObjectRecord) -> Dict[str, str]:
+    """
+    Get the ``ETag`` and ``Last-Modified`` headers of a ``DrsObject``.
+
+    Args:
+        record: the metadata of the object
+
+    Returns:
+        A dictionary of headers
+
+    """
+    return {"ETag": get_etag(record), "Last-Modified": get_last_modified(record)}
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Check whether an ``If-None-Match`` header matches an ETag
+    using the weak comparison.
+
+    Args:
+        if_none_match: the value of the header
+        etag: the quoted ETag
+
+    Returns:
+        True if the header matches
+
+    """
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def is_not_modified(
+    record: DrsObjectRecord,
+    if_none_match: Optional[str],
+    if_modified_since: Optional[str],
+) -> bool:
+    """
+    Evaluate the preconditions of a GET request for a ``DrsObject``.
+    ``If-Modified-Since`` is ignored if ``If-None-Match`` is present,
+    as are invalid dates.
+
+    Args:
+        record: the metadata of the object
+        if_none_match: the value of the ``If-None-Match`` header (if any)
+        if_modified_since: the value of the ``If-Modified-Since`` header (if any)
+
+    Returns:
+        True if the object wasn't modified, i.e. 304 should be returned
+
+    """
+    if if_none_match is not None:
+        return etag_matches(if_none_match, get_etag(record))
+
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return record.created_time.replace(microsecond=0) <= since
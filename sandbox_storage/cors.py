@@ -17,7 +17,7 @@
 Make CORS configurable
 """
 
-from typing import Callable, Type, List
+from typing import Callable, Dict, Type, List
 from pyramid.events import NewRequest
 from pyramid.request import Request
 from pyramid.response import Response
@@ -40,6 +40,33 @@ def list_to_comma_sep_str(list_of_str: List[str]) -> str:
     return ",".join(list_of_str)
 
 
+def get_cors_headers(config: Type[Config]) -> Dict[str, str]:
+    """
+    Get the CORS headers to add to every response.
+
+    Args:
+        config: The config for the application
+
+    Returns:
+        A dictionary of headers
+
+    """
+    return {
+        "Access-Control-Allow-Origin": list_to_comma_sep_str(
+            config.cors_allowed_origins
+        ),
+        "Access-Control-Allow-Methods": list_to_comma_sep_str(
+            config.cors_allowed_methods
+        ),
+        "Access-Control-Allow-Headers": list_to_comma_sep_str(
+            config.cors_allowed_headers
+        ),
+        "Access-Control-Allow-Credentials": "true"
+        if config.cors_allow_credentials
+        else "false",
+    }
+
+
 def cors_header_response_callback_factory(config: Type[Config]) -> Callable:
     """
     A factory for creating CORS header callbacks that are
@@ -64,22 +91,7 @@ def cors_header_response_callback_factory(config: Type[Config]) -> Callable:
             Modifies Requests.
             """
 
-            response.headers.update(
-                {
-                    "Access-Control-Allow-Origin": list_to_comma_sep_str(
-                        config.cors_allowed_origins
-                    ),
-                    "Access-Control-Allow-Methods": list_to_comma_sep_str(
-                        config.cors_allowed_methods
-                    ),
-                    "Access-Control-Allow-Headers": list_to_comma_sep_str(
-                        config.cors_allowed_headers
-                    ),
-                    "Access-Control-Allow-Credentials": "true"
-                    if config.cors_allow_credentials
-                    else "false",
-                }
-            )
+            response.headers.update(get_cors_headers(config))
 
         event.request.add_response_callback(cors_headers)
 
@@ -0,0 +1,59 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Connect to Database using asyncio
+"""
+
+from functools import lru_cache
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from ..config import get_config
+
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def get_async_db_url(db_url: str) -> str:
+    """
+    Switch a database URL to the asyncio driver of its dialect,
+    e.g. "postgresql://..." to "postgresql+asyncpg://...".
+
+    Args:
+        db_url: the database URL
+
+    Returns:
+        The database URL using an asyncio driver
+
+    """
+    url = make_url(db_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver known for '{backend}' databases.")
+    return str(url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}"))
+
+
+@lru_cache
+def get_async_engine() -> AsyncEngine:
+    """
+    Get the asyncio engine for the configured database.
+    It is created on first use, i.e. within the event loop.
+
+    Returns:
+        An instance of a SQLAlchemy ``AsyncEngine``
+
+    """
+    return create_async_engine(get_async_db_url(get_config().db_url))
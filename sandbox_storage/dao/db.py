@@ -17,32 +17,50 @@
 Connect to Database
 """
 
+from typing import Any, Dict, Optional
+
 import sqlalchemy
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
 from zope.sqlalchemy import register
-from ..config import get_config
+from ..config import Config, get_config
+from .pool import InstrumentedQueuePool
 
 # SQLALCHEMY_DATABASE_URL = "sqlite:///./sql_app.db"
 SQLALCHEMY_DATABASE_URL = get_config().db_url
 
 
-def get_engine(db_url: str) -> sqlalchemy.engine:
+def get_engine(db_url: str, config: Optional[Config] = None) -> sqlalchemy.engine:
     """
     Get sqlalchemy engine
 
     Args:
         db_url: the database URL
+        config: The config for the application, to configure the
+            connection pool (the pool of SQLite databases is left as is)
 
     Returns:
         An instance of a SQLAlchemy engine
 
     """
-    return create_engine(db_url)
+    if config is None:
+        return create_engine(db_url)
+
+    pool_options: Dict[str, Any] = {"pool_pre_ping": config.db_pool_pre_ping}
+    if make_url(db_url).get_backend_name() != "sqlite":
+        pool_options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=config.db_pool_size,
+            max_overflow=config.db_max_overflow,
+            pool_timeout=config.db_pool_timeout,
+            pool_recycle=config.db_pool_recycle,
+        )
+    return create_engine(db_url, **pool_options)
 
 
-engine = get_engine(SQLALCHEMY_DATABASE_URL)
+engine = get_engine(SQLALCHEMY_DATABASE_URL, get_config())
 DBSession = scoped_session(sessionmaker(bind=engine))
 register(DBSession)
 
@@ -17,7 +17,7 @@
 Database Models
 """
 
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Index
 from .db import Base
 
 
@@ -33,3 +33,12 @@ class DrsObject(Base):
     size = Column(Integer, nullable=False)
     created_time = Column(DateTime, nullable=False)
     checksum_md5 = Column(String, nullable=False)
+
+    __table_args__ = (
+        # covers the lookups by drs_id, see the migration that adds it:
+        Index(
+            "ix_drs_objects_drs_id_covering",
+            "drs_id",
+            postgresql_include=["path", "size", "created_time", "checksum_md5"],
+        ),
+    )
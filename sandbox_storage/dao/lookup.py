@@ -0,0 +1,245 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Read-only lookups of DRS objects
+"""
+
+import os
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, TypeVar
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+
+from ..cache import TTLCache
+from ..config import get_config
+from .async_db import get_async_engine
+from .db import get_session
+from .db_models import DrsObject
+from .replicas import get_replica_router
+
+T = TypeVar("T")
+
+
+class DrsObjectRecord(NamedTuple):
+    """The fields of a ``DrsObject`` that are needed to serve it."""
+
+    drs_id: str
+    path: str
+    size: int
+    created_time: datetime
+    checksum_md5: str
+
+
+DRS_OBJECTS = DrsObject.__table__
+
+# Core statements selecting only the columns of a ``DrsObjectRecord``,
+# built once so that SQLAlchemy compiles them once per engine (and dialect):
+SELECT_DRS_OBJECT = select(
+    DRS_OBJECTS.c.drs_id,
+    DRS_OBJECTS.c.path,
+    DRS_OBJECTS.c.size,
+    DRS_OBJECTS.c.created_time,
+    DRS_OBJECTS.c.checksum_md5,
+).where(DRS_OBJECTS.c.drs_id == bindparam("drs_id"))
+SELECT_DRS_OBJECTS = select(*SELECT_DRS_OBJECT.selected_columns).where(
+    DRS_OBJECTS.c.drs_id.in_(bindparam("drs_ids", expanding=True))
+)
+
+
+def run_read_only(query: Callable[[Session], T]) -> T:
+    """
+    Run a read-only query on a replica if any are configured,
+    otherwise using the session of the primary.
+
+    Args:
+        query: a function running the query using the given session
+
+    Returns:
+        The result of the query function
+
+    """
+    router = get_replica_router()
+    if router is None:
+        return query(get_session())
+    return router.run(query)
+
+
+def query_drs_object(object_id: str) -> Optional[DrsObjectRecord]:
+    """
+    Look up a ``DrsObject`` in the database, selecting only the columns
+    of the record instead of loading an ORM instance.
+
+    Args:
+        object_id: the DRS ID of the object
+
+    Returns:
+        An instance of ``DrsObjectRecord`` or ``None`` if it doesn't exist
+
+    """
+
+    def query(db: Session) -> Optional[DrsObjectRecord]:
+        row = db.connection().execute(SELECT_DRS_OBJECT, {"drs_id": object_id}).first()
+        return None if row is None else DrsObjectRecord._make(row)
+
+    return run_read_only(query)
+
+
+def query_drs_objects(object_ids: Iterable[str]) -> Dict[str, DrsObjectRecord]:
+    """
+    Look up multiple ``DrsObject`` in the database using a single query.
+
+    Args:
+        object_ids: the DRS IDs of the objects
+
+    Returns:
+        A dictionary mapping the DRS IDs of the existing objects
+        to instances of ``DrsObjectRecord``
+
+    """
+    object_ids = list(object_ids)
+    if not object_ids:
+        return {}
+
+    def query(db: Session) -> Dict[str, DrsObjectRecord]:
+        rows = db.connection().execute(SELECT_DRS_OBJECTS, {"drs_ids": object_ids})
+        return {row.drs_id: DrsObjectRecord._make(row) for row in rows}
+
+    return run_read_only(query)
+
+
+@lru_cache
+def get_metadata_cache() -> Optional[TTLCache]:
+    """
+    Get the cache of DRS object metadata of this process.
+
+    Returns:
+        An instance of ``TTLCache`` or ``None`` if the cache is disabled
+
+    """
+    config = get_config()
+    if not config.metadata_cache_enabled:
+        return None
+    return TTLCache(max_size=config.metadata_cache_size, ttl=config.metadata_cache_ttl)
+
+
+# forked children start with an empty cache of their own:
+os.register_at_fork(after_in_child=get_metadata_cache.cache_clear)
+
+
+def get_drs_object(object_id: str) -> Optional[DrsObjectRecord]:
+    """
+    Look up a ``DrsObject``, served from the metadata cache if possible.
+    Only existing objects are cached.
+
+    Args:
+        object_id: the DRS ID of the object
+
+    Returns:
+        An instance of ``DrsObjectRecord`` or ``None`` if it doesn't exist
+
+    """
+    cache = get_metadata_cache()
+    if cache is None:
+        return query_drs_object(object_id)
+
+    record = cache.get(object_id)
+    if record is None:
+        record = query_drs_object(object_id)
+        if record is not None:
+            cache.set(object_id, record)
+    return record
+
+
+def get_drs_objects(object_ids: Iterable[str]) -> Dict[str, DrsObjectRecord]:
+    """
+    Look up multiple ``DrsObject``. Objects that are not in the metadata
+    cache are fetched from the database using a single query.
+
+    Args:
+        object_ids: the DRS IDs of the objects
+
+    Returns:
+        A dictionary mapping the DRS IDs of the existing objects
+        to instances of ``DrsObjectRecord``
+
+    """
+    cache = get_metadata_cache()
+    if cache is None:
+        return query_drs_objects(object_ids)
+
+    records = {}
+    missing = []
+    for object_id in object_ids:
+        record = cache.get(object_id)
+        if record is None:
+            missing.append(object_id)
+        else:
+            records[object_id] = record
+
+    for object_id, record in query_drs_objects(missing).items():
+        cache.set(object_id, record)
+        records[object_id] = record
+    return records
+
+
+async def get_drs_object_async(object_id: str) -> Optional[DrsObjectRecord]:
+    """
+    Look up a ``DrsObject`` using the asyncio engine, served from the
+    metadata cache if possible. Only existing objects are cached.
+
+    Args:
+        object_id: the DRS ID of the object
+
+    Returns:
+        An instance of ``DrsObjectRecord`` or ``None`` if it doesn't exist
+
+    """
+    cache = get_metadata_cache()
+    record = None if cache is None else cache.get(object_id)
+    if record is not None:
+        return record
+
+    async with get_async_engine().connect() as connection:
+        result = await connection.execute(SELECT_DRS_OBJECT, {"drs_id": object_id})
+        row = result.first()
+    if row is None:
+        return None
+
+    record = DrsObjectRecord._make(row)
+    if cache is not None:
+        cache.set(object_id, record)
+    return record
+
+
+def invalidate_drs_object(object_id: Optional[str] = None) -> None:
+    """
+    Remove an object from the metadata cache, e.g. after it was
+    modified or deleted.
+
+    Args:
+        object_id:
+            the DRS ID of the object,
+            if ``None``, the entire cache is cleared
+    """
+    cache = get_metadata_cache()
+    if cache is None:
+        return
+    if object_id is None:
+        cache.clear()
+    else:
+        cache.invalidate(object_id)
@@ -0,0 +1,105 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Connection pool with checkout metrics
+"""
+
+import threading
+import time
+from typing import Any, Dict
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class CheckoutMetrics:
+    """Counts the checkouts of a pool and the time spent waiting for them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, wait_seconds: float, timed_out: bool = False) -> None:
+        """Record a checkout (or an attempt that timed out)."""
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Get the recorded numbers."""
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    A ``QueuePool`` that measures how long checkouts take, i.e. the time
+    waiting for a free connection, opening new ones, and pre-pinging.
+    Recreating the pool (e.g. by ``engine.dispose()``) resets the metrics.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_metrics = CheckoutMetrics()
+
+    def connect(self):
+        """Check out a connection."""
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.checkout_metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.checkout_metrics.record(time.perf_counter() - start)
+        return connection
+
+
+def get_pool_metrics(engine: Engine) -> Dict[str, Any]:
+    """
+    Get the state of the connection pool of an engine.
+
+    Args:
+        engine: the engine
+
+    Returns:
+        A dictionary with the numbers of pooled, checked-out and overflow
+        connections (for queue pools), and the checkout metrics (if measured)
+
+    """
+    pool = engine.pool
+    metrics: Dict[str, Any] = {}
+    if isinstance(pool, QueuePool):
+        metrics.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    if isinstance(pool, InstrumentedQueuePool):
+        metrics.update(pool.checkout_metrics.metrics())
+    return metrics
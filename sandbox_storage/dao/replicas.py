@@ -0,0 +1,239 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Route read-only queries to database replicas
+"""
+
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+
+from ..config import Config, get_config
+from .db import engine as primary_engine
+from .db import get_engine
+
+T = TypeVar("T")
+
+REPLICA_ERRORS = (DBAPIError, PoolTimeoutError)
+
+# the replication lag in seconds, 0 if all received changes are replayed,
+# NULL if the server is no standby or hasn't replayed a transaction yet:
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class Replica:
+    """
+    A read replica and its health.
+
+    Args:
+        engine: the engine connecting to the replica
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.name = engine.url.render_as_string(hide_password=True)
+        self.active = 0
+        self.errors = 0
+        self.ejected_until = 0.0
+        self.lag: Optional[float] = None
+        self.lag_checked_at: Optional[float] = None
+
+    def metrics(self, now: float) -> Dict[str, Any]:
+        """Get the state of the replica at the given time."""
+        return {
+            "active": self.active,
+            "errors": self.errors,
+            "ejected": self.ejected_until > now,
+            "lag": self.lag,
+        }
+
+
+class ReplicaRouter:  # pylint: disable=too-many-instance-attributes
+    """
+    Runs read-only queries on replicas, selected round-robin or by the
+    least number of running queries.
+
+    A replica is ejected for ``eject_seconds`` after ``error_threshold``
+    consecutive errors, or until its next lag check if its replication lag
+    exceeds ``max_lag`` seconds (only checked for PostgreSQL). Queries that
+    fail on a replica, or find no healthy replica, run on the primary.
+
+    Args:
+        primary: the engine connecting to the primary
+        replicas: the engines connecting to the replicas
+        config: The config for the application
+        clock: returns the current time in seconds
+    """
+
+    def __init__(
+        self,
+        primary: Engine,
+        replicas: List[Engine],
+        config: Config,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.primary = primary
+        self.replicas = [Replica(engine) for engine in replicas]
+        self.least_connections = config.db_replica_selection == "least_connections"
+        self.max_lag = config.db_replica_max_lag
+        self.lag_check_interval = config.db_replica_lag_check_interval
+        self.error_threshold = config.db_replica_error_threshold
+        self.eject_seconds = config.db_replica_eject_seconds
+        self.clock = clock
+        self.fallbacks = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _check_lag(self, replica: Replica) -> Optional[float]:
+        """
+        Query the replication lag of a replica (PostgreSQL only),
+        None if it is unknown.
+        """
+        if replica.engine.dialect.name != "postgresql":
+            return None
+        with replica.engine.connect() as connection:
+            lag = connection.execute(POSTGRES_LAG_QUERY).scalar()
+        return None if lag is None else float(lag)
+
+    def _is_lagging(self, replica: Replica) -> bool:
+        """Check the replication lag (at most once per interval)."""
+        if self.max_lag <= 0:
+            return False
+
+        now = self.clock()
+        if (
+            replica.lag_checked_at is None
+            or now - replica.lag_checked_at >= self.lag_check_interval
+        ):
+            replica.lag_checked_at = now
+            replica.lag = self._check_lag(replica)
+        return replica.lag is not None and replica.lag > self.max_lag
+
+    def _select(self) -> Optional[Replica]:
+        """Choose a healthy replica and mark it as active."""
+        with self._lock:
+            now = self.clock()
+            healthy = [
+                replica for replica in self.replicas if replica.ejected_until <= now
+            ]
+            if not healthy:
+                return None
+            if self.least_connections:
+                replica = min(healthy, key=lambda replica: replica.active)
+            else:
+                replica = healthy[self._next % len(healthy)]
+                self._next += 1
+            replica.active += 1
+            return replica
+
+    def _record_error(self, replica: Replica) -> None:
+        """Count an error and eject the replica if there are too many."""
+        with self._lock:
+            replica.errors += 1
+            if replica.errors >= self.error_threshold:
+                replica.ejected_until = self.clock() + self.eject_seconds
+                logging.warning(
+                    "Ejected database replica %s for %s seconds after %s errors.",
+                    replica.name,
+                    self.eject_seconds,
+                    replica.errors,
+                )
+
+    def run(self, query: Callable[[Session], T]) -> T:
+        """
+        Run a read-only query on a replica, or on the primary as fallback.
+
+        Args:
+            query: a function running the query using the given session
+
+        Returns:
+            The result of the query function
+
+        """
+        replica = self._select()
+        if replica is not None:
+            try:
+                if self._is_lagging(replica):
+                    # the lag was checked by ``_is_lagging``, so this is set:
+                    checked_at = replica.lag_checked_at or 0.0
+                    with self._lock:
+                        replica.ejected_until = checked_at + self.lag_check_interval
+                else:
+                    with Session(bind=replica.engine) as session:
+                        result = query(session)
+                    with self._lock:
+                        replica.errors = 0
+                    return result
+            except REPLICA_ERRORS:
+                logging.exception("Query failed on replica %s.", replica.name)
+                self._record_error(replica)
+            finally:
+                with self._lock:
+                    replica.active -= 1
+
+        self.fallbacks += 1
+        with Session(bind=self.primary) as session:
+            return query(session)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Get the state of the replicas and the number of fallbacks."""
+        now = self.clock()
+        return {
+            "fallbacks": self.fallbacks,
+            "replicas": {
+                replica.name: replica.metrics(now) for replica in self.replicas
+            },
+        }
+
+    def dispose(self) -> None:
+        """Close the connections of all replicas."""
+        for replica in self.replicas:
+            replica.engine.dispose()
+
+
+@lru_cache
+def get_replica_router() -> Optional[ReplicaRouter]:
+    """
+    Get the router for read-only queries of this process.
+
+    Returns:
+        An instance of ``ReplicaRouter`` or ``None`` if no replicas are configured
+
+    """
+    config = get_config()
+    if not config.db_replica_urls:
+        return None
+    return ReplicaRouter(
+        primary=primary_engine,
+        replicas=[get_engine(url, config) for url in config.db_replica_urls],
+        config=config,
+    )
+
+
+# forked children connect to the replicas on their own:
+os.register_at_fork(after_in_child=get_replica_router.cache_clear)
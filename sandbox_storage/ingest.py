@@ -0,0 +1,560 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Ingest a directory of files: upload them to S3 and register them as DRS objects
+"""
+
+import hashlib
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+)
+
+import boto3
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import ClientError
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+
+from .config import Config
+from .dao.db_models import DrsObject
+from .manifest import REGISTERED, Manifest
+
+
+class FileToIngest(NamedTuple):
+    """A file found in the directory to ingest."""
+
+    drs_id: str
+    file_path: Path
+    size: int
+    created_time: datetime
+    # the modification time in ns:
+    mtime: int = 0
+
+
+@dataclass
+class IngestionStats:  # pylint: disable=too-many-instance-attributes
+    """Progress of an ingestion."""
+
+    files_total: int = 0
+    bytes_total: int = 0
+    files_uploaded: int = 0
+    bytes_uploaded: int = 0
+    files_registered: int = 0
+    files_failed: int = 0
+    files_unchanged: int = 0
+    files_registered_before: int = 0
+    batches: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the start."""
+        return time.monotonic() - self.started
+
+    def summary(self) -> str:
+        """Describe the progress and throughput in one line."""
+        elapsed = max(self.elapsed, 1e-9)
+        return (
+            f"{self.files_uploaded}/{self.files_total} files "
+            f"({self.bytes_uploaded / 1e6:.1f}/{self.bytes_total / 1e6:.1f} MB) "
+            f"uploaded, {self.files_registered} registered, "
+            f"{self.files_failed} failed, {self.files_unchanged} unchanged, "
+            f"{self.files_registered_before} already registered "
+            f"in {self.elapsed:.1f} s: "
+            f"{self.files_uploaded / elapsed:.1f} files/s, "
+            f"{self.bytes_uploaded / 1e6 / elapsed:.1f} MB/s"
+        )
+
+
+def scan_directory(directory: Path, recursive: bool = False) -> Iterator[FileToIngest]:
+    """
+    Find all files in a directory (and optionally its subdirectories).
+    Their DRS IDs (and S3 keys) are their paths relative to the directory,
+    so the files of subdirectories get DRS IDs containing "/", which the
+    route ``objects/{object_id}`` doesn't match.
+
+    Args:
+        directory: the directory to ingest
+        recursive: whether to include the files of subdirectories
+
+    Yields:
+        The files to ingest
+
+    """
+    pending = [directory]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if recursive and entry.is_dir(follow_symlinks=False):
+                    pending.append(Path(entry.path))
+                elif entry.is_file():
+                    stat = entry.stat()
+                    file_path = Path(entry.path)
+                    yield FileToIngest(
+                        drs_id=file_path.relative_to(directory).as_posix(),
+                        file_path=file_path,
+                        size=stat.st_size,
+                        created_time=datetime.fromtimestamp(stat.st_ctime),
+                        mtime=stat.st_mtime_ns,
+                    )
+
+
+class UploadResult(NamedTuple):
+    """What was read while uploading a file."""
+
+    checksum_md5: str
+    size: int
+
+
+def upload_with_md5(  # pylint: disable=too-many-arguments
+    client: Any,
+    file_path: Path,
+    bucket: str,
+    key: str,
+    chunk_size: int,
+    concurrency: int,
+    executor: Optional[Executor] = None,
+) -> UploadResult:
+    """
+    Upload a file to S3 and compute its MD5 checksum while reading it once.
+    Each chunk that is read is added to the digest and uploaded as a part of
+    a multipart upload; files up to one chunk are uploaded with a single put.
+    At most ``concurrency`` parts of the file are held in memory and uploaded
+    at the same time. A failed multipart upload is aborted.
+
+    Args:
+        client: the S3 client
+        file_path: the file to upload
+        bucket: the S3 bucket to upload to
+        key: the key of the S3 object
+        chunk_size: the size of the parts (at least 5 MiB, except for the last)
+        concurrency: the number of parts uploaded at the same time
+        executor: uploads the parts, defaults to a new pool of
+            ``concurrency`` threads
+
+    Returns:
+        The checksum and the number of bytes uploaded
+
+    """
+    hash_md5 = hashlib.md5()  # nosec
+    with open(file_path, "rb") as file:
+        chunk = file.read(chunk_size)
+        hash_md5.update(chunk)
+        next_chunk = file.read(chunk_size) if len(chunk) == chunk_size else b""
+        if not next_chunk:
+            client.put_object(Bucket=bucket, Key=key, Body=chunk)
+            return UploadResult(hash_md5.hexdigest(), len(chunk))
+
+        upload_id = client.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+        own_executor = executor is None
+        part_executor = (
+            ThreadPoolExecutor(max_workers=concurrency)
+            if executor is None
+            else executor
+        )
+
+        def upload_part(part_number: int, body: bytes) -> Dict[str, Any]:
+            response = client.upload_part(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=body,
+            )
+            return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+        size = len(chunk)
+        in_flight: Deque[Future] = deque()
+        parts = []
+        try:
+            part_number = 1
+            while chunk:
+                if len(in_flight) >= concurrency:
+                    parts.append(in_flight.popleft().result())
+                in_flight.append(part_executor.submit(upload_part, part_number, chunk))
+                part_number += 1
+                chunk, next_chunk = next_chunk, file.read(chunk_size)
+                hash_md5.update(chunk)
+                size += len(chunk)
+            parts.extend(future.result() for future in in_flight)
+            client.complete_multipart_upload(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            for future in in_flight:
+                future.cancel()
+            client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            raise
+        finally:
+            if own_executor:
+                part_executor.shutdown(wait=True)
+
+    return UploadResult(hash_md5.hexdigest(), size)
+
+
+def insert_drs_objects(
+    engine: Engine, rows: List[Dict[str, Any]], replace: bool = False
+) -> None:
+    """
+    Insert DRS objects using a single statement and transaction,
+    objects whose DRS ID is already registered are skipped (or updated).
+
+    Args:
+        engine: the engine connecting to the database
+        rows: the column values of the objects
+        replace: update the objects that are already registered instead
+    """
+    table = DrsObject.__table__
+    dialects = {"postgresql": postgresql, "sqlite": sqlite}
+    dialect = dialects.get(engine.dialect.name)
+    if dialect is None:
+        statement = table.insert()
+    elif replace:
+        statement = dialect.insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=["drs_id"],
+            set_={
+                column: statement.excluded[column]
+                for column in ("path", "size", "created_time", "checksum_md5")
+            },
+        )
+    else:
+        statement = dialect.insert(table).on_conflict_do_nothing(
+            index_elements=["drs_id"]
+        )
+    with engine.begin() as connection:
+        connection.execute(statement, rows)
+
+
+class Ingestion:
+    """
+    Uploads the files of a directory with a bounded pool of workers and
+    registers them in the database in batches. Each file is read only once,
+    see ``upload_with_md5``, the parts of large files are uploaded by a
+    second pool shared by all workers.
+
+    Files whose DRS IDs are already registered are skipped, since their
+    S3 objects would no longer match the registered size and checksum,
+    unless they are replaced. With a manifest, only new and changed files
+    are uploaded and the registered ones are replaced, see ``sync_directory``.
+
+    Args:
+        engine: the engine connecting to the database
+        config: The config for the application
+        bucket: the S3 bucket to upload to
+        on_progress: called with the stats after each file
+        manifest: the files synced before
+        replace: upload all files and update the registered ones
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        engine: Engine,
+        config: Config,
+        bucket: str,
+        on_progress: Optional[Callable[[IngestionStats], None]] = None,
+        manifest: Optional[Manifest] = None,
+        replace: bool = False,
+    ):
+        self.engine = engine
+        self.config = config
+        self.bucket = bucket
+        self.on_progress = on_progress
+        self.manifest = manifest
+        self.replace = replace or manifest is not None
+        self.stats = IngestionStats()
+        self.client = boto3.client(
+            service_name="s3",
+            endpoint_url=config.s3_url,
+            config=BotoConfig(
+                # enough connections for all parts uploaded at the same time:
+                max_pool_connections=config.ingest_workers
+                * config.ingest_multipart_concurrency,
+            ),
+        )
+        self._pending_rows: List[Dict[str, Any]] = []
+        self._part_executor: Optional[Executor] = None
+
+    def ensure_bucket(self) -> None:
+        """Create the bucket if it doesn't exist."""
+        try:
+            self.client.head_bucket(Bucket=self.bucket)
+        except ClientError:
+            self.client.create_bucket(Bucket=self.bucket)
+
+    def upload(self, file: FileToIngest) -> Dict[str, Any]:
+        """
+        Upload a file and get the column values of its ``DrsObject``.
+
+        Args:
+            file: the file to upload
+
+        Returns:
+            The column values
+
+        """
+        result = upload_with_md5(
+            self.client,
+            file.file_path,
+            self.bucket,
+            file.drs_id,
+            chunk_size=self.config.ingest_multipart_chunksize,
+            concurrency=self.config.ingest_multipart_concurrency,
+            executor=self._part_executor,
+        )
+        return self._get_row(file, result)
+
+    def _get_row(self, file: FileToIngest, result: UploadResult) -> Dict[str, Any]:
+        """Get the column values of the ``DrsObject`` of an uploaded file."""
+        return {
+            "drs_id": file.drs_id,
+            "path": f"{self.config.s3_url}/{self.bucket}/{file.drs_id}",
+            "size": result.size,
+            "created_time": file.created_time,
+            "checksum_md5": result.checksum_md5,
+        }
+
+    def _select_changed(
+        self, files: List[FileToIngest], manifest: Manifest
+    ) -> List[FileToIngest]:
+        """
+        Compare the files to the manifest and get those to upload.
+        Files that were uploaded, but not registered, are registered
+        without being read again.
+        """
+        entries = manifest.entries()
+        changed = []
+        for file in files:
+            entry = entries.get(file.drs_id)
+            if entry is None or (entry.size, entry.mtime) != (file.size, file.mtime):
+                changed.append(file)
+            elif entry.status == REGISTERED:
+                self.stats.files_unchanged += 1
+            else:
+                result = UploadResult(entry.md5, entry.size)
+                self._pending_rows.append(self._get_row(file, result))
+        return changed
+
+    def _select_unregistered(self, files: List[FileToIngest]) -> List[FileToIngest]:
+        """Skip the files whose DRS IDs are already registered."""
+        drs_id = DrsObject.__table__.c.drs_id
+        registered: Set[str] = set()
+        batch_size = self.config.ingest_batch_size
+        with self.engine.connect() as connection:
+            for start in range(0, len(files), batch_size):
+                stop = start + batch_size
+                drs_ids = [file.drs_id for file in files[start:stop]]
+                registered.update(
+                    connection.execute(
+                        select(drs_id).where(drs_id.in_(drs_ids))
+                    ).scalars()
+                )
+        if registered:
+            logging.warning(
+                "Skipped %s files that are already registered, e.g. %s.",
+                len(registered),
+                min(registered),
+            )
+        self.stats.files_registered_before = len(registered)
+        return [file for file in files if file.drs_id not in registered]
+
+    def _flush(self) -> None:
+        """Register the uploaded files that are not registered yet."""
+        if self._pending_rows:
+            insert_drs_objects(self.engine, self._pending_rows, replace=self.replace)
+            if self.manifest is not None:
+                self.manifest.record_registered(
+                    row["drs_id"] for row in self._pending_rows
+                )
+            self.stats.files_registered += len(self._pending_rows)
+            self.stats.batches += 1
+            self._pending_rows = []
+
+    def _collect(self, future: Future, file: FileToIngest) -> None:
+        """Collect the result of an upload."""
+        try:
+            row = future.result()
+        except Exception:  # pylint: disable=broad-except
+            logging.exception("Failed to upload %s.", file.file_path)
+            self.stats.files_failed += 1
+        else:
+            self.stats.files_uploaded += 1
+            self.stats.bytes_uploaded += row["size"]
+            if self.manifest is not None:
+                # the size and time of the scan, so that changes during the
+                # upload are detected by the next sync:
+                self.manifest.record_uploaded(
+                    file.drs_id, file.size, file.mtime, row["checksum_md5"]
+                )
+            self._pending_rows.append(row)
+            if len(self._pending_rows) >= self.config.ingest_batch_size:
+                self._flush()
+
+        if self.on_progress is not None:
+            self.on_progress(self.stats)
+
+    def _collect_done(self, done: Set[Future], in_flight: Dict[Future, FileToIngest]):
+        """Collect the results of finished uploads."""
+        for future in done:
+            self._collect(future, in_flight.pop(future))
+
+    def run(self, files: List[FileToIngest]) -> IngestionStats:
+        """
+        Upload and register the files.
+
+        Args:
+            files: the files to ingest
+
+        Returns:
+            The final stats
+
+        """
+        if self.manifest is not None:
+            files = self._select_changed(files, self.manifest)
+        elif not self.replace:
+            files = self._select_unregistered(files)
+        self.stats.files_total = len(files)
+        self.stats.bytes_total = sum(file.size for file in files)
+        self.ensure_bucket()
+
+        # only a few uploads are queued ahead, so that memory stays bounded:
+        max_in_flight = 2 * self.config.ingest_workers
+        in_flight: Dict[Future, FileToIngest] = {}
+        with ThreadPoolExecutor(
+            max_workers=self.config.ingest_workers
+        ) as executor, ThreadPoolExecutor(
+            max_workers=self.config.ingest_workers
+            * self.config.ingest_multipart_concurrency
+        ) as self._part_executor:
+            for file in files:
+                if len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    self._collect_done(done, in_flight)
+                in_flight[executor.submit(self.upload, file)] = file
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                self._collect_done(done, in_flight)
+
+        self._flush()
+        if self.on_progress is not None:
+            self.on_progress(self.stats)
+        return self.stats
+
+
+def ingest_directory(
+    directory: Path,
+    engine: Engine,
+    config: Config,
+    bucket: str = "test",
+    recursive: bool = False,
+    on_progress: Optional[Callable[[IngestionStats], None]] = None,
+    replace: bool = False,
+) -> IngestionStats:
+    """
+    Upload all files of a directory to S3 and register them as DRS objects.
+    Files that are already registered are skipped, unless they are replaced.
+
+    Args:
+        directory: the directory to ingest
+        engine: the engine connecting to the database
+        config: The config for the application
+        bucket: the S3 bucket to upload to
+        recursive: whether to include the files of subdirectories
+        on_progress: called with the stats after each file
+        replace: upload all files and update the registered ones
+
+    Returns:
+        The final stats
+
+    """
+    files = sorted(scan_directory(directory, recursive), key=lambda file: file.drs_id)
+    return Ingestion(engine, config, bucket, on_progress, replace=replace).run(files)
+
+
+def sync_directory(  # pylint: disable=too-many-arguments
+    directory: Path,
+    engine: Engine,
+    config: Config,
+    manifest_path: Path,
+    bucket: str = "test",
+    recursive: bool = False,
+    on_progress: Optional[Callable[[IngestionStats], None]] = None,
+) -> IngestionStats:
+    """
+    Upload and register the files of a directory that are new or changed
+    (by size or modification time) since the last sync, as recorded in the
+    manifest. Changed files replace their S3 objects and DRS objects. An
+    interrupted sync resumes where it stopped. The manifest belongs to one
+    database and bucket, it has to be removed when they are wiped.
+
+    Args:
+        directory: the directory to sync
+        engine: the engine connecting to the database
+        config: The config for the application
+        manifest_path: the manifest of the previous syncs, created if missing
+        bucket: the S3 bucket to upload to
+        recursive: whether to include the files of subdirectories
+        on_progress: called with the stats after each file
+
+    Returns:
+        The final stats
+
+    """
+    manifest_path = manifest_path.resolve()
+    # the manifest (and its journal) might be kept in the directory itself:
+    manifest_files = {
+        manifest_path.with_name(manifest_path.name + suffix)
+        for suffix in ("", "-wal", "-shm", "-journal")
+    }
+    files = sorted(
+        (
+            file
+            for file in scan_directory(directory, recursive)
+            if file.file_path.resolve() not in manifest_files
+        ),
+        key=lambda file: file.drs_id,
+    )
+    manifest = Manifest(manifest_path)
+    try:
+        return Ingestion(engine, config, bucket, on_progress, manifest).run(files)
+    finally:
+        manifest.close()
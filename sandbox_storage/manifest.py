@@ -0,0 +1,92 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Local index of the files synced from a directory
+"""
+
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple
+
+UPLOADED = "uploaded"
+REGISTERED = "registered"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    md5 TEXT NOT NULL,
+    status TEXT NOT NULL
+)
+"""
+
+
+class ManifestEntry(NamedTuple):
+    """What is known about a synced file."""
+
+    size: int
+    mtime: int
+    md5: str
+    status: str
+
+
+class Manifest:
+    """
+    Remembers the size, modification time (in ns), and MD5 checksum of
+    every file that was uploaded, and whether it was registered as a DRS
+    object yet. Each change is committed right away, so that an interrupted
+    sync can be resumed without uploading or hashing finished files again.
+
+    Args:
+        path: the SQLite file keeping the manifest, created if missing
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.connection = sqlite3.connect(str(path))
+        # cheap commits, the manifest can be rebuilt if it is ever lost:
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(SCHEMA)
+        self.connection.commit()
+
+    def entries(self) -> Dict[str, ManifestEntry]:
+        """Get the entries of all files, by their paths."""
+        rows = self.connection.execute(
+            "SELECT path, size, mtime, md5, status FROM files"
+        )
+        return {path: ManifestEntry(*values) for path, *values in rows}
+
+    def record_uploaded(self, path: str, size: int, mtime: int, md5: str) -> None:
+        """Record that a file (or a new version of it) was uploaded."""
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                (path, size, mtime, md5, UPLOADED),
+            )
+
+    def record_registered(self, paths: Iterable[str]) -> None:
+        """Record that uploaded files were registered as DRS objects."""
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE files SET status = ? WHERE path = ?",
+                ((REGISTERED, path) for path in paths),
+            )
+
+    def close(self) -> None:
+        """Close the connection to the manifest."""
+        self.connection.close()
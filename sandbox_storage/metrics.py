@@ -0,0 +1,262 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Prometheus metrics of the service
+"""
+
+import os
+from typing import Any, Dict, Iterator, List, Set, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+from pyramid.request import Request
+from pyramid.response import Response
+
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+STAGE_BUCKETS = (
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    1,
+)
+
+REQUESTS = Counter(
+    "sandbox_storage_http_requests",
+    "HTTP requests handled",
+    ["route", "method", "status"],
+)
+REQUEST_DURATION = Histogram(
+    "sandbox_storage_http_request_duration_seconds",
+    "Time spent handling HTTP requests",
+    ["route", "method", "status"],
+    buckets=REQUEST_BUCKETS,
+)
+STAGE_DURATION = Histogram(
+    "sandbox_storage_stage_duration_seconds",
+    "Time spent in the stages of handling HTTP requests",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+
+# time a stage by ``with DB_LOOKUP_DURATION.time(): ...``
+# (DB lookups include the hits of the metadata cache):
+DB_LOOKUP_DURATION = STAGE_DURATION.labels("db_lookup")
+S3_PRESIGN_DURATION = STAGE_DURATION.labels("s3_presign")
+AMQP_PUBLISH_DURATION = STAGE_DURATION.labels("amqp_publish")
+
+# the metrics of components that are values at a point in time,
+# all others count up:
+POOL_GAUGES = {"size", "checked_in", "checked_out", "overflow", "wait_seconds_max"}
+REPLICA_GAUGES = {"active", "errors", "ejected", "lag"}
+PUBLISHER_GAUGES = {"queue_depth", "pending"}
+CACHE_GAUGES = {"size"}
+
+
+# the metrics of each combination of labels, looking them up by label
+# values takes a lock and converts the values to strings:
+_request_children: Dict[Tuple[str, str, int], Tuple[Any, Any]] = {}
+
+
+def observe_request(route: str, method: str, status: int, seconds: float) -> None:
+    """
+    Count a handled request and record how long it took.
+
+    Args:
+        route: the name of the matched route, "none" if none matched
+        method: the HTTP method
+        status: the status code of the response
+        seconds: the time spent handling it
+    """
+    key = (route, method, status)
+    children = _request_children.get(key)
+    if children is None:
+        labels = (route, method, str(status))
+        children = _request_children[key] = (
+            REQUESTS.labels(*labels),
+            REQUEST_DURATION.labels(*labels),
+        )
+    children[0].inc()
+    children[1].observe(seconds)
+
+
+def _families(
+    prefix: str,
+    documentation: str,
+    label: str,
+    values: List[Tuple[str, Dict]],
+    gauges: Set[str],
+) -> Iterator[Metric]:
+    """
+    Turn the metrics dictionaries of several sources (e.g. caches) into
+    metric families, using the name of each source as the label.
+
+    Args:
+        prefix: the prefix of the metric names
+        documentation: describes the sources
+        label: the label for the names of the sources
+        values: the names of the sources and their metrics
+        gauges: the keys of the metrics that are gauges
+
+    Yields:
+        A gauge or counter for each key of the dictionaries
+    """
+    families: Dict[str, Metric] = {}
+    for source, metrics in values:
+        for key, value in metrics.items():
+            if isinstance(value, bool):
+                value = int(value)
+            if not isinstance(value, (int, float)):
+                continue
+            family = families.get(key)
+            if family is None:
+                family_type = (
+                    GaugeMetricFamily if key in gauges else CounterMetricFamily
+                )
+                family = families[key] = family_type(
+                    f"{prefix}_{key}", f"{documentation}: {key}", labels=[label]
+                )
+            family.add_metric([source], value)
+    yield from families.values()
+
+
+class ServiceCollector:
+    """
+    Collects the state of the process at the time of the scrape: the
+    connection pools of the database (and its replicas), the replica
+    health, the publisher of download requests, and the caches.
+    Components that weren't used yet are not created for this.
+    """
+
+    def describe(self) -> List[Metric]:  # pylint: disable=no-self-use
+        """No fixed metrics, so that registering doesn't collect."""
+        return []
+
+    def collect(self) -> Iterator[Metric]:  # pylint: disable=no-self-use
+        """Get the current metrics."""
+        # pylint: disable=import-outside-toplevel
+        from .dao.db import engine
+        from .dao.lookup import get_metadata_cache
+        from .dao.pool import get_pool_metrics
+        from .dao.replicas import get_replica_router
+        from .pubsub import get_download_requested_publisher
+        from .render import get_render_cache
+        from .s3 import get_s3_client_factory
+
+        pools = [("primary", get_pool_metrics(engine))]
+        router = get_replica_router()
+        if router is not None:
+            pools.extend(
+                (replica.name, get_pool_metrics(replica.engine))
+                for replica in router.replicas
+            )
+            replica_metrics = router.metrics()
+            fallbacks = CounterMetricFamily(
+                "sandbox_storage_db_replica_fallbacks",
+                "Read-only queries that ran on the primary instead of a replica",
+            )
+            fallbacks.add_metric([], replica_metrics["fallbacks"])
+            yield fallbacks
+            yield from _families(
+                "sandbox_storage_db_replica",
+                "State of the database replicas",
+                "replica",
+                list(replica_metrics["replicas"].items()),
+                REPLICA_GAUGES,
+            )
+        yield from _families(
+            "sandbox_storage_db_pool",
+            "Connection pools of the database",
+            "database",
+            pools,
+            POOL_GAUGES,
+        )
+
+        if get_download_requested_publisher.cache_info().currsize:
+            publisher = get_download_requested_publisher()
+            if hasattr(publisher, "metrics"):
+                yield from _families(
+                    "sandbox_storage_publisher",
+                    "Publisher of download requests",
+                    "publisher",
+                    [(type(publisher).__name__, publisher.metrics())],
+                    PUBLISHER_GAUGES,
+                )
+
+        caches: List[Tuple[str, Any]] = [
+            ("metadata", get_metadata_cache()),
+            ("render", get_render_cache()),
+        ]
+        if get_s3_client_factory.cache_info().currsize:
+            caches.append(("presigned_url", get_s3_client_factory().get_url_cache()))
+        yield from _families(
+            "sandbox_storage_cache",
+            "Caches of this process",
+            "cache",
+            [(name, cache.metrics()) for name, cache in caches if cache is not None],
+            CACHE_GAUGES,
+        )
+
+
+SERVICE_COLLECTOR = ServiceCollector()
+REGISTRY.register(SERVICE_COLLECTOR)
+
+
+def get_metrics() -> bytes:
+    """
+    Get the metrics in the text format of Prometheus.
+
+    If ``PROMETHEUS_MULTIPROC_DIR`` is set, the requests and stages are
+    aggregated over all worker processes, while the state of the pools,
+    publisher, and caches is the one of the worker handling the scrape.
+
+    Returns:
+        The metrics
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(SERVICE_COLLECTOR)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def get_metrics_view(_: Request) -> Response:
+    """
+    View of the "metrics" route, to be scraped by Prometheus.
+
+    Returns:
+        The metrics in the text format
+    """
+    response = Response(body=get_metrics())
+    response.headers["Content-Type"] = CONTENT_TYPE_LATEST
+    return response
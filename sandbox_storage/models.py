@@ -0,0 +1,106 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+The objects returned by the API
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from pyramid.request import Request
+
+from .dao.lookup import DrsObjectRecord
+
+
+@dataclass
+class AccessURL:
+    """Describes the URL for accessing the
+    actual bytes of the object."""
+
+    url: str
+
+    def __json__(self, _: Optional[Request] = None) -> Dict[str, str]:
+        """JSON-renderer for this object."""
+        return {"url": self.url}
+
+
+@dataclass
+class AccessMethod:
+    """An AccessURL"""
+
+    type: str = "s3"  # currently only s3 is supported
+    # At least one of the two has to be provided:
+    access_url: Optional[AccessURL] = None
+    access_id: Optional[str] = None
+
+    def __json__(self, _: Optional[Request] = None) -> Dict[str, Any]:
+        """JSON-renderer for this object."""
+        return_dict: Dict[str, Any] = {"type": self.type}
+        if self.access_url:
+            return_dict["access_url"] = self.access_url.__json__()
+        if self.access_id:
+            return_dict["access_id"] = self.access_id
+
+        return return_dict
+
+
+@dataclass
+class DrsReturnObject:
+    """A DrsObject"""
+
+    id: str
+    self_uri: str
+    size: int
+    created_time: str
+    checksums: list
+    access_methods: Optional[List[AccessMethod]] = None
+
+    @classmethod
+    def from_record(
+        cls, record: DrsObjectRecord, drs_self_url: str
+    ) -> "DrsReturnObject":
+        """Create the response for a ``DrsObject`` from its metadata."""
+        return cls(
+            id=record.drs_id,
+            self_uri=drs_self_url + record.drs_id,
+            size=record.size,
+            created_time=record.created_time.isoformat() + "Z",
+            checksums=[
+                {
+                    "checksum": record.checksum_md5,
+                    "type": "md5",
+                }
+            ],
+            access_methods=[AccessMethod(access_url=AccessURL(url=record.path))],
+        )
+
+    def __json__(self, _: Optional[Request] = None) -> Dict[str, Any]:
+        """JSON-renderer for this object."""
+
+        return_dict = {
+            "id": self.id,
+            "self_uri": self.self_uri,
+            "size": self.size,
+            "created_time": self.created_time,
+            "checksums": self.checksums,
+        }
+
+        if self.access_methods:
+            return_dict["access_methods"] = [
+                access_method.__json__() for access_method in self.access_methods
+            ]
+
+        return return_dict
@@ -0,0 +1,209 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Offline signing of presigned S3 URLs (AWS Signature Version 4)
+"""
+
+import hashlib
+import hmac
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+
+from botocore.exceptions import NoCredentialsError
+
+SIGV4_TIMESTAMP = "%Y%m%dT%H%M%SZ"
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def host_from_url(url: str) -> str:
+    """
+    Derive the value of the host header for a URL the way botocore does:
+    lower case and without the port if it is the default one of the scheme.
+
+    Args:
+        url: the URL
+
+    Returns:
+        The host header value
+
+    """
+    url_parts = urlsplit(url)
+    host = url_parts.hostname or ""
+    if url_parts.port is not None and url_parts.port != DEFAULT_PORTS.get(
+        url_parts.scheme
+    ):
+        host = f"{host}:{url_parts.port}"
+    return host
+
+
+def get_url_expiry(url: str) -> Optional[datetime]:
+    """
+    Get the time a presigned URL expires, for both SigV4 URLs
+    (``X-Amz-Date`` and ``X-Amz-Expires``) and SigV2 URLs (``Expires``).
+
+    Args:
+        url: the presigned URL
+
+    Returns:
+        The (UTC) expiry time or ``None`` if the URL isn't presigned
+
+    """
+    params = parse_qs(urlsplit(url).query)
+    try:
+        if "X-Amz-Date" in params and "X-Amz-Expires" in params:
+            signed_at = datetime.strptime(params["X-Amz-Date"][0], SIGV4_TIMESTAMP)
+            return signed_at.replace(tzinfo=timezone.utc) + timedelta(
+                seconds=int(params["X-Amz-Expires"][0])
+            )
+        if "Expires" in params:
+            return datetime.fromtimestamp(int(params["Expires"][0]), timezone.utc)
+    except ValueError:
+        pass
+    return None
+
+
+def _hmac_sha256(key: bytes, msg: str) -> bytes:
+    """Sign the message with the key."""
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+class SigV4Presigner:
+    """
+    Creates presigned ``GetObject`` URLs (path-style addressing) without
+    going through the botocore request pipeline. The URLs are identical to
+    the ones returned by ``generate_presigned_url`` of a botocore S3 client
+    with signature version "s3v4" for the same endpoint, region, credentials,
+    and time.
+
+    The signing key only depends on the secret key, the date, and the region.
+    It is derived once and reused until one of them changes.
+
+    Args:
+        endpoint_url: the URL of the S3 endpoint
+        region_name: the region that is part of the signature scope
+        get_credentials:
+            a callable returning the current credentials as a botocore
+            ``ReadOnlyCredentials`` (or any object with ``access_key``,
+            ``secret_key``, and ``token``), or ``None`` if there are none
+    """
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        region_name: str,
+        get_credentials: Callable[[], Any],
+    ):
+        url_parts = urlsplit(endpoint_url)
+        self.endpoint_url = endpoint_url
+        self.region_name = region_name
+        self._get_credentials = get_credentials
+        self._host = host_from_url(endpoint_url)
+        self._base_url = f"{url_parts.scheme}://{url_parts.netloc}"
+        self._path_prefix = url_parts.path.rstrip("/")
+        # (secret key, date stamp, signing key):
+        self._signing_key: Tuple[str, str, bytes] = ("", "", b"")
+
+    def identity(self) -> Tuple[str, str, Optional[str]]:
+        """
+        Identify the signer: URLs of signers with the same identity
+        are interchangeable.
+
+        Returns:
+            The endpoint URL, the region, and the access key ID
+
+        """
+        credentials = self._get_credentials()
+        access_key = None if credentials is None else credentials.access_key
+        return (self.endpoint_url, self.region_name, access_key)
+
+    def _get_signing_key(self, secret_key: str, datestamp: str) -> bytes:
+        """Get the signing key for the given day, derive it if needed."""
+        cached_secret_key, cached_datestamp, signing_key = self._signing_key
+        if cached_secret_key != secret_key or cached_datestamp != datestamp:
+            k_date = _hmac_sha256(("AWS4" + secret_key).encode("utf-8"), datestamp)
+            k_region = _hmac_sha256(k_date, self.region_name)
+            k_service = _hmac_sha256(k_region, "s3")
+            signing_key = _hmac_sha256(k_service, "aws4_request")
+            self._signing_key = (secret_key, datestamp, signing_key)
+        return signing_key
+
+    def presign_get_object(
+        self,
+        bucket: str,
+        key: str,
+        expires_in: int = 3600,
+        now: Optional[datetime] = None,
+    ) -> str:
+        """
+        Create a presigned URL for downloading an object.
+
+        Args:
+            bucket: the name of the bucket
+            key: the key of the object
+            expires_in: the number of seconds the URL stays valid
+            now: the (UTC) time of signing, defaults to the current time
+
+        Returns:
+            The presigned URL
+
+        """
+        credentials = self._get_credentials()
+        if credentials is None:
+            raise NoCredentialsError()
+
+        timestamp = (now or datetime.utcnow()).strftime(SIGV4_TIMESTAMP)
+        datestamp = timestamp[:8]
+        scope = f"{datestamp}/{self.region_name}/s3/aws4_request"
+        path = f"{self._path_prefix}/{quote(bucket, safe='')}/{quote(key, safe='/~')}"
+
+        params = [
+            ("X-Amz-Algorithm", "AWS4-HMAC-SHA256"),
+            ("X-Amz-Credential", quote(f"{credentials.access_key}/{scope}", safe="")),
+            ("X-Amz-Date", timestamp),
+            ("X-Amz-Expires", str(expires_in)),
+            ("X-Amz-SignedHeaders", "host"),
+        ]
+        if credentials.token is not None:
+            params.append(("X-Amz-Security-Token", quote(credentials.token, safe="")))
+
+        canonical_request = "\n".join(
+            (
+                "GET",
+                path,
+                "&".join(f"{name}={value}" for name, value in sorted(params)),
+                f"host:{self._host}",
+                "",
+                "host",
+                "UNSIGNED-PAYLOAD",
+            )
+        )
+        string_to_sign = "\n".join(
+            (
+                "AWS4-HMAC-SHA256",
+                timestamp,
+                scope,
+                hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+            )
+        )
+        signature = hmac.new(
+            self._get_signing_key(credentials.secret_key, datestamp),
+            string_to_sign.encode("utf-8"),
+            hashlib.sha256,
+        ).hexdigest()
+
+        query = "&".join(f"{name}={value}" for name, value in params)
+        return f"{self._base_url}{path}?{query}&X-Amz-Signature={signature}"
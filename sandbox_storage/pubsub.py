@@ -12,13 +12,24 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-
 """
 Consuming or Subscribing to Async Messaging Topics
 """
 
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
 import pika
-from ghga_service_chassis_lib.pubsub import AmqpTopic
+from ghga_service_chassis_lib.pubsub import AmqpTopic, validate_message
 from .config import get_config
 
 
@@ -36,6 +47,549 @@ def get_connection_params() -> pika.ConnectionParameters:
     )
 
 
+@dataclass
+class PersistentAmqpTopic(AmqpTopic):
+    """An ``AmqpTopic`` that keeps its connection and channel open between
+    publishes instead of setting up a new pair for every message.
+
+    The connection is opened lazily on the first publish. If the broker
+    dropped it in the meantime, a new one is opened and the publish is
+    retried once. A forked child never reuses the socket of its parent
+    but opens its own connection.
+    """
+
+    # redeclared from ``AmqpTopic`` (same order and defaults) so that
+    # type checkers know the arguments of the generated ``__init__``:
+    connection_params: pika.connection.Parameters
+    topic_name: str
+    service_name: str
+    json_schema: Optional[dict] = None
+
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+    _connection: Optional[pika.BlockingConnection] = field(
+        default=None, init=False, repr=False
+    )
+    _channel: Optional[pika.channel.Channel] = field(
+        default=None, init=False, repr=False
+    )
+
+    def __post_init__(self):
+        os.register_at_fork(after_in_child=self._forget_connection)
+
+    def _forget_connection(self) -> None:
+        """Forget the connection state that was inherited from the parent
+        process of a forked child.
+
+        The inherited socket is shared with the parent, so it must be
+        dropped without closing it. The lock is replaced as well since it
+        could have been held by another thread of the parent at fork time.
+        """
+        self._lock = threading.Lock()
+        self._connection = None
+        self._channel = None
+
+    def _get_channel(self) -> pika.channel.Channel:
+        """Return an open channel, (re-)connecting if needed."""
+        if (
+            self._connection is None
+            or self._connection.is_closed
+            or self._channel is None
+            or self._channel.is_closed
+        ):
+            self._discard_connection()
+            self._connection, self._channel = self._create_channel_and_exchange()
+        else:
+            # serve heartbeats and notice a connection closed by the broker:
+            self._connection.process_data_events(time_limit=0)
+        return self._channel
+
+    def _discard_connection(self) -> None:
+        """Close the current connection (if any) ignoring errors."""
+        connection, self._connection, self._channel = self._connection, None, None
+        if connection is not None and connection.is_open:
+            try:
+                connection.close()
+            except pika.exceptions.AMQPError:
+                pass
+
+    def _publish_body(self, body: str) -> None:
+        """Publish an already serialized message on the current channel."""
+        self._get_channel().basic_publish(
+            exchange=self.topic_name,
+            routing_key=self.topic_name,
+            body=body,
+            properties=pika.BasicProperties(delivery_mode=2),
+        )
+
+    def publish(self, message: dict):
+        """Publish a message to the topic
+
+        Args:
+            message (dict):
+                The message payload to be send via the topic.
+        """
+
+        # validate message:
+        if self.json_schema:
+            validate_message(message, self.json_schema, raise_on_exception=True)
+
+        # convert message dict to json:
+        message_json = json.dumps(message)
+
+        with self._lock:
+            try:
+                self._publish_body(message_json)
+            except pika.exceptions.AMQPError:
+                # The connection went stale since the last publish,
+                # retry once on a fresh one:
+                self._discard_connection()
+                self._publish_body(message_json)
+
+        logging.info(
+            " [x] %s: Sent message.",
+            datetime.now().isoformat(timespec="milliseconds"),
+        )
+
+    def close(self) -> None:
+        """Close the connection owned by this process (if any)."""
+        with self._lock:
+            self._discard_connection()
+
+
+class BackgroundPublisher:
+    """Publishes messages to a topic from a worker thread so that
+    callers never wait for the broker.
+
+    Messages are put on a bounded in-process queue which is drained by a
+    daemon thread. When the queue is full, the ``overflow_policy`` decides
+    what happens:
+
+    - ``"block"``: wait for a free slot (at most ``block_timeout`` seconds,
+      the message is dropped afterwards)
+    - ``"drop_oldest"``: discard the oldest queued message
+    - ``"drop_new"``: discard the new message
+
+    The worker thread is started lazily. Forked children start over with
+    an empty queue, messages queued by the parent are not sent twice.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        topic: AmqpTopic,
+        queue_size: int = 10000,
+        overflow_policy: str = "drop_new",
+        block_timeout: Optional[float] = None,
+    ):
+        if overflow_policy not in ("block", "drop_oldest", "drop_new"):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+
+        self.topic = topic
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+
+        self.dropped = 0
+        self.published = 0
+        self.failed = 0
+
+        self._lock: threading.Lock
+        self._queue: queue.Queue
+        self._worker: Optional[threading.Thread]
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        """
+        Start over with an empty queue and without a worker thread, as in
+        a forked child: the worker thread didn't survive the fork and the
+        locks might have been held by other threads of the parent.
+        """
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._worker = None
+
+    @property
+    def queue_depth(self) -> int:
+        """The number of messages waiting to be published."""
+        return self._queue.qsize()
+
+    def metrics(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the publishing statistics of this process.
+
+        Returns:
+            A dictionary with the current queue depth and the number of
+            published, failed, and dropped messages
+
+        """
+        return {
+            "queue_depth": self.queue_depth,
+            "published": self.published,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+    def _ensure_worker(self) -> None:
+        """Start the worker thread if it is not running in this process."""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="download-event-publisher", daemon=True
+                )
+                self._worker.start()
+
+    def _run(self) -> None:
+        """Drain the queue until the stop marker is received."""
+        queue_ = self._queue
+        while True:
+            message = queue_.get()
+            try:
+                if message is self._STOP:
+                    return
+                self.topic.publish(message)
+                self.published += 1
+            except Exception:  # pylint: disable=broad-except
+                self.failed += 1
+                logging.exception("Failed to publish message in the background.")
+            finally:
+                queue_.task_done()
+
+    def _enqueue(self, message: object) -> bool:
+        """Put a message on the queue following the overflow policy.
+        Returns whether the message was queued."""
+        if self.overflow_policy == "block":
+            try:
+                self._queue.put(message, timeout=self.block_timeout)
+                return True
+            except queue.Full:
+                return False
+
+        while True:
+            try:
+                self._queue.put_nowait(message)
+                return True
+            except queue.Full:
+                if self.overflow_policy == "drop_new":
+                    return False
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+
+    def publish(self, message: dict):
+        """Queue a message for publishing.
+
+        Args:
+            message (dict):
+                The message payload to be send via the topic.
+        """
+        self._ensure_worker()
+        if not self._enqueue(message):
+            self.dropped += 1
+            logging.warning("Publishing queue is full, dropped a message.")
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Send the queued messages and stop the worker thread.
+
+        Args:
+            timeout:
+                Seconds to wait for the queue to be drained.
+                Waits forever if set to ``None``.
+        """
+        worker = self._worker
+        if worker is None or not worker.is_alive():
+            return
+
+        # don't apply the overflow policy to the stop marker:
+        try:
+            self._queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            return
+        worker.join(timeout)
+
+
+def make_batch_message(events: List[dict]) -> dict:
+    """
+    Wrap multiple download request events into one message.
+
+    Args:
+        events: the events, each with ``drs_id``, ``access_id``, ``user_id``,
+            and ``count`` (the number of requests it stands for)
+
+    Returns:
+        The message payload
+
+    """
+    return {"events": events}
+
+
+class BatchingPublisher:
+    """Collects download request events and publishes them as one
+    message (see ``make_batch_message``) per batch.
+
+    A batch is flushed by a worker thread once ``batch_size`` events were
+    collected or ``interval_ms`` milliseconds after its first event arrived,
+    whatever happens first. Events with the same ``drs_id``, ``access_id``,
+    and ``user_id`` within one batch are collapsed into a single event with
+    a ``count``.
+
+    A batch holds up to ``queue_size`` distinct events and is flushed early
+    once it is full. Until then, the ``overflow_policy`` decides what happens
+    with further events, as for ``BackgroundPublisher``.
+
+    The worker thread is started lazily. Forked children start over with
+    an empty batch, events collected by the parent are not sent twice.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        topic: AmqpTopic,
+        batch_size: int = 1000,
+        interval_ms: int = 1000,
+        queue_size: int = 10000,
+        overflow_policy: str = "drop_new",
+        block_timeout: Optional[float] = None,
+    ):
+        if overflow_policy not in ("block", "drop_oldest", "drop_new"):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+
+        self.topic = topic
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+
+        self.events = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.failed = 0
+        self.dropped = 0
+
+        self._condition: threading.Condition
+        self._pending: Dict[Tuple[str, str, str], int]
+        self._n_pending: int
+        self._window_start = 0.0
+        self._stopping: bool
+        self._worker: Optional[threading.Thread]
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        """
+        Start over with an empty batch and without a worker thread, as in
+        a forked child: the worker thread didn't survive the fork and the
+        lock might have been held by another thread of the parent.
+        """
+        self._condition = threading.Condition()
+        self._pending = {}
+        self._n_pending = 0
+        self._stopping = False
+        self._worker = None
+
+    def metrics(self) -> Dict[str, int]:
+        """
+        Get a snapshot of the publishing statistics of this process.
+
+        Returns:
+            A dictionary with the number of pending events, of received
+            events, of events that were merged into an earlier event, of
+            published batches, of batches that failed to publish, and of
+            dropped events
+
+        """
+        return {
+            "pending": self._n_pending,
+            "events": self.events,
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
+
+    def _ensure_worker(self) -> None:
+        """Start the worker thread if it is not running in this process."""
+        with self._condition:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="download-event-batcher", daemon=True
+                )
+                self._worker.start()
+
+    def _wait_for_batch(self) -> List[dict]:
+        """Wait until a batch is due and take it.
+        Must be called while holding the condition."""
+        while not self._pending and not self._stopping:
+            self._condition.wait()
+
+        deadline = self._window_start + self.interval
+        while (
+            self._n_pending < self.batch_size
+            and len(self._pending) < self.queue_size
+            and not self._stopping
+        ):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._condition.wait(remaining)
+
+        events = [
+            {"drs_id": drs_id, "access_id": access_id, "user_id": user_id, "count": n}
+            for (drs_id, access_id, user_id), n in self._pending.items()
+        ]
+        self._pending = {}
+        self._n_pending = 0
+        # wake up publishers waiting for room:
+        self._condition.notify_all()
+        return events
+
+    def _make_room(self) -> bool:
+        """Make room for another distinct event if the batch is full,
+        following the overflow policy. Must be called while holding the
+        condition. Returns whether there is room."""
+        if len(self._pending) < self.queue_size:
+            return True
+        # the worker flushes full batches right away:
+        self._condition.notify_all()
+        if self.overflow_policy == "block":
+            return self._condition.wait_for(
+                lambda: len(self._pending) < self.queue_size, self.block_timeout
+            )
+        if self.overflow_policy == "drop_oldest":
+            count = self._pending.pop(next(iter(self._pending)))
+            self._n_pending -= count
+            self.dropped += count
+            return True
+        return False
+
+    def _run(self) -> None:
+        """Flush batches until the publisher is stopped."""
+        while True:
+            with self._condition:
+                events = self._wait_for_batch()
+                stopping = self._stopping
+
+            if events:
+                try:
+                    self.topic.publish(make_batch_message(events))
+                    self.batches += 1
+                except Exception:  # pylint: disable=broad-except
+                    self.failed += 1
+                    logging.exception("Failed to publish a batch of events.")
+
+            if stopping:
+                return
+
+    def publish(self, message: dict):
+        """Add a download request event to the current batch.
+
+        Args:
+            message (dict):
+                The event with ``drs_id``, ``access_id``, and ``user_id``.
+        """
+        key = (message["drs_id"], message["access_id"], message["user_id"])
+        self._ensure_worker()
+        with self._condition:
+            self.events += 1
+            if key not in self._pending and not self._make_room():
+                self.dropped += 1
+                logging.warning("Batch of events is full, dropped an event.")
+                return
+            if not self._pending:
+                self._window_start = time.monotonic()
+                self._condition.notify_all()
+            if key in self._pending:
+                self.coalesced += 1
+            self._pending[key] = self._pending.get(key, 0) + 1
+            self._n_pending += 1
+            if self._n_pending >= self.batch_size:
+                self._condition.notify_all()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Flush the collected events and stop the worker thread.
+
+        Args:
+            timeout:
+                Seconds to wait for the last batch to be sent.
+                Waits forever if set to ``None``.
+        """
+        worker = self._worker
+        if worker is None or not worker.is_alive():
+            return
+
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        worker.join(timeout)
+
+
+@lru_cache
+def get_download_requested_topic() -> PersistentAmqpTopic:
+    """
+    Get the long-lived topic used to publish download requests.
+    It is created once and reused for all messages sent by this process.
+
+    Returns:
+        An instance of ``PersistentAmqpTopic``
+
+    """
+    config = get_config()
+    topic = PersistentAmqpTopic(
+        connection_params=get_connection_params(),
+        topic_name=config.topic_name_download_requested,
+        service_name="storage",
+    )
+    atexit.register(topic.close)
+    return topic
+
+
+@lru_cache
+def get_download_requested_publisher() -> (
+    Union[PersistentAmqpTopic, BackgroundPublisher, BatchingPublisher]
+):
+    """
+    Get the publisher for download requests as configured by ``publish_mode``.
+    In "sync" mode, this is the topic itself. In "background" mode, messages
+    are handed over to a worker thread. In "batch" mode, events are collected
+    and sent in batches by a worker thread.
+
+    Returns:
+        An instance of ``PersistentAmqpTopic``, ``BackgroundPublisher``,
+        or ``BatchingPublisher``
+
+    """
+    config = get_config()
+    topic = get_download_requested_topic()
+    publisher: Union[BackgroundPublisher, BatchingPublisher]
+    if config.publish_mode == "sync":
+        return topic
+    if config.publish_mode == "batch":
+        publisher = BatchingPublisher(
+            topic,
+            batch_size=config.publish_batch_size,
+            interval_ms=config.publish_batch_interval_ms,
+            queue_size=config.publish_queue_size,
+            overflow_policy=config.publish_overflow_policy,
+            block_timeout=config.publish_block_timeout,
+        )
+    else:
+        publisher = BackgroundPublisher(
+            topic,
+            queue_size=config.publish_queue_size,
+            overflow_policy=config.publish_overflow_policy,
+            block_timeout=config.publish_block_timeout,
+        )
+    # registered after topic.close, so it runs before it:
+    atexit.register(publisher.close, timeout=config.publish_shutdown_timeout)
+    return publisher
+
+
 def send_message(drs_id: str, access_id: str, user_id: str) -> None:
     """
     Send a message when download request arrives
@@ -47,11 +601,26 @@ def send_message(drs_id: str, access_id: str, user_id: str) -> None:
 
     """
 
-    config = get_config()
     message = {"drs_id": drs_id, "access_id": access_id, "user_id": user_id}
-    topic = AmqpTopic(
-        connection_params=get_connection_params(),
-        topic_name=config.topic_name_download_requested,
-        service_name="storage",
-    )
-    topic.publish(message)
+    get_download_requested_publisher().publish(message)
+
+
+def send_messages(drs_ids: Iterable[str], access_id: str, user_id: str) -> None:
+    """
+    Send the download requests for multiple objects, one message per object
+    as by ``send_message``. In "batch" mode, they are added to the current
+    batch instead, whose messages (see ``make_batch_message``) consumers
+    have to opt into.
+
+    Args:
+        drs_ids: the DRS IDs of the file objects
+        access_id: the access ID for the file objects
+        user_id: the user ID
+
+    """
+
+    publisher = get_download_requested_publisher()
+    for drs_id in drs_ids:
+        publisher.publish(
+            {"drs_id": drs_id, "access_id": access_id, "user_id": user_id}
+        )
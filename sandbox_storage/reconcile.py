@@ -0,0 +1,248 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares the DRS objects in the database to the objects in an S3 bucket
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+
+from .dao.db_models import DrsObject
+
+DRS_OBJECTS = DrsObject.__table__
+
+# kinds of discrepancies:
+MISSING = "missing"  # registered, but not in the bucket
+ORPHAN = "orphan"  # in the bucket, but not registered
+SIZE_MISMATCH = "size_mismatch"
+
+# S3 doesn't return more keys per page:
+S3_PAGE_SIZE = 1000
+
+
+class Discrepancy(NamedTuple):
+    """A key that differs between the database and the bucket."""
+
+    kind: str
+    key: str
+    db_size: Optional[int]
+    s3_size: Optional[int]
+
+
+@dataclass
+class ReconciliationStats:  # pylint: disable=too-many-instance-attributes
+    """Progress of a reconciliation."""
+
+    db_objects: int = 0
+    s3_objects: int = 0
+    matched: int = 0
+    missing: int = 0
+    orphans: int = 0
+    size_mismatches: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the start."""
+        return time.monotonic() - self.started
+
+    @property
+    def discrepancies(self) -> int:
+        """The number of discrepancies found so far."""
+        return self.missing + self.orphans + self.size_mismatches
+
+    def count(self, discrepancy: Discrepancy) -> None:
+        """Count a discrepancy."""
+        if discrepancy.kind == MISSING:
+            self.missing += 1
+        elif discrepancy.kind == ORPHAN:
+            self.orphans += 1
+        else:
+            self.size_mismatches += 1
+
+    def summary(self) -> str:
+        """Describe the progress and throughput in one line."""
+        elapsed = max(self.elapsed, 1e-9)
+        return (
+            f"{self.db_objects} DRS objects and {self.s3_objects} S3 objects "
+            f"compared: {self.matched} matched, {self.missing} missing, "
+            f"{self.orphans} orphans, {self.size_mismatches} size mismatches "
+            f"in {self.elapsed:.1f} s: "
+            f"{(self.db_objects + self.s3_objects) / elapsed:.0f} keys/s"
+        )
+
+
+def iter_s3_objects(client: Any, bucket: str, prefix: str = "") -> Iterator[Tuple]:
+    """
+    List the objects of a bucket page by page, in the order of their keys.
+
+    Args:
+        client: the S3 client
+        bucket: the bucket to list
+        prefix: only keys starting with this
+
+    Yields:
+        The key and size of each object
+
+    """
+    paginator = client.get_paginator("list_objects_v2")
+    pages = paginator.paginate(
+        Bucket=bucket, Prefix=prefix, PaginationConfig={"PageSize": S3_PAGE_SIZE}
+    )
+    for page in pages:
+        for item in page.get("Contents", ()):
+            yield item["Key"], item["Size"]
+
+
+def iter_db_objects(
+    engine: Engine, prefix: str = "", batch_size: int = 10000
+) -> Iterator[Tuple]:
+    """
+    Stream the DRS objects with a server-side cursor, in the order of
+    their DRS IDs. Postgres compares them bytewise (``COLLATE "C"``),
+    as S3 does with keys, which might need a sort on disk if the index
+    uses another collation.
+
+    Args:
+        engine: the engine connecting to the database
+        prefix: only DRS IDs starting with this
+        batch_size: the number of rows fetched at a time
+
+    Yields:
+        The DRS ID and size of each object
+
+    """
+    drs_id = DRS_OBJECTS.c.drs_id
+    # SQLite compares strings bytewise by default:
+    order = drs_id.collate("C") if engine.dialect.name == "postgresql" else drs_id
+    statement = select(drs_id, DRS_OBJECTS.c.size).order_by(order)
+    if prefix:
+        statement = statement.where(drs_id.startswith(prefix, autoescape=True))
+
+    with engine.connect() as connection:
+        result = connection.execution_options(
+            stream_results=True, max_row_buffer=batch_size
+        ).execute(statement)
+        for rows in result.partitions(batch_size):
+            for row in rows:
+                yield tuple(row)
+
+
+def merge_join(
+    db_objects: Iterable[Tuple], s3_objects: Iterable[Tuple]
+) -> Iterator[Tuple[Optional[Tuple], Optional[Tuple]]]:
+    """
+    Join two sequences of (key, size) pairs that are sorted by their keys,
+    holding only one item of each in memory.
+
+    Args:
+        db_objects: the objects in the database
+        s3_objects: the objects in the bucket
+
+    Yields:
+        The pairs of objects with the same key, with None for the missing side
+
+    Raises:
+        ValueError: if a sequence is not sorted, e.g. due to a collation
+            that differs from the order of S3
+
+    """
+    db_iter, s3_iter = iter(db_objects), iter(s3_objects)
+    db_item, s3_item = next(db_iter, None), next(s3_iter, None)
+    last_db_key = last_s3_key = None
+
+    while db_item is not None or s3_item is not None:
+        for item, last_key in ((db_item, last_db_key), (s3_item, last_s3_key)):
+            if item is not None and last_key is not None and item[0] <= last_key:
+                raise ValueError(f"Keys are not in S3 order: {last_key}, {item[0]}")
+
+        if db_item is not None and (s3_item is None or db_item[0] < s3_item[0]):
+            yield db_item, None
+            last_db_key = db_item[0]
+            db_item = next(db_iter, None)
+        elif s3_item is not None and (db_item is None or s3_item[0] < db_item[0]):
+            yield None, s3_item
+            last_s3_key = s3_item[0]
+            s3_item = next(s3_iter, None)
+        elif db_item is not None and s3_item is not None:
+            yield db_item, s3_item
+            last_db_key, last_s3_key = db_item[0], s3_item[0]
+            db_item, s3_item = next(db_iter, None), next(s3_iter, None)
+
+
+def reconcile(  # pylint: disable=too-many-arguments
+    engine: Engine,
+    client: Any,
+    bucket: str,
+    prefix: str = "",
+    batch_size: int = 10000,
+    on_progress: Optional[Callable[[ReconciliationStats], None]] = None,
+    stats: Optional[ReconciliationStats] = None,
+) -> Iterator[Discrepancy]:
+    """
+    Compare the DRS objects to the objects of a bucket, whose keys are the
+    DRS IDs. Both sides are streamed in the order of their keys, so memory
+    stays constant regardless of their sizes.
+
+    Args:
+        engine: the engine connecting to the database
+        client: the S3 client
+        bucket: the bucket to compare to
+        prefix: only compare keys starting with this
+        batch_size: the number of rows fetched from the database at a time
+        on_progress: called with the stats after every ``batch_size`` keys
+        stats: the stats to update, e.g. to read them after the iteration
+
+    Yields:
+        The discrepancies, in the order of their keys
+
+    """
+    if stats is None:
+        stats = ReconciliationStats()
+    pairs = merge_join(
+        iter_db_objects(engine, prefix, batch_size),
+        iter_s3_objects(client, bucket, prefix),
+    )
+    for index, (db_item, s3_item) in enumerate(pairs, start=1):
+        discrepancy = None
+        if db_item is not None and s3_item is not None:
+            stats.db_objects += 1
+            stats.s3_objects += 1
+            if db_item[1] != s3_item[1]:
+                discrepancy = Discrepancy(
+                    SIZE_MISMATCH, db_item[0], db_item[1], s3_item[1]
+                )
+            else:
+                stats.matched += 1
+        elif db_item is not None:
+            stats.db_objects += 1
+            discrepancy = Discrepancy(MISSING, db_item[0], db_item[1], None)
+        elif s3_item is not None:
+            stats.s3_objects += 1
+            discrepancy = Discrepancy(ORPHAN, s3_item[0], None, s3_item[1])
+
+        if discrepancy is not None:
+            stats.count(discrepancy)
+            yield discrepancy
+        if on_progress is not None and index % batch_size == 0:
+            on_progress(stats)
+
+    if on_progress is not None:
+        on_progress(stats)
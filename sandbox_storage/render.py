@@ -0,0 +1,176 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Render JSON responses straight to bytes
+"""
+
+import os
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import orjson
+from pyramid.request import Request
+
+from .cache import TTLCache
+from .config import get_config
+from .dao.lookup import DrsObjectRecord
+from .models import DrsReturnObject
+
+
+class RawJSON:
+    """
+    A response body that is already rendered to JSON
+    and is passed through by the renderer as is.
+
+    Args:
+        body: the JSON document
+    """
+
+    __slots__ = ("body",)
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+
+def dumps(value: Any, request: Optional[Request] = None) -> bytes:
+    """
+    Serialize a value to JSON. Objects that orjson doesn't know are
+    serialized using their ``__json__`` method, like with Pyramid's
+    JSON renderer (this includes dataclasses). ``RawJSON`` can't be
+    nested, use ``render_object`` and ``render_array`` instead.
+
+    Args:
+        value: the value to serialize
+        request: the current request, passed on to ``__json__``
+
+    Returns:
+        The JSON document
+
+    """
+
+    def default(obj: Any) -> Any:
+        if hasattr(obj, "__json__"):
+            return obj.__json__(request)
+        raise TypeError(f"{obj!r} is not JSON serializable")
+
+    return orjson.dumps(value, default=default, option=orjson.OPT_PASSTHROUGH_DATACLASS)
+
+
+def render_object(members: Dict[str, Any]) -> RawJSON:
+    """
+    Render a JSON object whose members may contain pre-rendered JSON
+    without parsing and serializing it again.
+
+    Args:
+        members: the members of the JSON object, values may be ``RawJSON``
+
+    Returns:
+        The rendered JSON object
+
+    """
+    return RawJSON(
+        b"{"
+        + b",".join(
+            orjson.dumps(key)
+            + b":"
+            + (value.body if isinstance(value, RawJSON) else dumps(value))
+            for key, value in members.items()
+        )
+        + b"}"
+    )
+
+
+def render_array(items: Iterable[RawJSON]) -> RawJSON:
+    """
+    Render a JSON array of pre-rendered JSON values.
+
+    Args:
+        items: the pre-rendered values
+
+    Returns:
+        The rendered JSON array
+
+    """
+    return RawJSON(b"[" + b",".join(item.body for item in items) + b"]")
+
+
+@lru_cache
+def get_render_cache() -> Optional[TTLCache]:
+    """
+    Get the cache for the rendered ``DrsObject`` responses of this process.
+    It follows the settings of the metadata cache.
+
+    Returns:
+        An instance of ``TTLCache`` or ``None`` if caching is disabled
+
+    """
+    config = get_config()
+    if not config.metadata_cache_enabled:
+        return None
+    return TTLCache(max_size=config.metadata_cache_size, ttl=config.metadata_cache_ttl)
+
+
+# the cache is not shared with forked worker processes:
+os.register_at_fork(after_in_child=get_render_cache.cache_clear)
+
+
+def render_drs_object(record: DrsObjectRecord, drs_self_url: str) -> RawJSON:
+    """
+    Render the response for a ``DrsObject``, i.e. the JSON of a
+    ``DrsReturnObject``. The result only depends on the metadata, so it is
+    cached per record: changed metadata is a different record and is
+    rendered again.
+
+    Args:
+        record: the metadata of the object
+        drs_self_url: the prefix of the ``self_uri``
+
+    Returns:
+        The rendered JSON object
+
+    """
+    cache = get_render_cache()
+    key = (record, drs_self_url)
+    rendered = None if cache is None else cache.get(key)
+    if rendered is not None:
+        return rendered
+
+    rendered = RawJSON(
+        orjson.dumps(DrsReturnObject.from_record(record, drs_self_url).__json__())
+    )
+    if cache is not None:
+        cache.set(key, rendered)
+    return rendered
+
+
+def json_renderer_factory(_) -> Callable[[Any, Dict[str, Any]], bytes]:
+    """
+    A Pyramid renderer factory replacing the default "json" renderer.
+    ``RawJSON`` is passed through, anything else is serialized with ``dumps``.
+    Register it by: ``config.add_renderer("json", json_renderer_factory)``
+    """
+
+    def render(value: Any, system: Dict[str, Any]) -> bytes:
+        request = system.get("request")
+        if request is not None:
+            response = request.response
+            if response.content_type == response.default_content_type:
+                response.content_type = "application/json"
+        if isinstance(value, RawJSON):
+            return value.body
+        return dumps(value, request)
+
+    return render
@@ -0,0 +1,203 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Access to the S3 object storage
+"""
+
+import os
+import threading
+from functools import lru_cache
+from typing import Any, Optional
+
+import boto3
+from botocore.config import Config as BotoConfig
+
+from .cache import TTLCache
+from .config import Config, get_config
+from .presign import SigV4Presigner
+
+
+class S3ClientFactory:
+    """
+    Creates an S3 client on first use and hands out the same client for
+    all subsequent requests of the process.
+
+    Creating a client is expensive (it sets up a botocore session, loads the
+    service model, and resolves credentials), using it is thread-safe.
+    The client is not shared with forked children though, since its
+    connection pool would share sockets with the parent.
+
+    Alongside the client, the factory provides a ``SigV4Presigner`` that
+    uses the same endpoint, region, and credentials.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self._lock: threading.Lock
+        self._client: Any
+        self._credentials: Any = None
+        self._presigner: Optional[SigV4Presigner]
+        self._url_cache: TTLCache
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _create_client(self) -> Any:
+        """Create a new S3 client as specified by the config."""
+        # sessions are not thread-safe, so each client gets its own:
+        session = boto3.session.Session()
+        # the session caches the credentials that the client is created with:
+        self._credentials = session.get_credentials()
+        return session.client(
+            service_name="s3",
+            endpoint_url=self.config.s3_url,
+            config=BotoConfig(
+                signature_version="s3v4",
+                max_pool_connections=self.config.s3_max_pool_connections,
+                connect_timeout=self.config.s3_connect_timeout,
+                read_timeout=self.config.s3_read_timeout,
+            ),
+        )
+
+    def _create_presigner(self, client: Any) -> SigV4Presigner:
+        """Create a presigner matching the S3 client."""
+        credentials = self._credentials
+
+        def get_credentials():
+            """Resolve the credentials, refreshing them if needed."""
+            if credentials is None:
+                return None
+            return credentials.get_frozen_credentials()
+
+        return SigV4Presigner(
+            endpoint_url=client.meta.endpoint_url,
+            region_name=client.meta.region_name or "us-east-1",
+            get_credentials=get_credentials,
+        )
+
+    def _reset(self) -> None:
+        """Start without a client, as in a forked child."""
+        # the lock might have been held by another thread at fork time:
+        self._lock = threading.Lock()
+        self._client = None
+        self._presigner = None
+        self._url_cache = TTLCache(
+            max_size=self.config.presign_cache_size,
+            ttl=self.config.presign_expires_in - self.config.presign_cache_min_validity,
+        )
+
+    def get_client(self) -> Any:
+        """
+        Get the S3 client of this process.
+
+        Returns:
+            An instance of a boto3 S3 client
+
+        """
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._create_client()
+                client = self._client
+        return client
+
+    def get_presigner(self) -> SigV4Presigner:
+        """
+        Get the presigner of this process.
+
+        Returns:
+            An instance of ``SigV4Presigner``
+
+        """
+        client = self.get_client()
+        presigner = self._presigner
+        if presigner is None:
+            presigner = self._presigner = self._create_presigner(client)
+        return presigner
+
+    def get_url_cache(self) -> TTLCache:
+        """
+        Get the cache of presigned URLs of this process.
+
+        Returns:
+            An instance of ``TTLCache``
+
+        """
+        return self._url_cache
+
+
+@lru_cache
+def get_s3_client_factory() -> S3ClientFactory:
+    """
+    Get the S3 client factory configured by the application config.
+
+    Returns:
+        An instance of ``S3ClientFactory``
+
+    """
+    return S3ClientFactory(get_config())
+
+
+def get_s3_client() -> Any:
+    """
+    Get the S3 client of this process, it is created on first use.
+
+    Returns:
+        An instance of a boto3 S3 client
+
+    """
+    return get_s3_client_factory().get_client()
+
+
+def presign_get_object(bucket: str, key: str, expires_in: int) -> str:
+    """
+    Create a presigned URL for downloading an object. Depending on the
+    ``s3_fast_presign`` setting, the URL is signed by ``SigV4Presigner``
+    or by the botocore S3 client. Both give the same result.
+
+    URLs are cached per object and signer. A cached URL is handed out
+    as long as it stays valid for at least ``presign_cache_min_validity``
+    seconds.
+
+    Args:
+        bucket: the name of the bucket
+        key: the key of the object
+        expires_in: the number of seconds the URL stays valid
+
+    Returns:
+        The presigned URL
+
+    """
+    factory = get_s3_client_factory()
+    config = factory.config
+    presigner = factory.get_presigner()
+    url_cache = factory.get_url_cache()
+
+    cache_key = (bucket, key, expires_in, presigner.identity())
+    url = url_cache.get(cache_key)
+    if url is not None:
+        return url
+
+    if config.s3_fast_presign:
+        url = presigner.presign_get_object(bucket, key, expires_in=expires_in)
+    else:
+        url = factory.get_client().generate_presigned_url(
+            "get_object",
+            Params={"Bucket": bucket, "Key": key},
+            ExpiresIn=expires_in,
+        )
+    url_cache.set(cache_key, url, ttl=expires_in - config.presign_cache_min_validity)
+    return url
@@ -0,0 +1,126 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Serve the WSGI app with multiple worker processes and threads
+"""
+
+import os
+from typing import Any, Callable, Dict
+
+from gunicorn.app.base import BaseApplication
+
+from .config import Config
+
+
+def post_fork(_, __) -> None:
+    """
+    Gunicorn hook that runs in each worker after it was forked.
+
+    Connections in the database pool must not be shared with the
+    parent process, so the pool of the worker is replaced.
+    """
+    # pylint: disable=import-outside-toplevel
+    from .dao.db import engine
+
+    engine.dispose()
+
+
+def child_exit(_, worker) -> None:
+    """
+    Gunicorn hook that runs in the master process after a worker exited.
+
+    With metrics aggregated over all workers, the gauges of the worker
+    are removed, see ``sandbox_storage.metrics``.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # pylint: disable=import-outside-toplevel
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def get_gunicorn_options(
+    config: Config, worker_class: str = "gthread"
+) -> Dict[str, Any]:
+    """
+    Translate the service config into gunicorn settings.
+
+    Args:
+        config: The config for the application
+        worker_class: The gunicorn worker class, "gthread" for WSGI apps
+            or "uvicorn.workers.UvicornWorker" for ASGI apps
+
+    Returns:
+        A dictionary of gunicorn settings
+
+    """
+    return {
+        "bind": f"{config.host}:{config.port}",
+        "worker_class": worker_class,
+        "workers": config.workers,
+        "threads": config.threads,
+        "keepalive": config.keepalive,
+        "max_requests": config.max_requests,
+        "max_requests_jitter": config.max_requests_jitter,
+        "timeout": config.worker_timeout,
+        "graceful_timeout": config.graceful_timeout,
+        "loglevel": config.log_level,
+        "post_fork": post_fork,
+        "child_exit": child_exit,
+    }
+
+
+class GunicornApplication(BaseApplication):
+    """
+    Runs a WSGI app with gunicorn using pre-forked worker processes,
+    each serving requests with a pool of threads.
+
+    Each worker builds its own app after it was forked, so workers that are
+    replaced after ``max_requests`` requests (if set) or reloaded gracefully
+    by sending ``SIGHUP`` to the master process start with a new app.
+
+    Args:
+        app_factory: Builds the WSGI app to serve
+        options: The gunicorn settings
+    """
+
+    def __init__(self, app_factory: Callable[[], Callable], options: Dict[str, Any]):
+        self.app_factory = app_factory
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        """Apply the settings."""
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self) -> Callable:
+        """Build the WSGI app, called in each worker."""
+        return self.app_factory()
+
+
+def run_gunicorn(
+    app_factory: Callable[[], Callable], config: Config, worker_class: str = "gthread"
+) -> None:
+    """
+    Serve the app with gunicorn as configured and block until it stops.
+
+    Args:
+        app_factory: Builds the WSGI (or ASGI) app to serve
+        config: The config for the application
+        worker_class: The gunicorn worker class
+    """
+    GunicornApplication(app_factory, get_gunicorn_options(config, worker_class)).run()
@@ -0,0 +1,78 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tweens wrapping the handling of every request
+"""
+
+import time
+from typing import Callable
+
+import transaction
+from pyramid.registry import Registry
+from pyramid.request import Request
+from pyramid.response import Response
+
+from .dao.db import DBSession
+from .metrics import observe_request
+
+
+def db_session_tween_factory(
+    handler: Callable[[Request], Response], _: Registry
+) -> Callable[[Request], Response]:
+    """
+    A tween that ends the database session of a request once it is handled,
+    so that its transaction is closed and its connection is returned to the
+    pool right away instead of staying checked out until the thread handles
+    its next request. The API only reads, so the transaction is aborted.
+    Add it by: ``config.add_tween("sandbox_storage.tweens.db_session_tween_factory")``
+    """
+
+    def db_session_tween(request: Request) -> Response:
+        try:
+            return handler(request)
+        finally:
+            transaction.manager.abort()
+            DBSession.remove()
+
+    return db_session_tween
+
+
+def metrics_tween_factory(
+    handler: Callable[[Request], Response], _: Registry
+) -> Callable[[Request], Response]:
+    """
+    A tween that counts the requests and measures their duration by
+    route, method, and status code, see ``sandbox_storage.metrics``.
+    Add it by: ``config.add_tween("sandbox_storage.tweens.metrics_tween_factory")``
+    """
+
+    def metrics_tween(request: Request) -> Response:
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = handler(request)
+            status = response.status_code
+            return response
+        finally:
+            route = getattr(request, "matched_route", None)
+            observe_request(
+                "none" if route is None else route.name,
+                request.method,
+                status,
+                time.perf_counter() - start,
+            )
+
+    return metrics_tween
@@ -16,15 +16,12 @@
 # limitations under the License.
 
 """
-Provides a script function to populate the database
-with example DRS objects
+Provides a script function to remove all DRS objects from the database
 """
 
-import transaction
-import zope.sqlalchemy
-
-from sandbox_storage.dao.db import get_session
-from sandbox_storage.dao.db_models import DrsObject
+from sandbox_storage.cleanup import delete_drs_objects
+from sandbox_storage.config import get_config
+from sandbox_storage.dao.db import engine
 
 
 def cleanup_database():
@@ -32,15 +29,7 @@ def cleanup_database():
     Remove all DRS objects from the Database
     """
 
-    with transaction.manager:
-        db = get_session()
-        zope.sqlalchemy.register(db, transaction.manager)
-
-        drs_objects = db.query(DrsObject).all()
-        for drs_object in drs_objects:
-            db.delete(drs_object)
-
-        db.flush()
+    delete_drs_objects(engine, chunk_size=get_config().cleanup_chunk_size)
 
 
 if __name__ == "__main__":
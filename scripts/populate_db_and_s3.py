@@ -22,46 +22,42 @@
 Provides a script function to populate a database
 """
 
-from datetime import datetime
+import argparse
 from pathlib import Path
-from os import listdir
-from os.path import isfile, join, getsize, getctime
-import hashlib
-from sqlalchemy.exc import IntegrityError
+from typing import Optional
+
 import transaction
 import zope.sqlalchemy
 import boto3
 
-from sandbox_storage.dao.db import get_session
+from sandbox_storage.dao.db import engine, get_session
 from sandbox_storage.dao.db_models import DrsObject
 from sandbox_storage.config import get_config
-
+from sandbox_storage.ingest import ingest_directory, sync_directory
 
 HERE = Path(__file__).parent.resolve()
 DIR_PATH = HERE.parent.resolve() / "examples"
 S3_URL = get_config().s3_url
 
 
-def md5(fname):
-    """
-    Returns md5 checksum of a file by cutting it in parts of 4096 bytes each
-    The Hash is not used in a secure context, but to provide a checksum
-    """
-    hash_md5 = hashlib.md5()  # nosec
-    with open(fname, "rb") as file:
-        for chunk in iter(lambda: file.read(4096), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
-
-
-# pylint: disable=duplicate-code
-def populate_database():
+def populate_database(manifest_path: Optional[Path] = None):
     """
-    Populates the database by retrieving the required attributes
-    and then making a commit to the database
+    Populates the database by uploading the files of the examples directory
+    and registering them, see ``sandbox-storage-admin ingest`` for
+    larger directories. With a manifest, only the files that changed since
+    the last run are synced, and the bucket is kept.
     """
 
-    files = [file for file in listdir(DIR_PATH) if isfile(join(DIR_PATH, file))]
+    if manifest_path is not None:
+        sync_directory(
+            DIR_PATH,
+            engine,
+            get_config(),
+            manifest_path,
+            bucket="test",
+            recursive=False,
+        )
+        return
 
     # Connect to s3
     s3 = boto3.resource(  # pylint: disable=invalid-name
@@ -77,41 +73,10 @@ def populate_database():
         # Create bucket "test" if it does not exist
         s3_bucket = s3.create_bucket(Bucket="test")
 
-    for file in files:
-        # Get full path
-        file_path = join(DIR_PATH, file)
-
-        # Get file size
-        size = getsize(file_path)
-
-        # Get creation time
-        created_time = datetime.fromtimestamp(getctime(file_path)).isoformat()
-
-        # Get md5 checksum
-        checksum_md5 = md5(file_path)
-
-        # Upload file to "test" bucket
-        s3_bucket.upload_file(file_path, file)
-
-        # Build file path
-        path = "http://s3-localstack:4566/test/" + file
-
-        try:
-            # Create Object in Database
-            drs_object = DrsObject(
-                drs_id=file,
-                path=path,
-                size=size,
-                created_time=created_time,
-                checksum_md5=checksum_md5,
-            )
-            with transaction.manager:
-                db = get_session()
-                zope.sqlalchemy.register(db, transaction.manager)
-                db.add(drs_object)
-                db.flush()
-        except IntegrityError as exception:
-            raise exception
+    # the objects of files registered before were deleted above:
+    ingest_directory(
+        DIR_PATH, engine, get_config(), bucket="test", recursive=False, replace=True
+    )
 
 
 def remove_test_files():
@@ -140,4 +105,8 @@ def remove_test_files():
 
 
 if __name__ == "__main__":
-    populate_database()
+    parser = argparse.ArgumentParser(description=populate_database.__doc__)
+    parser.add_argument(
+        "--sync-manifest", type=Path, help="sync incrementally using this manifest"
+    )
+    populate_database(parser.parse_args().sync_manifest)
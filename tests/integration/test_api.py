@@ -15,7 +15,6 @@
 
 """Test the api module"""
 
-
 from . import BaseIntegrationTest
 
 
@@ -56,9 +55,68 @@ class TestAPI(BaseIntegrationTest):
             == "3e48b55a59a8d521c3a261c6a41ef27e"  # noqa W503
         ), "Wrong checksum"
 
+    def test_objects_id_conditional(self):
+        """Unchanged objects are not sent again"""
+        response = self.testapp.get(
+            f"{self.config.api_route}/objects/Test1", status=200
+        )
+        assert response.headers["Cache-Control"] == "public, max-age=86400"
+        etag = response.headers["ETag"]
+        last_modified = response.headers["Last-Modified"]
+
+        self.testapp.get(
+            f"{self.config.api_route}/objects/Test1",
+            headers={"If-None-Match": etag},
+            status=304,
+        )
+        self.testapp.get(
+            f"{self.config.api_route}/objects/Test1",
+            headers={"If-Modified-Since": last_modified},
+            status=304,
+        )
+        self.testapp.get(
+            f"{self.config.api_route}/objects/Test1",
+            headers={"If-None-Match": '"outdated"'},
+            status=200,
+        )
+
     def test_objects_id_access_id(self):
         """Get the URL to download that object"""
         response = self.testapp.get(
             f"{self.config.api_route}/objects/Test1/access/s3", status=200
         )
         assert "Test1" in response.json["url"], "No or wrong Url"  # noqa W503
+        assert response.headers["Cache-Control"].startswith("private, max-age=")
+
+    def test_objects_bulk(self):
+        """Get Information about multiple objects at once"""
+        response = self.testapp.post_json(
+            f"{self.config.api_route}/objects",
+            {"bulk_object_ids": ["Test1", "Test1", "NotThere"]},
+            status=200,
+        )
+
+        assert response.json["summary"] == {
+            "requested": 2,
+            "resolved": 1,
+            "unresolved": 1,
+        }
+        assert response.json["resolved_drs_object"][0]["id"] == "Test1"
+        assert response.json["unresolved_drs_objects"] == [
+            {"error_code": 404, "object_ids": ["NotThere"]}
+        ]
+
+    def test_objects_access_bulk(self):
+        """Get the URLs to download multiple objects at once"""
+        response = self.testapp.post_json(
+            f"{self.config.api_route}/objects/access",
+            {"bulk_object_ids": ["Test1", "NotThere"], "access_id": "s3"},
+            status=200,
+        )
+
+        access_urls = response.json["resolved_drs_object_access_urls"]
+        assert [access_url["drs_object_id"] for access_url in access_urls] == ["Test1"]
+        assert "Test1" in access_urls[0]["url"], "No or wrong Url"
+        assert response.json["unresolved_drs_objects"] == [
+            {"error_code": 404, "object_ids": ["NotThere"]}
+        ]
@@ -0,0 +1,149 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the views of the api module without a database or broker"""
+
+# pylint: disable=redefined-outer-name
+
+from datetime import datetime
+
+import pytest
+from webtest import TestApp
+
+from sandbox_storage import api
+from sandbox_storage.config import get_config
+from sandbox_storage.dao.lookup import DrsObjectRecord
+
+OBJECTS = {
+    "Test1": DrsObjectRecord(
+        drs_id="Test1",
+        path="http://s3-localstack:4566/test/Test1",
+        size=42,
+        created_time=datetime(2021, 8, 30),
+        checksum_md5="3e48b55a59a8d521c3a261c6a41ef27e",
+    )
+}
+
+
+@pytest.fixture
+def testapp(monkeypatch):
+    """The Pyramid app with a fixed catalog, recording the published messages."""
+    messages = []
+    monkeypatch.setattr(
+        api,
+        "get_drs_objects",
+        lambda object_ids: {
+            object_id: OBJECTS[object_id]
+            for object_id in object_ids
+            if object_id in OBJECTS
+        },
+    )
+    monkeypatch.setattr(
+        api,
+        "send_messages",
+        lambda drs_ids, access_id, user_id: messages.extend(
+            (drs_id, access_id) for drs_id in drs_ids
+        ),
+    )
+    monkeypatch.setattr(
+        api, "get_s3_access_url", lambda object_id: f"http://localhost:4566/{object_id}"
+    )
+    app = TestApp(api.get_app(get_config()))
+    app.messages = messages
+    return app
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"bulk_object_ids": []},
+        {},
+        {"bulk_object_ids": [1]},
+        {"bulk_object_ids": "Test1"},
+    ],
+)
+def test_objects_invalid_body(testapp, body):
+    """Bodies that don't match the spec get the documented error response."""
+    response = testapp.post_json("/ga4gh/drs/v1/objects", body, status=400)
+    assert response.json["status_code"] == 400
+    assert response.json["msg"].startswith("Invalid request: ")
+    assert not testapp.messages
+
+
+def test_objects_too_many_ids(testapp, monkeypatch):
+    """Requests for more than ``bulk_max_object_ids`` objects are rejected."""
+    monkeypatch.setattr(api.CONFIG_SETTINGS, "bulk_max_object_ids", 2)
+    response = testapp.post_json(
+        "/ga4gh/drs/v1/objects",
+        {"bulk_object_ids": ["Test1", "Test2", "Test3"]},
+        status=413,
+    )
+    assert response.json == {
+        "msg": "Too many object IDs, at most 2 are allowed",
+        "status_code": 413,
+    }
+
+    # duplicates don't count:
+    testapp.post_json(
+        "/ga4gh/drs/v1/objects",
+        {"bulk_object_ids": ["Test1", "Test2", "Test1"]},
+        status=200,
+    )
+
+
+@pytest.mark.parametrize(
+    "body",
+    [{"bulk_object_ids": ["Test1"]}, {"bulk_object_ids": ["Test1"], "access_id": 1}],
+)
+def test_objects_access_invalid_body(testapp, body):
+    """Bodies without a valid access ID get the documented error response."""
+    response = testapp.post_json("/ga4gh/drs/v1/objects/access", body, status=400)
+    assert response.json["status_code"] == 400
+    assert not testapp.messages
+
+
+def test_objects_access(testapp):
+    """Duplicate IDs are collapsed and IDs that weren't found are reported."""
+    response = testapp.post_json(
+        "/ga4gh/drs/v1/objects/access",
+        {"bulk_object_ids": ["Test1", "Test2", "Test1"], "access_id": "s3"},
+        status=200,
+    )
+    assert response.json == {
+        "summary": {"requested": 2, "resolved": 1, "unresolved": 1},
+        "resolved_drs_object_access_urls": [
+            {
+                "drs_object_id": "Test1",
+                "drs_access_id": "s3",
+                "url": "http://localhost:4566/Test1",
+            }
+        ],
+        "unresolved_drs_objects": [{"error_code": 404, "object_ids": ["Test2"]}],
+    }
+    assert testapp.messages == [("Test1", "s3")]
+
+
+def test_objects_access_unknown_access_id(testapp):
+    """Only the "s3" access method exists."""
+    response = testapp.post_json(
+        "/ga4gh/drs/v1/objects/access",
+        {"bulk_object_ids": ["Test1"], "access_id": "gs"},
+        status=400,
+    )
+    assert response.json == {
+        "msg": "The requested access method does not exist",
+        "status_code": 400,
+    }
+    assert not testapp.messages
@@ -0,0 +1,128 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the async_pubsub module"""
+
+import asyncio
+
+import pytest
+
+from sandbox_storage.async_pubsub import AsyncAmqpTopic, AsyncPublisher
+from sandbox_storage.config import get_config
+from sandbox_storage.pubsub import make_batch_message
+
+
+class BlockingTopic(AsyncAmqpTopic):
+    """A topic whose publish waits until it is released."""
+
+    def __init__(self):
+        super().__init__(host="localhost", port=5672, topic_name="test")
+        self.release = asyncio.Event()
+        self.published: list = []
+
+    async def publish(self, message: dict) -> None:
+        """Wait for the release, then record the message."""
+        await self.release.wait()
+        self.published.append(message)
+
+    async def close(self) -> None:
+        """Nothing to close."""
+
+
+def event(drs_id: str, access_id: str = "s3") -> dict:
+    """Build a download request event."""
+    return {"drs_id": drs_id, "access_id": access_id, "user_id": "user_id"}
+
+
+def get_publisher(**settings) -> AsyncPublisher:
+    """Get a publisher with the given settings and a blocking topic."""
+    publisher = AsyncPublisher(get_config().copy(update=settings))
+    publisher.topic = BlockingTopic()
+    return publisher
+
+
+@pytest.mark.parametrize(
+    "overflow_policy, expected",
+    [("drop_new", [0, 1, 2]), ("drop_oldest", [0, 3, 4])],
+)
+def test_background_overflow_policies(overflow_policy, expected):
+    """The queue is bounded, either the new or the oldest message is dropped."""
+
+    async def run():
+        publisher = get_publisher(
+            publish_mode="background",
+            publish_queue_size=2,
+            publish_overflow_policy=overflow_policy,
+        )
+        await publisher.publish({"n": 0})
+        await asyncio.sleep(0)  # the worker picks it up
+        for number in range(1, 5):
+            await publisher.publish({"n": number})
+        assert publisher.dropped == 2
+
+        publisher.topic.release.set()
+        await publisher.close()
+        return [message["n"] for message in publisher.topic.published]
+
+    assert asyncio.run(run()) == expected
+
+
+def test_background_block_policy_times_out():
+    """With the block policy, the message is dropped after the timeout."""
+
+    async def run():
+        publisher = get_publisher(
+            publish_mode="background",
+            publish_queue_size=1,
+            publish_overflow_policy="block",
+            publish_block_timeout=0.01,
+        )
+        await publisher.publish({"n": 0})
+        await asyncio.sleep(0)
+        await publisher.publish({"n": 1})
+        await publisher.publish({"n": 2})
+        assert publisher.dropped == 1
+
+        publisher.topic.release.set()
+        await publisher.close()
+        return [message["n"] for message in publisher.topic.published]
+
+    assert asyncio.run(run()) == [0, 1]
+
+
+def test_batches():
+    """Events are sent in batches of the batch size, or when closing."""
+
+    async def run():
+        publisher = get_publisher(
+            publish_mode="batch", publish_batch_size=3, publish_batch_interval_ms=60000
+        )
+        publisher.topic.release.set()
+        for drs_id in ["Test1", "Test2", "Test1", "Test3"]:
+            await publisher.publish(event(drs_id))
+        for _ in range(100):
+            if publisher.topic.published:
+                break
+            await asyncio.sleep(0.001)
+        assert publisher.topic.published == [
+            make_batch_message(
+                [dict(event("Test1"), count=2), dict(event("Test2"), count=1)]
+            )
+        ]
+
+        await publisher.close()
+        return publisher.topic.published[1:]
+
+    assert asyncio.run(run()) == [make_batch_message([dict(event("Test3"), count=1)])]
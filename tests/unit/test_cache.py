@@ -0,0 +1,76 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the cache module"""
+
+from sandbox_storage.cache import TTLCache
+
+
+class FakeClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hit_and_expiry():
+    """Entries are returned until their time-to-live has passed."""
+    clock = FakeClock()
+    cache = TTLCache(max_size=10, ttl=60, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=120)
+
+    clock.now = 59
+    assert cache.get("a") == 1
+    clock.now = 60
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+    assert cache.metrics() == {
+        "size": 1,
+        "hits": 2,
+        "misses": 1,
+        "evictions": 0,
+        "expirations": 1,
+    }
+
+
+def test_lru_eviction():
+    """When full, the least recently used entry is evicted."""
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_invalidate_and_disabled():
+    """Entries can be removed explicitly, a size of zero disables caching."""
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.invalidate("a")
+    assert cache.get("a") is None
+
+    disabled = TTLCache(max_size=0, ttl=60)
+    disabled.set("a", 1)
+    assert disabled.get("a") is None
@@ -0,0 +1,74 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the cache_control module"""
+
+from types import SimpleNamespace
+
+from pyramid.response import Response
+
+from sandbox_storage.cache_control import (
+    NO_STORE,
+    CachePolicy,
+    cache_control_response_callback_factory,
+    get_cache_headers,
+    limit_max_age,
+)
+from sandbox_storage.config import get_config
+
+
+def test_get_cache_headers():
+    """The max-age is bounded by the limit, but not negative."""
+    policy = CachePolicy(cache_control="private", max_age=3600, vary="Authorization")
+    assert get_cache_headers(policy) == {
+        "Cache-Control": "private, max-age=3600",
+        "Vary": "Authorization",
+    }
+    assert get_cache_headers(policy, 599.7)["Cache-Control"] == "private, max-age=599"
+    assert get_cache_headers(policy, -5)["Cache-Control"] == "private, max-age=0"
+    assert get_cache_headers(NO_STORE, 10) == {"Cache-Control": "no-store"}
+
+
+def respond(route_name, status_code=200, max_age_limit=None):
+    """Run the callback for a response of a route."""
+    callbacks = []
+    request = SimpleNamespace(
+        matched_route=SimpleNamespace(name=route_name) if route_name else None,
+        add_response_callback=callbacks.append,
+    )
+    if max_age_limit is not None:
+        limit_max_age(request, max_age_limit)
+    cache_control_response_callback_factory(get_config())(
+        SimpleNamespace(request=request)
+    )
+    response = Response(status=status_code)
+    for callback in callbacks:
+        callback(request, response)
+    return response.headers
+
+
+def test_route_policies():
+    """Routes get their policy, errors are never stored."""
+    assert respond("objects_id")["Cache-Control"] == "public, max-age=86400"
+    assert respond("objects_id", 304)["Cache-Control"] == "public, max-age=86400"
+    assert respond("objects_id", 404)["Cache-Control"] == "no-store"
+    assert "Vary" not in respond("objects_id", 404)
+    assert respond("objects_id_access_id", max_age_limit=120)["Cache-Control"] == (
+        "private, max-age=120"
+    )
+    assert respond(None, 404)["Cache-Control"] == "no-store"
+    assert respond("hello")["Cache-Control"] == "no-store"
+    assert respond("metrics")["Cache-Control"] == "no-store"
+    assert "Cache-Control" not in respond("unknown")
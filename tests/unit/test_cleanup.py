@@ -0,0 +1,96 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the cleanup module"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, select
+
+from sandbox_storage.cleanup import DRS_OBJECTS, delete_drs_objects
+from sandbox_storage.dao.db import Base
+
+DRS_IDS = ["a1", "a2", "a_3", "a%4", "ab5", "b1", "b2", "c1", "a6", "a7"]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """An SQLite database with a few DRS objects, one created per day."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            DRS_OBJECTS.insert(),
+            [
+                {
+                    "drs_id": drs_id,
+                    "path": f"http://s3-localstack:4566/test/{drs_id}",
+                    "size": 0,
+                    "created_time": datetime(2021, 9, day),
+                    "checksum_md5": "d41d8cd98f00b204e9800998ecf8427e",
+                }
+                for day, drs_id in enumerate(DRS_IDS, start=1)
+            ],
+        )
+    return engine
+
+
+def remaining(engine):  # pylint: disable=redefined-outer-name
+    """The DRS IDs left in the database."""
+    with engine.connect() as connection:
+        return set(connection.execute(select(DRS_OBJECTS.c.drs_id)).scalars())
+
+
+def test_delete_all(engine):  # pylint: disable=redefined-outer-name
+    """Without filters, all objects are deleted at once."""
+    stats = delete_drs_objects(engine)
+
+    assert stats.truncated
+    assert stats.rows_deleted == len(DRS_IDS)
+    assert not remaining(engine)
+
+
+def test_delete_prefix_in_chunks(engine):  # pylint: disable=redefined-outer-name
+    """Objects matching the prefix are deleted in chunks, wildcards are escaped."""
+    progress = []
+    stats = delete_drs_objects(
+        engine,
+        drs_id_prefix="a",
+        chunk_size=2,
+        on_progress=lambda stats: progress.append(stats.rows_deleted),
+    )
+
+    assert not stats.truncated
+    assert (stats.rows_deleted, stats.chunks) == (7, 4)
+    assert progress == [2, 4, 6, 7, 7]
+    assert remaining(engine) == {"b1", "b2", "c1"}
+
+    stats = delete_drs_objects(engine, drs_id_prefix="b_")
+    assert stats.rows_deleted == 0
+    assert remaining(engine) == {"b1", "b2", "c1"}
+
+
+def test_delete_created_range(engine):  # pylint: disable=redefined-outer-name
+    """The created time range includes its start, but not its end."""
+    stats = delete_drs_objects(
+        engine,
+        drs_id_prefix="a",
+        created_after=datetime(2021, 9, 2),
+        created_before=datetime(2021, 9, 9),
+        chunk_size=100,
+    )
+
+    assert (stats.rows_deleted, stats.chunks) == (4, 1)
+    assert remaining(engine) == {"a1", "b1", "b2", "c1", "a6", "a7"}
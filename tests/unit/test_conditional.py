@@ -0,0 +1,67 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the conditional module"""
+
+from datetime import datetime
+
+import pytest
+
+from sandbox_storage.conditional import (
+    get_etag,
+    get_validator_headers,
+    is_not_modified,
+)
+from sandbox_storage.dao.lookup import DrsObjectRecord
+
+RECORD = DrsObjectRecord(
+    drs_id="Test1",
+    path="http://s3-localstack:4566/test/Test1",
+    size=42,
+    created_time=datetime(2021, 8, 30, 12, 0, 0, 500),
+    checksum_md5="3e48b55a59a8d521c3a261c6a41ef27e",
+)
+
+
+def test_validator_headers():
+    """The ETag is strong and depends on the checksum and creation time."""
+    assert get_validator_headers(RECORD) == {
+        "ETag": '"3e48b55a59a8d521c3a261c6a41ef27e-5cac5929291f4"',
+        "Last-Modified": "Mon, 30 Aug 2021 12:00:00 GMT",
+    }
+    assert get_etag(RECORD._replace(created_time=datetime(2021, 8, 30, 12))) != (
+        get_etag(RECORD)
+    )
+
+
+@pytest.mark.parametrize(
+    "if_none_match,if_modified_since,expected",
+    [
+        (None, None, False),
+        ('"3e48b55a59a8d521c3a261c6a41ef27e-5cac5929291f4"', None, True),
+        ('"other", W/"3e48b55a59a8d521c3a261c6a41ef27e-5cac5929291f4"', None, True),
+        ("*", None, True),
+        ('"other"', None, False),
+        # If-None-Match takes precedence:
+        ('"other"', "Mon, 30 Aug 2021 12:00:00 GMT", False),
+        (None, "Mon, 30 Aug 2021 12:00:00 GMT", True),
+        (None, "Mon, 30 Aug 2021 14:00:00 +0200", True),
+        (None, "Mon, 30 Aug 2021 11:59:59 GMT", False),
+        (None, "not a date", False),
+    ],
+)
+def test_is_not_modified(if_none_match, if_modified_since, expected):
+    """Preconditions are evaluated like RFC 7232 describes."""
+    assert is_not_modified(RECORD, if_none_match, if_modified_since) == expected
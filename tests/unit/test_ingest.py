@@ -0,0 +1,273 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the ingest module"""
+
+import hashlib
+import itertools
+import os
+import threading
+
+import pytest
+from sqlalchemy import create_engine, select
+
+from sandbox_storage import ingest
+from sandbox_storage.config import get_config
+from sandbox_storage.dao.db import Base
+from sandbox_storage.dao.db_models import DrsObject
+
+
+class FakeS3Client:
+    """Keeps uploaded files in memory."""
+
+    def __init__(self):
+        self.buckets = set()
+        self.objects = {}
+        self.uploads = {}
+        self.upload_ids = itertools.count()
+        self.aborted = []
+        self.lock = threading.Lock()
+
+    def head_bucket(self, Bucket):  # pylint: disable=invalid-name
+        """Fail if the bucket doesn't exist."""
+        if Bucket not in self.buckets:
+            raise ingest.ClientError({"Error": {"Code": "404"}}, "HeadBucket")
+
+    def create_bucket(self, Bucket):  # pylint: disable=invalid-name
+        """Create the bucket."""
+        self.buckets.add(Bucket)
+
+    def put_object(self, Bucket, Key, Body):  # pylint: disable=invalid-name
+        """Store an object, unless its name says otherwise."""
+        if "broken" in Key:
+            raise OSError("Upload failed")
+        with self.lock:
+            self.objects[(Bucket, Key)] = Body
+
+    def create_multipart_upload(self, Bucket, Key):  # pylint: disable=invalid-name
+        """Start a multipart upload."""
+        with self.lock:
+            upload_id = f"upload{next(self.upload_ids)}"
+            self.uploads[upload_id] = {"key": (Bucket, Key), "parts": {}}
+        return {"UploadId": upload_id}
+
+    def upload_part(  # pylint: disable=invalid-name,too-many-arguments
+        self, Bucket, Key, UploadId, PartNumber, Body
+    ):
+        """Store a part, unless its name says otherwise."""
+        assert self.uploads[UploadId]["key"] == (Bucket, Key)
+        if "broken" in Key and PartNumber == 2:
+            raise OSError("Upload failed")
+        self.uploads[UploadId]["parts"][PartNumber] = Body
+        return {"ETag": f'"{hashlib.md5(Body).hexdigest()}"'}  # nosec
+
+    def complete_multipart_upload(  # pylint: disable=invalid-name
+        self, Bucket, Key, UploadId, MultipartUpload
+    ):
+        """Join the parts in the given order."""
+        upload = self.uploads.pop(UploadId)
+        assert upload["key"] == (Bucket, Key)
+        self.objects[(Bucket, Key)] = b"".join(
+            upload["parts"][part["PartNumber"]] for part in MultipartUpload["Parts"]
+        )
+
+    def abort_multipart_upload(
+        self, Bucket, Key, UploadId
+    ):  # pylint: disable=invalid-name
+        """Discard the parts."""
+        assert self.uploads.pop(UploadId)["key"] == (Bucket, Key)
+        self.aborted.append(Key)
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    """The fake S3 client used by the ingestion."""
+    client = FakeS3Client()
+    monkeypatch.setattr(ingest.boto3, "client", lambda **_: client)
+    return client
+
+
+def test_scan_directory(tmp_path):
+    """Subdirectories are only scanned if asked to."""
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "file").write_bytes(b"content")
+    (tmp_path / "nested" / "file").write_bytes(b"nested content")
+
+    assert [file.drs_id for file in ingest.scan_directory(tmp_path)] == ["file"]
+    assert sorted(
+        file.drs_id for file in ingest.scan_directory(tmp_path, recursive=True)
+    ) == ["file", "nested/file"]
+
+
+def test_ingest_directory(tmp_path, s3_client):  # pylint: disable=redefined-outer-name
+    """Files are uploaded and registered in batches, failures are counted."""
+    directory = tmp_path / "data"
+    (directory / "nested").mkdir(parents=True)
+    contents = {f"file{index}": f"content {index}".encode() for index in range(5)}
+    contents["nested/file"] = b"nested content"
+    for name, content in contents.items():
+        (directory / name).write_bytes(content)
+    (directory / "broken").write_bytes(b"")
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    # an older version of one of the files is already registered:
+    old_checksum = hashlib.md5(b"old content").hexdigest()  # nosec
+    ingest.insert_drs_objects(
+        engine,
+        [
+            {
+                "drs_id": "file0",
+                "path": "http://s3-localstack:4566/test/file0",
+                "size": 11,
+                "created_time": ingest.datetime(2021, 8, 30),
+                "checksum_md5": old_checksum,
+            }
+        ],
+    )
+
+    def get_checksums():
+        with engine.connect() as connection:
+            rows = connection.execute(
+                select(DrsObject.__table__.c.drs_id, DrsObject.__table__.c.checksum_md5)
+            ).all()
+        return dict(rows)
+
+    progress = []
+    config = get_config().copy(
+        update={
+            "ingest_workers": 2,
+            "ingest_batch_size": 2,
+            "ingest_multipart_chunksize": 4,
+        }
+    )
+    stats = ingest.ingest_directory(
+        directory,
+        engine,
+        config,
+        bucket="test",
+        recursive=True,
+        on_progress=progress.append,
+    )
+
+    # the registered file is neither uploaded nor registered again:
+    assert stats.files_total == 6
+    assert stats.files_uploaded == 5
+    assert stats.files_failed == 1
+    assert stats.files_registered_before == 1
+    assert stats.batches == 3
+    assert progress[-1] is stats
+    assert "5/6 files" in stats.summary()
+    assert "1 already registered" in stats.summary()
+
+    assert s3_client.buckets == {"test"}
+    assert s3_client.objects == {
+        ("test", name): content for name, content in contents.items() if name != "file0"
+    }
+    checksums = {
+        name: hashlib.md5(content).hexdigest()  # nosec
+        for name, content in contents.items()
+    }
+    assert get_checksums() == {**checksums, "file0": old_checksum}
+
+    # unless it is replaced:
+    stats = ingest.ingest_directory(
+        directory, engine, config, bucket="test", recursive=True, replace=True
+    )
+    assert stats.files_total == 7
+    assert stats.files_uploaded == 6
+    assert stats.files_registered_before == 0
+    assert s3_client.objects[("test", "file0")] == contents["file0"]
+    assert get_checksums() == checksums
+
+
+def test_sync_directory(tmp_path, s3_client):  # pylint: disable=redefined-outer-name
+    """Only new and changed files are synced, interrupted syncs are resumed."""
+    directory = tmp_path / "data"
+    directory.mkdir()
+    for name in ("file0", "file1", "file2"):
+        (directory / name).write_bytes(name.encode())
+    manifest_path = directory / "manifest.sqlite3"
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    config = get_config().copy(update={"ingest_workers": 2})
+
+    def sync():
+        s3_client.objects.clear()
+        return ingest.sync_directory(
+            directory, engine, config, manifest_path, bucket="test"
+        )
+
+    def registered():
+        with engine.connect() as connection:
+            rows = connection.execute(
+                select(DrsObject.__table__.c.drs_id, DrsObject.__table__.c.size)
+            ).all()
+        return dict(rows)
+
+    stats = sync()
+    assert (stats.files_uploaded, stats.files_unchanged) == (3, 0)
+    assert registered() == {"file0": 5, "file1": 5, "file2": 5}
+
+    (directory / "file1").write_bytes(b"changed")
+    (directory / "file3").write_bytes(b"new")
+    stats = sync()
+    assert (stats.files_uploaded, stats.files_unchanged) == (2, 2)
+    assert set(s3_client.objects) == {("test", "file1"), ("test", "file3")}
+    assert registered() == {"file0": 5, "file1": 7, "file2": 5, "file3": 3}
+
+    # interrupted after uploading, before registering:
+    manifest = ingest.Manifest(manifest_path)
+    manifest.record_uploaded("file4", 5, 0, "md5")
+    manifest.close()
+    (directory / "file4").write_bytes(b"file4")
+    os.utime(directory / "file4", ns=(0, 0))
+    stats = sync()
+    assert (stats.files_uploaded, stats.files_unchanged) == (0, 4)
+    assert not s3_client.objects
+    assert registered()["file4"] == 5
+
+    assert sync().files_registered == 0
+
+
+@pytest.mark.parametrize("size", [0, 3, 4, 5, 8, 17])
+def test_upload_with_md5(tmp_path, size):
+    """Files are read once, hashed, and uploaded in parts of the chunk size."""
+    content = bytes(range(size))
+    file_path = tmp_path / "file"
+    file_path.write_bytes(content)
+    client = FakeS3Client()
+
+    result = ingest.upload_with_md5(
+        client, file_path, "test", "key", chunk_size=4, concurrency=2
+    )
+
+    assert result == (hashlib.md5(content).hexdigest(), size)  # nosec
+    assert client.objects == {("test", "key"): content}
+    assert not client.uploads
+
+
+def test_upload_with_md5_aborts(tmp_path):
+    """Failed multipart uploads are aborted."""
+    file_path = tmp_path / "file"
+    file_path.write_bytes(bytes(20))
+    client = FakeS3Client()
+
+    with pytest.raises(OSError):
+        ingest.upload_with_md5(
+            client, file_path, "test", "broken", chunk_size=4, concurrency=2
+        )
+    assert client.aborted == ["broken"]
+    assert not client.objects
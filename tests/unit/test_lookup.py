@@ -0,0 +1,82 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the lookup module"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from sandbox_storage.cache import TTLCache
+from sandbox_storage.dao import lookup
+from sandbox_storage.dao.db import Base
+from sandbox_storage.dao.db_models import DrsObject
+
+
+@pytest.fixture
+def session(monkeypatch):
+    """An SQLite session with one DRS object that the lookups use."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = Session(bind=engine)
+    session.add(
+        DrsObject(
+            drs_id="Test1",
+            path="http://s3-localstack:4566/test/Test1",
+            size=42,
+            created_time=datetime(2021, 8, 30),
+            checksum_md5="3e48b55a59a8d521c3a261c6a41ef27e",
+        )
+    )
+    session.commit()
+    monkeypatch.setattr(lookup, "get_session", lambda: session)
+    cache = TTLCache(max_size=10, ttl=60)
+    monkeypatch.setattr(lookup, "get_metadata_cache", lambda: cache)
+    yield session
+    session.close()
+
+
+def test_query(session):  # pylint: disable=unused-argument,redefined-outer-name
+    """Existing objects are returned as records."""
+    assert lookup.get_drs_object("Test1") == lookup.DrsObjectRecord(
+        drs_id="Test1",
+        path="http://s3-localstack:4566/test/Test1",
+        size=42,
+        created_time=datetime(2021, 8, 30),
+        checksum_md5="3e48b55a59a8d521c3a261c6a41ef27e",
+    )
+    assert lookup.get_drs_object("Test2") is None
+
+
+def test_read_through_and_invalidation(session):  # pylint: disable=redefined-outer-name
+    """Cached objects don't hit the database until they are invalidated."""
+    record = lookup.get_drs_object("Test1")
+    session.query(DrsObject).delete()
+    session.commit()
+
+    assert lookup.get_drs_object("Test1") == record
+    lookup.invalidate_drs_object("Test1")
+    assert lookup.get_drs_object("Test1") is None
+
+
+def test_bulk_lookup(session):  # pylint: disable=redefined-outer-name
+    """Cached and uncached objects are combined, missing ones left out."""
+    cached = lookup.get_drs_object("Test1")
+    session.query(DrsObject).delete()
+    session.commit()
+
+    assert lookup.get_drs_objects(["Test1", "Test2"]) == {"Test1": cached}
@@ -0,0 +1,70 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the metrics module"""
+
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+from sandbox_storage import metrics
+from sandbox_storage.dao import db
+from sandbox_storage.dao.lookup import get_metadata_cache
+from sandbox_storage.dao.pool import InstrumentedQueuePool
+
+
+def test_stage_duration():
+    """Stages are timed by their own histograms."""
+
+    def get_count():
+        return REGISTRY.get_sample_value(
+            "sandbox_storage_stage_duration_seconds_count", {"stage": "s3_presign"}
+        )
+
+    before = get_count()
+    with metrics.S3_PRESIGN_DURATION.time():
+        pass
+    assert get_count() == before + 1
+
+
+def test_service_collector(tmp_path, monkeypatch):
+    """The pool usage and the cache statistics are collected on scrape."""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=3,
+    )
+    monkeypatch.setattr(db, "engine", engine)
+    cache = get_metadata_cache()
+    cache.get("unknown")
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        output = metrics.get_metrics().decode()
+
+    assert 'sandbox_storage_db_pool_size{database="primary"} 3.0' in output
+    assert 'sandbox_storage_db_pool_checked_out{database="primary"} 1.0' in output
+    assert 'sandbox_storage_db_pool_checkouts_total{database="primary"} 1.0' in output
+    assert "# TYPE sandbox_storage_cache_size gauge" in output
+    assert (
+        f'sandbox_storage_cache_misses_total{{cache="metadata"}} '
+        f'{float(cache.metrics()["misses"])}' in output
+    )
+
+
+def test_metrics_view():
+    """The metrics are served in the text format."""
+    response = metrics.get_metrics_view(None)
+    assert response.content_type == "text/plain"
+    assert "version=0.0.4" in response.headers["Content-Type"]
+    assert b"sandbox_storage_stage_duration_seconds_bucket" in response.body
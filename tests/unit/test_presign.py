@@ -0,0 +1,147 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Differential tests of the presign module against botocore"""
+
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import boto3
+import pytest
+from botocore.config import Config as BotoConfig
+
+from sandbox_storage.presign import SigV4Presigner, get_url_expiry
+
+KEYS = [
+    "Test1",
+    "dataset1_file1.fastq",
+    "nested/path/to/object.bam",
+    "with space and+plus",
+    "special!*'();:@&=$,?#[]%chars",
+    "tilde~and-dash_and.dot",
+    "unicode/äöü/😀",
+    "/leading/slash",
+    "trailing/slash/",
+    "double//slash",
+]
+
+ENDPOINTS = [
+    ("http://s3-localstack:4566", "eu-west-1"),
+    ("https://s3.eu-central-1.amazonaws.com", "eu-central-1"),
+    ("https://S3.Example.Org:443", "us-east-1"),
+    ("http://127.0.0.1:9000/prefix/", "de-ghga-1"),
+]
+
+TIMES = [
+    datetime(2021, 8, 30, 0, 0, 0),
+    datetime(2021, 12, 31, 23, 59, 59),
+    datetime(2024, 2, 29, 12, 30, 15),
+]
+
+
+def botocore_presign(  # pylint: disable=too-many-arguments
+    endpoint_url, region_name, token, bucket, key, expires_in, now
+):
+    """Create a presigned URL with botocore at a fixed time."""
+    session = boto3.session.Session(
+        aws_access_key_id="AKIDEXAMPLE",
+        aws_secret_access_key="wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY",
+        aws_session_token=token,
+        region_name=region_name,
+    )
+    client = session.client(
+        "s3",
+        endpoint_url=endpoint_url,
+        config=BotoConfig(signature_version="s3v4"),
+    )
+    with mock.patch("botocore.auth.datetime") as mock_datetime:
+        mock_datetime.datetime.utcnow.return_value = now
+        return client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": bucket, "Key": key},
+            ExpiresIn=expires_in,
+        )
+
+
+def make_presigner(endpoint_url, region_name, token):
+    """Create a presigner with the same credentials as ``botocore_presign``."""
+    credentials = boto3.session.Session(
+        aws_access_key_id="AKIDEXAMPLE",
+        aws_secret_access_key="wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY",
+        aws_session_token=token,
+    ).get_credentials()
+    return SigV4Presigner(
+        endpoint_url=endpoint_url,
+        region_name=region_name,
+        get_credentials=credentials.get_frozen_credentials,
+    )
+
+
+@pytest.mark.parametrize("key", KEYS)
+@pytest.mark.parametrize("endpoint_url, region_name", ENDPOINTS)
+def test_matches_botocore_for_keys_and_endpoints(endpoint_url, region_name, key):
+    """The URLs should be identical for all keys and endpoints."""
+    now = TIMES[0]
+    presigner = make_presigner(endpoint_url, region_name, None)
+
+    assert presigner.presign_get_object(
+        "test", key, expires_in=86400, now=now
+    ) == botocore_presign(endpoint_url, region_name, None, "test", key, 86400, now)
+
+
+@pytest.mark.parametrize("token", [None, "session/token+with=special&chars"])
+@pytest.mark.parametrize("expires_in", [1, 3600, 86400, 604800])
+@pytest.mark.parametrize("now", TIMES)
+def test_matches_botocore_for_credentials_and_times(token, expires_in, now):
+    """The URLs should be identical with or without session tokens and
+    for different expiry and signing times."""
+    endpoint_url, region_name = ENDPOINTS[0]
+    presigner = make_presigner(endpoint_url, region_name, token)
+
+    assert presigner.presign_get_object(
+        "my-bucket.name", "Test1", expires_in=expires_in, now=now
+    ) == botocore_presign(
+        endpoint_url, region_name, token, "my-bucket.name", "Test1", expires_in, now
+    )
+
+
+def test_signing_key_is_renewed_at_midnight():
+    """A cached signing key must not be used for the next day."""
+    endpoint_url, region_name = ENDPOINTS[0]
+    presigner = make_presigner(endpoint_url, region_name, None)
+    before_midnight = TIMES[1]
+    after_midnight = before_midnight + timedelta(seconds=1)
+
+    for now in (before_midnight, after_midnight, before_midnight):
+        assert presigner.presign_get_object(
+            "test", "Test1", expires_in=86400, now=now
+        ) == botocore_presign(
+            endpoint_url, region_name, None, "test", "Test1", 86400, now
+        )
+
+
+def test_get_url_expiry():
+    """The expiry is read from SigV4 and SigV2 URLs."""
+    endpoint_url, region_name = ENDPOINTS[0]
+    url = make_presigner(endpoint_url, region_name, None).presign_get_object(
+        "test", "Test1", expires_in=600, now=TIMES[0]
+    )
+    assert get_url_expiry(url) == datetime(2021, 8, 30, 0, 10, tzinfo=timezone.utc)
+
+    assert get_url_expiry(
+        "http://s3-localstack:4566/test/Test1?AWSAccessKeyId=test"
+        "&Signature=abc&Expires=1630282200"
+    ) == datetime(2021, 8, 30, 0, 10, tzinfo=timezone.utc)
+    assert get_url_expiry("http://s3-localstack:4566/test/Test1") is None
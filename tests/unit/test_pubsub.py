@@ -0,0 +1,306 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the pubsub module"""
+
+import json
+import os
+import threading
+import time
+
+import pika
+import pytest
+
+from sandbox_storage import pubsub
+from sandbox_storage.pubsub import (
+    BackgroundPublisher,
+    BatchingPublisher,
+    PersistentAmqpTopic,
+    make_batch_message,
+)
+
+
+class FakeChannel:
+    """Records published messages instead of sending them."""
+
+    def __init__(self, published: list):
+        self.is_closed = False
+        self.published = published
+
+    def exchange_declare(self, **_):
+        """Nothing to declare."""
+
+    def basic_publish(self, body, **_):
+        """Record the message body."""
+        if self.is_closed:
+            raise pika.exceptions.StreamLostError("connection lost")
+        self.published.append(json.loads(body))
+
+
+class FakeConnection:
+    """Stands in for ``pika.BlockingConnection``."""
+
+    instances: list = []
+
+    def __init__(self, _):
+        self.is_closed = False
+        self.published: list = []
+        self._channel = FakeChannel(self.published)
+        FakeConnection.instances.append(self)
+
+    @property
+    def is_open(self):
+        """Inverse of is_closed."""
+        return not self.is_closed
+
+    def channel(self):
+        """Return the single channel of this connection."""
+        return self._channel
+
+    def process_data_events(self, **_):
+        """No events to process."""
+
+    def close(self):
+        """Mark the connection as closed."""
+        self.is_closed = True
+
+
+@pytest.fixture
+def topic(monkeypatch):
+    """A PersistentAmqpTopic that connects to fake connections."""
+    FakeConnection.instances = []
+    monkeypatch.setattr(pika, "BlockingConnection", FakeConnection)
+    return PersistentAmqpTopic(
+        connection_params=pika.ConnectionParameters(),
+        topic_name="download_request",
+        service_name="storage",
+    )
+
+
+def test_connection_is_reused(topic):
+    """Consecutive publishes should share one connection."""
+    topic.publish({"drs_id": "Test1"})
+    topic.publish({"drs_id": "Test2"})
+
+    assert len(FakeConnection.instances) == 1
+    assert FakeConnection.instances[0].published == [
+        {"drs_id": "Test1"},
+        {"drs_id": "Test2"},
+    ]
+
+
+def test_reconnect_on_stale_connection(topic):
+    """A channel that broke since the last publish should be replaced."""
+    topic.publish({"drs_id": "Test1"})
+    FakeConnection.instances[0].channel().is_closed = True
+    topic.publish({"drs_id": "Test2"})
+
+    assert len(FakeConnection.instances) == 2
+    assert FakeConnection.instances[1].published == [{"drs_id": "Test2"}]
+
+
+def test_new_connection_after_fork(topic):
+    """A child process must not reuse or close the socket of its parent."""
+    topic.publish({"drs_id": "Test1"})
+
+    pid = os.fork()
+    if pid == 0:  # the child, which must not return to pytest
+        exit_code = 1
+        try:
+            topic.publish({"drs_id": "Test2"})
+            topic.close()
+            parent_connection, connection = FakeConnection.instances
+            exit_code = int(
+                parent_connection.published != [{"drs_id": "Test1"}]
+                or not parent_connection.is_open
+                or connection.published != [{"drs_id": "Test2"}]
+            )
+        finally:
+            os._exit(exit_code)  # pylint: disable=protected-access
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+class BlockingTopic:
+    """A topic whose publish waits until it is released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.published: list = []
+
+    def publish(self, message):
+        """Wait for the release, then record the message."""
+        self.release.wait()
+        self.published.append(message)
+
+
+def fill_queue(publisher: BackgroundPublisher, n_messages: int):
+    """Publish numbered messages while the worker is stuck on the first."""
+    publisher.publish({"n": 0})
+    while publisher.queue_depth:  # wait for the worker to pick it up
+        time.sleep(0.001)
+    for number in range(1, n_messages):
+        publisher.publish({"n": number})
+
+
+@pytest.mark.parametrize(
+    "overflow_policy, expected",
+    [("drop_new", [0, 1, 2]), ("drop_oldest", [0, 3, 4])],
+)
+def test_background_overflow_policies(overflow_policy, expected):
+    """When the queue is full, either the new or the oldest message is dropped."""
+    topic = BlockingTopic()
+    publisher = BackgroundPublisher(
+        topic, queue_size=2, overflow_policy=overflow_policy
+    )
+    fill_queue(publisher, 5)
+
+    assert publisher.queue_depth == 2
+    assert publisher.dropped == 2
+
+    topic.release.set()
+    publisher.close(timeout=5)
+    assert [message["n"] for message in topic.published] == expected
+    assert publisher.metrics()["published"] == 3
+
+
+def test_background_block_policy_times_out():
+    """With the block policy, the message is dropped after the timeout."""
+    topic = BlockingTopic()
+    publisher = BackgroundPublisher(
+        topic, queue_size=1, overflow_policy="block", block_timeout=0.01
+    )
+    fill_queue(publisher, 3)
+
+    assert publisher.dropped == 1
+    topic.release.set()
+    publisher.close(timeout=5)
+    assert [message["n"] for message in topic.published] == [0, 1]
+
+
+def test_background_reset_in_forked_child():
+    """A forked child neither inherits the queue nor the worker thread."""
+    topic = BlockingTopic()
+    publisher = BackgroundPublisher(topic, queue_size=10)
+    fill_queue(publisher, 3)
+
+    pid = os.fork()
+    if pid == 0:  # the child, which must not return to pytest
+        exit_code = 1
+        try:
+            # pylint: disable=protected-access
+            exit_code = int(publisher.queue_depth != 0 or publisher._worker is not None)
+        finally:
+            os._exit(exit_code)  # pylint: disable=protected-access
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+    topic.release.set()
+    publisher.close(timeout=5)
+    assert [message["n"] for message in topic.published] == [0, 1, 2]
+
+
+class RecordingTopic:
+    """A topic that records published messages."""
+
+    def __init__(self):
+        self.published: list = []
+
+    def publish(self, message):
+        """Record the message."""
+        self.published.append(message)
+
+
+def event(drs_id: str, access_id: str = "s3") -> dict:
+    """Build a download request event."""
+    return {"drs_id": drs_id, "access_id": access_id, "user_id": "user_id"}
+
+
+def test_batch_flushed_after_batch_size():
+    """A full batch is sent as one message with duplicates collapsed."""
+    topic = RecordingTopic()
+    publisher = BatchingPublisher(topic, batch_size=3, interval_ms=60000)
+    for drs_id in ["Test1", "Test2", "Test1"]:
+        publisher.publish(event(drs_id))
+
+    for _ in range(1000):
+        if topic.published:
+            break
+        time.sleep(0.005)
+
+    assert topic.published == [
+        make_batch_message(
+            [dict(event("Test1"), count=2), dict(event("Test2"), count=1)]
+        )
+    ]
+    assert publisher.metrics()["coalesced"] == 1
+    publisher.close(timeout=5)
+
+
+def test_batch_flushed_after_interval_and_on_close():
+    """An incomplete batch is sent once the interval passed or on close."""
+    topic = RecordingTopic()
+    publisher = BatchingPublisher(topic, batch_size=100, interval_ms=10)
+    publisher.publish(event("Test1"))
+    time.sleep(0.2)
+    publisher.publish(event("Test1", access_id="other"))
+    publisher.close(timeout=5)
+
+    assert topic.published == [
+        make_batch_message([dict(event("Test1"), count=1)]),
+        make_batch_message([dict(event("Test1", access_id="other"), count=1)]),
+    ]
+
+
+@pytest.mark.parametrize(
+    "overflow_policy, expected, dropped",
+    [("drop_new", ["Test3", "Test4"], 1), ("drop_oldest", ["Test4", "Test5"], 2)],
+)
+def test_batch_overflow_policies(overflow_policy, expected, dropped):
+    """A batch holds a bounded number of distinct events."""
+    topic = BlockingTopic()
+    publisher = BatchingPublisher(
+        topic,
+        batch_size=100,
+        interval_ms=60000,
+        queue_size=2,
+        overflow_policy=overflow_policy,
+    )
+    # the first batch is full and taken by the worker:
+    publisher.publish(event("Test1"))
+    publisher.publish(event("Test2"))
+    while publisher.metrics()["pending"]:
+        time.sleep(0.001)
+    # the worker is stuck publishing it:
+    for drs_id in ["Test3", "Test4", "Test3", "Test5"]:
+        publisher.publish(event(drs_id))
+
+    assert publisher.dropped == dropped
+    topic.release.set()
+    publisher.close(timeout=5)
+    assert [
+        [event_["drs_id"] for event_ in message["events"]]
+        for message in topic.published
+    ] == [["Test1", "Test2"], expected]
+
+
+def test_send_messages_one_per_object(monkeypatch):
+    """Outside "batch" mode, bulk requests send the single message format."""
+    topic = RecordingTopic()
+    monkeypatch.setattr(pubsub, "get_download_requested_publisher", lambda: topic)
+
+    pubsub.send_messages(["Test1", "Test2", "Test1"], "s3", "user_id")
+
+    assert topic.published == [event("Test1"), event("Test2"), event("Test1")]
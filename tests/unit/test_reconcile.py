@@ -0,0 +1,119 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the reconcile module"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+
+from sandbox_storage import reconcile
+from sandbox_storage.dao.db import Base
+
+
+class FakeS3Client:
+    """Lists the objects of a bucket in pages."""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.pages = 0
+
+    def get_paginator(self, operation):
+        """Get the paginator of the operation."""
+        assert operation == "list_objects_v2"
+        return self
+
+    def paginate(
+        self, Bucket, Prefix, PaginationConfig
+    ):  # pylint: disable=invalid-name
+        """Yield pages of the sorted keys."""
+        assert Bucket == "test"
+        keys = sorted(key for key in self.objects if key.startswith(Prefix))
+        page_size = PaginationConfig["PageSize"]
+        while keys:
+            page, keys = keys[:page_size], keys[page_size:]
+            self.pages += 1
+            yield {
+                "Contents": [{"Key": key, "Size": self.objects[key]} for key in page]
+            }
+
+
+def test_merge_join():
+    """Keys are joined in order, missing sides are None."""
+    pairs = reconcile.merge_join(
+        [("a", 1), ("c", 3), ("d", 4)], [("b", 2), ("c", 3), ("e", 5)]
+    )
+    assert list(pairs) == [
+        (("a", 1), None),
+        (None, ("b", 2)),
+        (("c", 3), ("c", 3)),
+        (("d", 4), None),
+        (None, ("e", 5)),
+    ]
+
+
+def test_merge_join_unsorted():
+    """Keys in the wrong order are detected instead of misreported."""
+    with pytest.raises(ValueError):
+        list(reconcile.merge_join([("b", 1), ("a", 1)], [("a", 1), ("b", 1)]))
+
+
+def test_reconcile(tmp_path, monkeypatch):
+    """Missing objects, orphans, and size mismatches are reported in order."""
+    monkeypatch.setattr(reconcile, "S3_PAGE_SIZE", 2)
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    db_objects = {"a": 1, "b": 2, "B": 3, "ä": 4, "x/y": 5, "z": 6}
+    with engine.begin() as connection:
+        connection.execute(
+            reconcile.DRS_OBJECTS.insert(),
+            [
+                {
+                    "drs_id": drs_id,
+                    "path": f"http://s3-localstack:4566/test/{drs_id}",
+                    "size": size,
+                    "created_time": datetime(2021, 9, 1),
+                    "checksum_md5": "",
+                }
+                for drs_id, size in db_objects.items()
+            ],
+        )
+    client = FakeS3Client({"B": 3, "a": 1, "b": 20, "c": 7, "x/y": 5, "ä": 4})
+
+    stats = reconcile.ReconciliationStats()
+    progress = []
+    discrepancies = reconcile.reconcile(
+        engine,
+        client,
+        "test",
+        batch_size=2,
+        on_progress=lambda stats: progress.append(stats.matched),
+        stats=stats,
+    )
+
+    assert list(discrepancies) == [
+        (reconcile.SIZE_MISMATCH, "b", 2, 20),
+        (reconcile.ORPHAN, "c", None, 7),
+        (reconcile.MISSING, "z", 6, None),
+    ]
+    assert client.pages == 3
+    assert (stats.db_objects, stats.s3_objects, stats.matched) == (6, 6, 4)
+    assert stats.discrepancies == 3
+    assert progress == [2, 2, 3, 4]
+
+    assert [
+        discrepancy.key
+        for discrepancy in reconcile.reconcile(engine, client, "test", prefix="x")
+    ] == []
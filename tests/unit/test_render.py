@@ -0,0 +1,88 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the render module"""
+
+import json
+from datetime import datetime
+
+from sandbox_storage import render
+from sandbox_storage.models import AccessURL, DrsReturnObject
+from sandbox_storage.cache import TTLCache
+from sandbox_storage.dao.lookup import DrsObjectRecord
+
+RECORD = DrsObjectRecord(
+    drs_id="Test1",
+    path="http://s3-localstack:4566/test/Test1",
+    size=42,
+    created_time=datetime(2021, 8, 30),
+    checksum_md5="3e48b55a59a8d521c3a261c6a41ef27e",
+)
+
+
+def test_render_drs_object(monkeypatch):
+    """The rendered object equals the JSON of a ``DrsReturnObject``
+    and is cached per record."""
+    cache = TTLCache(max_size=10, ttl=60)
+    monkeypatch.setattr(render, "get_render_cache", lambda: cache)
+
+    rendered = render.render_drs_object(RECORD, "drs://localhost:8080/")
+    assert json.loads(rendered.body) == (
+        DrsReturnObject.from_record(RECORD, "drs://localhost:8080/").__json__()
+    )
+    assert json.loads(rendered.body) == {
+        "id": "Test1",
+        "self_uri": "drs://localhost:8080/Test1",
+        "size": 42,
+        "created_time": "2021-08-30T00:00:00Z",
+        "checksums": [{"checksum": "3e48b55a59a8d521c3a261c6a41ef27e", "type": "md5"}],
+        "access_methods": [
+            {
+                "type": "s3",
+                "access_url": {"url": "http://s3-localstack:4566/test/Test1"},
+            }
+        ],
+    }
+    assert render.render_drs_object(RECORD, "drs://localhost:8080/") is rendered
+
+    changed = render.render_drs_object(
+        RECORD._replace(size=43), "drs://localhost:8080/"
+    )
+    assert json.loads(changed.body)["size"] == 43
+
+
+def test_render_object():
+    """Pre-rendered members are embedded as they are."""
+    rendered = render.render_object(
+        {
+            "summary": {"requested": 2},
+            "items": render.render_array(
+                [render.RawJSON(b'{"a":1}'), render.RawJSON(b"[]")]
+            ),
+            "empty": render.render_array([]),
+        }
+    )
+    assert json.loads(rendered.body) == {
+        "summary": {"requested": 2},
+        "items": [{"a": 1}, []],
+        "empty": [],
+    }
+
+
+def test_dumps_uses_json_method():
+    """Objects are serialized by their ``__json__`` method."""
+    assert json.loads(render.dumps({"access": AccessURL(url="http://x")})) == {
+        "access": {"url": "http://x"}
+    }
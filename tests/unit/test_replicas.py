@@ -0,0 +1,132 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the replicas module"""
+
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from sandbox_storage.dao import replicas
+from sandbox_storage.dao.replicas import ReplicaRouter
+
+
+def make_engine(path, name):
+    """Create an SQLite database that knows its name."""
+    engine = create_engine(f"sqlite:///{path / name}.db")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE origin (name TEXT)"))
+        connection.execute(text("INSERT INTO origin VALUES (:name)"), {"name": name})
+    return engine
+
+
+def query_origin(session):
+    """Find out on which database the query ran."""
+    return session.execute(text("SELECT name FROM origin")).scalar()
+
+
+class Clock:
+    """A clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_router(tmp_path, replicas, selection="round_robin", clock=None):
+    """Create a router for the primary and the given replicas."""
+    config = SimpleNamespace(
+        db_replica_selection=selection,
+        db_replica_max_lag=10.0,
+        db_replica_lag_check_interval=5.0,
+        db_replica_error_threshold=2,
+        db_replica_eject_seconds=30.0,
+    )
+    return ReplicaRouter(
+        primary=make_engine(tmp_path, "primary"),
+        replicas=replicas,
+        config=config,
+        clock=clock or Clock(),
+    )
+
+
+def test_round_robin(tmp_path):
+    """Queries are spread over all replicas."""
+    router = make_router(
+        tmp_path, [make_engine(tmp_path, "replica1"), make_engine(tmp_path, "replica2")]
+    )
+    assert [router.run(query_origin) for _ in range(4)] == [
+        "replica1",
+        "replica2",
+        "replica1",
+        "replica2",
+    ]
+    assert router.fallbacks == 0
+
+
+def test_least_connections(tmp_path):
+    """The replica with the fewest running queries is chosen."""
+    router = make_router(
+        tmp_path,
+        [make_engine(tmp_path, "replica1"), make_engine(tmp_path, "replica2")],
+        selection="least_connections",
+    )
+    router.replicas[0].active = 1
+    assert router.run(query_origin) == "replica2"
+    assert [replica.active for replica in router.replicas] == [1, 0]
+
+
+def test_ejection_and_fallback(tmp_path):
+    """Failing replicas are ejected for a while, queries run on the primary."""
+    clock = Clock()
+    broken = create_engine(f"sqlite:///{tmp_path / 'missing' / 'broken.db'}")
+    router = make_router(tmp_path, [broken], clock=clock)
+
+    assert router.run(query_origin) == "primary"
+    assert router.run(query_origin) == "primary"
+    metrics = router.metrics()
+    assert metrics["fallbacks"] == 2
+    assert metrics["replicas"][router.replicas[0].name]["ejected"] is True
+
+    # ejected replicas are not tried:
+    router.replicas[0].engine = make_engine(tmp_path, "replica1")
+    assert router.run(query_origin) == "primary"
+
+    # but after a while, they are:
+    clock.now = 30.0
+    assert router.run(query_origin) == "replica1"
+    assert router.replicas[0].errors == 0
+
+
+@pytest.mark.parametrize("lag,expected", [(0.0, "replica1"), (60.0, "primary")])
+def test_lagging_replicas(tmp_path, monkeypatch, lag, expected):
+    """Replicas lagging behind too far are not used."""
+    router = make_router(tmp_path, [make_engine(tmp_path, "replica1")])
+    monkeypatch.setattr(router, "_check_lag", lambda replica: lag)
+    assert router.run(query_origin) == expected
+
+
+def test_unknown_lag(tmp_path, monkeypatch):
+    """A lag query returning NULL (e.g. on a primary) doesn't fail lookups."""
+    replica_engine = make_engine(tmp_path, "replica1")
+    router = make_router(tmp_path, [replica_engine])
+    monkeypatch.setattr(replicas, "POSTGRES_LAG_QUERY", text("SELECT NULL"))
+    monkeypatch.setattr(replica_engine.dialect, "name", "postgresql")
+
+    assert router.run(query_origin) == "replica1"
+    assert router.replicas[0].lag is None
@@ -0,0 +1,65 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the s3 module"""
+
+import os
+
+from sandbox_storage import s3
+from sandbox_storage.config import Config
+from sandbox_storage.s3 import S3ClientFactory
+
+
+def test_client_is_reused():
+    """The client should be created once per process."""
+    factory = S3ClientFactory(Config(s3_max_pool_connections=42))
+    client = factory.get_client()
+
+    assert factory.get_client() is client
+    assert client.meta.config.max_pool_connections == 42
+
+
+def test_new_client_after_fork():
+    """A forked child should not use the client of its parent."""
+    factory = S3ClientFactory(Config())
+    client = factory.get_client()
+
+    pid = os.fork()
+    if pid == 0:  # the child, which must not return to pytest
+        exit_code = 1
+        try:
+            exit_code = int(factory.get_client() is client)
+        finally:
+            os._exit(exit_code)  # pylint: disable=protected-access
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert factory.get_client() is client
+
+
+def test_presigned_urls_are_cached(monkeypatch):
+    """A presigned URL is reused while it stays valid long enough."""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    factory = S3ClientFactory(Config(presign_cache_min_validity=82800))
+    monkeypatch.setattr(s3, "get_s3_client_factory", lambda: factory)
+
+    url = s3.presign_get_object("test", "Test1", expires_in=86400)
+    assert s3.presign_get_object("test", "Test1", expires_in=86400) == url
+    assert s3.presign_get_object("test", "Test2", expires_in=86400) != url
+    assert factory.get_url_cache().metrics()["hits"] == 1
+
+    # the URL would not be valid for long enough:
+    s3.presign_get_object("test", "Test1", expires_in=3600)
+    assert factory.get_url_cache().metrics()["hits"] == 1
@@ -0,0 +1,101 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the tweens module"""
+
+import threading
+
+import pytest
+from prometheus_client import REGISTRY
+from pyramid.request import Request
+from pyramid.response import Response
+from pyramid.urldispatch import Route
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import scoped_session, sessionmaker
+from zope.sqlalchemy import register
+
+from sandbox_storage import tweens
+from sandbox_storage.dao.pool import InstrumentedQueuePool, get_pool_metrics
+
+
+def test_db_session_tween_releases_connection(tmp_path, monkeypatch):
+    """Connections are returned to the pool after each request."""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}",
+        connect_args={"check_same_thread": False},
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=1,
+    )
+    session = scoped_session(sessionmaker(bind=engine))
+    register(session)
+    monkeypatch.setattr(tweens, "DBSession", session)
+
+    def handler(_):
+        session().execute(text("SELECT 1"))
+        assert engine.pool.checkedout() == 1
+        return Response()
+
+    tween = tweens.db_session_tween_factory(handler, None)
+    responses = []
+    # each request is handled by another thread, with a single connection
+    # they only succeed if it is returned after each request:
+    for _ in range(3):
+        thread = threading.Thread(target=lambda: responses.append(tween(None)))
+        thread.start()
+        thread.join()
+
+    assert len(responses) == 3
+    metrics = get_pool_metrics(engine)
+    assert metrics["checked_out"] == 0
+    assert metrics["checkouts"] == 3
+    assert metrics["timeouts"] == 0
+    assert metrics["wait_seconds_max"] < 1
+
+
+def test_metrics_tween():
+    """Requests are counted and timed by route, method, and status."""
+    labels = {"route": "objects_id", "method": "GET", "status": "404"}
+
+    def get_count():
+        return REGISTRY.get_sample_value("sandbox_storage_http_requests_total", labels)
+
+    def handler(request):
+        request.matched_route = Route("objects_id", "/objects/{object_id}")
+        return Response(status=404)
+
+    before = get_count() or 0
+    tween = tweens.metrics_tween_factory(handler, None)
+    assert tween(Request.blank("/objects/none")).status_code == 404
+
+    assert get_count() == before + 1
+    assert (
+        REGISTRY.get_sample_value(
+            "sandbox_storage_http_request_duration_seconds_count", labels
+        )
+        == before + 1
+    )
+
+    def failing_handler(_):
+        raise RuntimeError("Failed")
+
+    tween = tweens.metrics_tween_factory(failing_handler, None)
+    with pytest.raises(RuntimeError):
+        tween(Request.blank("/unknown"))
+    assert REGISTRY.get_sample_value(
+        "sandbox_storage_http_requests_total",
+        {"route": "none", "method": "GET", "status": "500"},
+    )